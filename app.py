@@ -12,6 +12,7 @@
 """
 
 import os
+import queue
 import sys
 import threading
 import webbrowser
@@ -20,7 +21,11 @@ import customtkinter as ctk
 from tkinter import filedialog, messagebox
 
 import settings as app_settings
-from processor import process
+from version import VERSION
+
+# processor (numpy, openpyxl) and PIL are imported lazily: _preload pulls
+# them in on a background thread once the window is on screen, and the
+# processing worker imports processor itself if it gets there first.
 
 # ── Appearance ──────────────────────────────────────────────────────────────
 
@@ -44,7 +49,15 @@ TEXT_SECONDARY = "#a1a1aa"
 TEXT_DIM       = "#71717a"
 BORDER_COLOR   = "#27272a"
 
-VERSION = "1.0.0"
+# Delay before heavy modules are preloaded, so the first frame is drawn first.
+PRELOAD_DELAY_MS = 50
+
+# Log pipeline: the worker thread only enqueues events; the Tk thread drains
+# them every LOG_FLUSH_MS in one coalesced insert and keeps at most
+# MAX_LOG_LINES lines in the log box.
+LOG_FLUSH_MS = 100
+MAX_LOG_LINES = 5000
+MAX_EVENTS_PER_FLUSH = 20000
 
 
 def resource_path(relative_path):
@@ -74,9 +87,15 @@ class CubeDataChangerAIO:
         # State
         self._load_settings()
         self.processing = False
+        self._job = None
+        self._cancel_requested = False
+        self._events = queue.Queue()
+        self._pending_progress = None
 
         # Build UI
         self._build_ui()
+        self.root.after(LOG_FLUSH_MS, self._pump_events)
+        self.root.after(PRELOAD_DELAY_MS, self._start_preload)
 
     # ── Settings persistence ────────────────────────────────────────────────
 
@@ -87,15 +106,27 @@ class CubeDataChangerAIO:
         self.calendar_path  = ctk.StringVar(value=s.get("calendar_path", ""))
         self.mode_var       = ctk.StringVar(value=s.get("mode", "generate+date"))
         self.saved_grade_files = [f for f in s.get("grade_files", []) if os.path.exists(f)]
+        self.server_url     = ctk.StringVar(value=s.get("server_url", ""))
+        if s.get("server_token"):          # written in plain text by older versions
+            app_settings.set_secret("server_token", s["server_token"])
+            app_settings.remove("server_token")
+        self.server_token   = ctk.StringVar(value=app_settings.get_secret("server_token") or "")
 
     def _save_settings(self):
-        app_settings.save({
+        app_settings.update({
             "office_path":     self.office_path.get(),
             "output_path":     self.output_path.get(),
             "calendar_path":   self.calendar_path.get(),
             "mode":            self.mode_var.get(),
             "grade_files":     getattr(self, "legacy_grade_files", []),
+            "server_url":      self.server_url.get().strip(),
         })
+        app_settings.set_secret("server_token", self.server_token.get().strip())
+        office = self.office_path.get()
+        if office:
+            app_settings.add_recent_template(office)
+            app_settings.set_template_options(office, mode=self.mode_var.get(),
+                                              calendar_path=self.calendar_path.get())
 
     # ── UI Construction ─────────────────────────────────────────────────────
 
@@ -121,14 +152,10 @@ class CubeDataChangerAIO:
         # Logo / branding
         logo_frame = ctk.CTkFrame(sb, fg_color="transparent")
         logo_frame.grid(row=r, column=0, padx=20, pady=(30, 5)); r += 1
-        try:
-            from PIL import Image
-            img = Image.open(resource_path("logo.png")).resize((64, 64), Image.Resampling.LANCZOS)
-            self._logo_photo = ctk.CTkImage(light_image=img, dark_image=img, size=(64, 64))
-            ctk.CTkLabel(logo_frame, image=self._logo_photo, text="").pack()
-        except Exception:
-            ctk.CTkLabel(logo_frame, text="◆", font=ctk.CTkFont(size=48),
-                         text_color=ACCENT).pack()
+        # Placeholder until _preload has decoded logo.png
+        self._logo_label = ctk.CTkLabel(logo_frame, text="◆", font=ctk.CTkFont(size=48),
+                                        text_color=ACCENT, width=64, height=64)
+        self._logo_label.pack()
 
         ctk.CTkLabel(sb, text="CUBE DATA\nCHANGER AIO",
                      font=ctk.CTkFont(size=20, weight="bold"),
@@ -199,6 +226,23 @@ class CubeDataChangerAIO:
 
         self._update_legacy_listbox()
 
+        # ── Execution target ───────────────────────────────────────────────
+        ctk.CTkFrame(sb, height=1, fg_color=BORDER_COLOR).grid(
+            row=r, column=0, sticky="ew", padx=20, pady=(5, 15)); r += 1
+
+        ctk.CTkLabel(sb, text="RUN ON",
+                     font=ctk.CTkFont(size=11, weight="bold"),
+                     text_color=TEXT_SECONDARY, anchor="w").grid(
+            row=r, column=0, padx=24, pady=(0, 8), sticky="w"); r += 1
+
+        for var, placeholder, show in ((self.server_url, "Server URL (blank = this PC)", ""),
+                                       (self.server_token, "Server token", "•")):
+            ctk.CTkEntry(sb, textvariable=var, placeholder_text=placeholder, show=show,
+                         height=30, font=ctk.CTkFont(size=11),
+                         fg_color=BG_CARD, border_color=BORDER_COLOR,
+                         text_color=TEXT_PRIMARY, placeholder_text_color=TEXT_DIM).grid(
+                row=r, column=0, padx=20, pady=(0, 6), sticky="ew"); r += 1
+
         # Spacer (pushes footer down)
         sb.grid_rowconfigure(20, weight=1)
 
@@ -260,7 +304,7 @@ class CubeDataChangerAIO:
         self._file_card(
             cards_frame, row=1, icon="📄", label="Office Template",
             var=self.office_path, placeholder="Select office template Excel...",
-            browse_cmd=lambda: self._browse_file(self.office_path, "Select Office Template"))
+            browse_cmd=self._browse_template)
 
         # Output folder
         self._folder_card(
@@ -281,6 +325,14 @@ class CubeDataChangerAIO:
             command=self._run)
         self.start_btn.grid(row=0, column=0, sticky="ew")
 
+        self.cancel_btn = ctk.CTkButton(
+            btn_frame, text="✖  CANCEL", width=140,
+            font=ctk.CTkFont(size=15, weight="bold"), height=56,
+            fg_color=RED, hover_color=RED_HOVER,
+            text_color="white", corner_radius=12,
+            state="disabled", command=self._cancel)
+        self.cancel_btn.grid(row=0, column=1, sticky="e", padx=(10, 0))
+
         # Progress
         self.progress = ctk.CTkProgressBar(
             main, height=6, corner_radius=3,
@@ -343,6 +395,19 @@ class CubeDataChangerAIO:
         if path:
             var.set(path)
 
+    def _browse_template(self):
+        before = self.office_path.get()
+        self._browse_file(self.office_path, "Select Office Template")
+        if self.office_path.get() == before:
+            return
+        # Restore what was last used with this template
+        opts = app_settings.template_options(self.office_path.get())
+        if opts.get("mode"):
+            self.mode_var.set(opts["mode"])
+            self._on_mode_change()
+        if opts.get("calendar_path") and os.path.exists(opts["calendar_path"]):
+            self.calendar_path.set(opts["calendar_path"])
+
     def _browse_output(self):
         folder = filedialog.askdirectory(title="Select Output Folder")
         if folder:
@@ -367,8 +432,9 @@ class CubeDataChangerAIO:
 
     def _add_legacy_files(self):
         files = filedialog.askopenfilenames(
-            title="Select Grade Excel Files",
-            filetypes=[("Excel Files", "*.xlsx")])
+            title="Select Grade Files",
+            filetypes=[("Grade Files", "*.xlsx *.csv *.npz *.parquet"),
+                       ("Excel Files", "*.xlsx"), ("All Files", "*.*")])
         for f in files:
             if f not in self.legacy_grade_files:
                 self.legacy_grade_files.append(f)
@@ -386,16 +452,80 @@ class CubeDataChangerAIO:
             for f in self.legacy_grade_files:
                 self._legacy_listbox.insert("end", f"  📄 {os.path.basename(f)}\n")
 
+    # ── Deferred startup work ───────────────────────────────────────────────
+
+    def _start_preload(self):
+        threading.Thread(target=self._preload, daemon=True).start()
+
+    def _preload(self):
+        """Background thread: decode the logo, then import the processing stack."""
+        try:
+            from PIL import Image
+            img = Image.open(resource_path("logo.png")).resize((64, 64), Image.Resampling.LANCZOS)
+            self._events.put(("logo", img))
+        except Exception:
+            pass                                # keep the placeholder
+        try:
+            import processor  # noqa: F401
+        except Exception:
+            pass                                # the worker reports import errors
+
+    def _show_logo(self, img):
+        self._logo_photo = ctk.CTkImage(light_image=img, dark_image=img, size=(64, 64))
+        self._logo_label.configure(image=self._logo_photo, text="")
+
     # ── Logging ─────────────────────────────────────────────────────────────
 
     def _log(self, msg):
-        self.log_box.insert("end", msg + "\n")
-        self.log_box.see("end")
-        self.root.update_idletasks()
+        """Queue a log line (safe from any thread)."""
+        self._events.put(("log", msg))
 
     def _set_progress(self, val):
-        self.progress.set(max(0, min(1, val)))
-        self.root.update_idletasks()
+        """Record the latest progress value; the pump applies it at most once per tick."""
+        self._pending_progress = val
+
+    def _pump_events(self):
+        try:
+            self._flush_events()
+        finally:
+            self.root.after(LOG_FLUSH_MS, self._pump_events)
+
+    def _flush_events(self):
+        """Drain queued events on the Tk thread: one textbox insert per batch."""
+        lines = []
+        finished = None
+        for _ in range(MAX_EVENTS_PER_FLUSH):
+            try:
+                kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "log":
+                lines.append(payload)
+            elif kind == "logo":
+                self._show_logo(payload)
+            else:
+                finished = (kind, payload)
+                break
+
+        if lines:
+            self.log_box.insert("end", "\n".join(lines) + "\n")
+            excess = int(self.log_box.index("end-1c").split(".")[0]) - 1 - MAX_LOG_LINES
+            if excess > 0:
+                self.log_box.delete("1.0", f"{excess + 1}.0")
+            self.log_box.see("end")
+
+        progress, self._pending_progress = self._pending_progress, None
+        if progress is not None:
+            self.progress.set(max(0, min(1, progress)))
+
+        if finished:
+            kind, payload = finished
+            if kind == "done":
+                self._on_done(payload)
+            elif kind == "cancelled":
+                self._on_cancelled()
+            else:
+                self._on_error(payload)
 
     # ── Processing ──────────────────────────────────────────────────────────
 
@@ -430,8 +560,11 @@ class CubeDataChangerAIO:
             return
 
         self.processing = True
+        self._job = None
+        self._cancel_requested = False
         self.start_btn.configure(state="disabled", text="⏳  Processing...",
                                  fg_color="#3f3f46")
+        self.cancel_btn.configure(state="normal", text="✖  CANCEL")
         self.log_box.delete("0.0", "end")
         self.progress.set(0)
         self._save_settings()
@@ -441,9 +574,18 @@ class CubeDataChangerAIO:
         grade_files = self.legacy_grade_files if "grade_files" in mode else None
         calendar = self.calendar_path.get() if "date" in mode else None
 
+        server = self.server_url.get().strip()
+        token = self.server_token.get().strip() or None
+
         def worker():
             try:
-                total = process(
+                if server:
+                    from functools import partial
+                    from jobclient import RemoteJob
+                    Job = partial(RemoteJob, server, token=token)
+                else:
+                    from processor import Job
+                job = Job(
                     office_file=self.office_path.get(),
                     output_folder=self.output_path.get(),
                     mode=mode,
@@ -453,18 +595,42 @@ class CubeDataChangerAIO:
                     calendar_file=calendar,
                     progress_cb=self._set_progress,
                 )
-                self.root.after(0, lambda: self._on_done(total))
+                self._job = job
+                if self._cancel_requested:      # clicked while processor was importing
+                    job.cancel()
+                result = job.start().result()
+                if result.cancelled:
+                    self._events.put(("cancelled", None))
+                elif result.ok:
+                    self._events.put(("done", result.total))
+                else:
+                    self._events.put(("error", result.error))
             except Exception as e:
-                self.root.after(0, lambda: self._on_error(str(e)))
+                self._events.put(("error", str(e)))
 
         threading.Thread(target=worker, daemon=True).start()
 
-    def _on_done(self, total):
+    def _cancel(self):
+        if not self.processing:
+            return
+        self._cancel_requested = True
+        if self._job is not None:
+            self._job.cancel()
+        self.cancel_btn.configure(state="disabled", text="Cancelling…")
+        self._log("\n⏹ Cancelling after the current sheet...")
+
+    def _reset_buttons(self):
         self.processing = False
-        self.progress.set(1.0)
+        self._job = None
         self.start_btn.configure(state="normal", text="▶   START PROCESSING",
                                  fg_color=GREEN)
+        self.cancel_btn.configure(state="disabled", text="✖  CANCEL")
+
+    def _on_done(self, total):
+        self._reset_buttons()
+        self.progress.set(1.0)
         self._log(f"\n✅ Processing complete — {total} operations performed")
+        self._flush_events()
 
         # Sound (Windows only, silently ignored elsewhere)
         try:
@@ -477,12 +643,16 @@ class CubeDataChangerAIO:
                             f"Processing finished!\n\nTotal operations: {total}")
         self.progress.set(0)
 
+    def _on_cancelled(self):
+        self._reset_buttons()
+        self.progress.set(0)
+        self._flush_events()
+
     def _on_error(self, err):
-        self.processing = False
+        self._reset_buttons()
         self.progress.set(0)
-        self.start_btn.configure(state="normal", text="▶   START PROCESSING",
-                                 fg_color=GREEN)
         self._log(f"\n✖ ERROR: {err}")
+        self._flush_events()
         messagebox.showerror("Error", f"Processing failed:\n{err}")
 
     # ── Run ─────────────────────────────────────────────────────────────────
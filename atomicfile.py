@@ -0,0 +1,86 @@
+"""
+Crash-safe file replacement.
+
+Outputs are written to a temporary file in the destination directory,
+flushed to disk and renamed over the final name in one step, so a crash,
+kill or cancelled run leaves either the previous file or the complete new
+one under the real name — never a truncated workbook.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+_TEMP_PREFIX = ".tmp-"
+
+
+def _read_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Read once at import: os.umask can only be queried by setting it
+_UMASK = _read_umask()
+
+
+def _target_mode(path):
+    """Mode for a new file at *path*: the existing file's, else 0o666 minus the umask."""
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        return 0o666 & ~_UMASK
+
+
+def _fsync_file(path):
+    # r+b: Windows refuses to fsync a read-only descriptor
+    with open(path, "r+b") as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path):
+    """Persist a rename (POSIX; directories cannot be opened on Windows)."""
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_output(path, fsync=True):
+    """
+    Yield a temporary path next to *path*; on clean exit it is fsynced and
+    atomically renamed to *path*, on error it is removed.
+
+        with atomic_output(out_path) as tmp:
+            workbook.save(tmp)
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    suffix = os.path.splitext(path)[1]
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=_TEMP_PREFIX, suffix=suffix)
+    os.close(fd)
+    try:
+        yield tmp
+        # mkstemp creates 0600; give the result the permissions a plain write would
+        os.chmod(tmp, _target_mode(path))
+        if fsync:
+            _fsync_file(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        _fsync_dir(directory)
+
+
+def write_bytes(path, data, fsync=True):
+    """Atomically replace *path* with *data*."""
+    with atomic_output(path, fsync=fsync) as tmp:
+        with open(tmp, "wb") as f:
+            f.write(data)
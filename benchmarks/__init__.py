@@ -0,0 +1 @@
+"""Benchmark suite: synthetic fixtures and a runner for ``processor.process``."""
@@ -0,0 +1,224 @@
+"""
+Synthetic benchmark fixtures.
+
+Writes .xlsx packages straight through ``zipfile`` (no openpyxl), so a
+50 000-sheet template is built in seconds.  Every template sheet looks like
+a real report: B12 holds one of several grade spellings (including mortar
+variants and an unsupported value), C17 a casting date stored either as a
+date serial or as ISO text, and the rows the processor writes (25, 27 and
+the date cells) are pre-populated with placeholders and a formula.
+
+A matching calendar covers every casting date, and one legacy grade file
+per supported grade holds enough rows for all its sheets.  Fixtures are
+cached under benchmarks/.fixtures keyed by size and FIXTURE_VERSION.
+"""
+
+import datetime
+import os
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fixtures")
+
+# Bump when the generated layout changes so stale fixtures are rebuilt.
+FIXTURE_VERSION = 2
+
+# B12 spellings cycled across sheets → grade they resolve to (None = unsupported).
+B12_SPELLINGS = [
+    ("M20", "M20"), ("m-25", "M25"), ("M 30", "M30"), ("M_35", "M35"),
+    ("M10", "M10"), ("M15", "M15"), ("M40", "M40"), ("M45", "M45"),
+    ("Mortar 1:4", "1:4"), ("1/6", "1:6"), ("MORTAR1:6", "1:6"), ("1:4", "1:4"),
+    ("Special Mix", None),
+]
+
+CASTING_DAYS = 365
+_FIRST_CASTING = datetime.date(2025, 1, 1)
+_EXCEL_EPOCH = datetime.date(1899, 12, 30)
+
+_NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+_NS_R = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+_CT = "application/vnd.openxmlformats-officedocument.spreadsheetml"
+
+_STYLES = (
+    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<styleSheet {_NS}>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def casting_date(i):
+    """Casting date of template sheet *i*."""
+    return _FIRST_CASTING + datetime.timedelta(days=i % CASTING_DAYS)
+
+
+def _serial(d):
+    return (d - _EXCEL_EPOCH).days
+
+
+def _sheet_name(i):
+    return f"Cube {i + 1:05d}"
+
+
+def _is(text):
+    return f'<is><t>{escape(text)}</t></is>'
+
+
+# ── Package writer ─────────────────────────────────────────────────────────
+
+def _write_package(path, sheets, shared_strings=None):
+    """Write a workbook of ``[(name, sheet_xml)]`` to *path* atomically."""
+    n = len(sheets)
+    overrides = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="{_CT}.worksheet+xml"/>'
+        for i in range(1, n + 1))
+    if shared_strings is not None:
+        overrides += f'<Override PartName="/xl/sharedStrings.xml" ContentType="{_CT}.sharedStrings+xml"/>'
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        f'<Override PartName="/xl/workbook.xml" ContentType="{_CT}.sheet.main+xml"/>'
+        f'<Override PartName="/xl/styles.xml" ContentType="{_CT}.styles+xml"/>'
+        f'{overrides}</Types>')
+    root_rels = (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{_PKG_REL}">'
+        f'<Relationship Id="rId1" Type="{_REL}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>')
+    workbook = (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<workbook {_NS} {_NS_R}><sheets>'
+        + "".join(f'<sheet name="{escape(name)}" sheetId="{i}" r:id="rId{i}"/>'
+                  for i, (name, _) in enumerate(sheets, 1))
+        + '</sheets></workbook>')
+    wb_rels = (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{_PKG_REL}">'
+        + "".join(f'<Relationship Id="rId{i}" Type="{_REL}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                  for i in range(1, n + 1))
+        + f'<Relationship Id="rId{n + 1}" Type="{_REL}/styles" Target="styles.xml"/>'
+        + (f'<Relationship Id="rId{n + 2}" Type="{_REL}/sharedStrings" Target="sharedStrings.xml"/>'
+           if shared_strings is not None else "")
+        + '</Relationships>')
+
+    tmp = path + ".tmp"
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        zf.writestr("[Content_Types].xml", content_types)
+        zf.writestr("_rels/.rels", root_rels)
+        zf.writestr("xl/workbook.xml", workbook)
+        zf.writestr("xl/_rels/workbook.xml.rels", wb_rels)
+        zf.writestr("xl/styles.xml", _STYLES)
+        if shared_strings is not None:
+            zf.writestr("xl/sharedStrings.xml", (
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<sst {_NS} count="{len(shared_strings)}" uniqueCount="{len(shared_strings)}">'
+                + "".join(f'<si><t>{escape(s)}</t></si>' for s in shared_strings)
+                + '</sst>'))
+        for i, (_, xml) in enumerate(sheets, 1):
+            zf.writestr(f"xl/worksheets/sheet{i}.xml", xml)
+    os.replace(tmp, path)
+
+
+def _worksheet(rows):
+    """``rows`` is ``[(row_number, "<c .../>...")]`` in ascending order."""
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet {_NS}><sheetData>'
+            + "".join(f'<row r="{r}">{cells}</row>' for r, cells in rows)
+            + '</sheetData></worksheet>')
+
+
+# ── Fixtures ───────────────────────────────────────────────────────────────
+
+def _template_sheet(i, spelling_index):
+    d = casting_date(i)
+    if i % 2:
+        c17 = f'<c r="C17" s="1"><v>{_serial(d)}</v></c>'
+    else:
+        c17 = f'<c r="C17" t="inlineStr">{_is(d.isoformat())}</c>'
+    placeholders25 = "".join(f'<c r="{col}25"><v>0</v></c>' for col in "CDEFGH")
+    placeholders27 = "".join(f'<c r="{col}27"><v>0</v></c>' for col in "CDEFGH")
+    return _worksheet([
+        (1, f'<c r="A1" t="inlineStr">{_is("Cube Test Report")}</c>'),
+        (12, f'<c r="A12" t="inlineStr">{_is("Grade")}</c><c r="B12" t="s"><v>{spelling_index}</v></c>'),
+        (17, f'<c r="A17" t="inlineStr">{_is("Casting")}</c>{c17}'),
+        (25, placeholders25 + '<c r="I25"><f>SUM(C25:H25)</f><v>0</v></c>'),
+        (27, placeholders27),
+        (29, '<c r="C29" t="inlineStr"><is><t></t></is></c>'),
+    ])
+
+
+def build_template(path, sheets):
+    """Template with *sheets* report sheets cycling through B12_SPELLINGS."""
+    spellings = [s for s, _ in B12_SPELLINGS]
+    parts = [(_sheet_name(i), _template_sheet(i, i % len(spellings))) for i in range(sheets)]
+    _write_package(path, parts, shared_strings=spellings)
+
+
+def build_calendar(path):
+    """Calendar with one row per casting date used by the templates."""
+    rows = [(1, "".join(f'<c r="{col}1" t="inlineStr">{_is(h)}</c>'
+                        for col, h in zip("ABC", ("Casting", "7 Days", "28 Days"))))]
+    for n in range(CASTING_DAYS):
+        d = _FIRST_CASTING + datetime.timedelta(days=n)
+        d7, d28 = d + datetime.timedelta(days=7), d + datetime.timedelta(days=28)
+        r = n + 2
+        rows.append((r, f'<c r="A{r}" s="1"><v>{_serial(d)}</v></c>'
+                        f'<c r="B{r}" t="inlineStr">{_is(d7.strftime("%d/%m/%Y"))}</c>'
+                        f'<c r="C{r}" t="inlineStr">{_is(d28.strftime("%d/%m/%Y"))}</c>'))
+    _write_package(path, [("Calendar", _worksheet(rows))])
+
+
+def grade_file_name(grade):
+    """Legacy grade-file name for *grade* (``M20.xlsx``, ``MORTAR_1_4.xlsx``)."""
+    if ":" in grade:
+        return "MORTAR_" + grade.replace(":", "_") + ".xlsx"
+    return grade + ".xlsx"
+
+
+def build_grade_file(path, rows, seed):
+    """Legacy grade file: weights in B:G, strengths in I:N from row 2."""
+    rng = random.Random(seed)
+    out = [(1, f'<c r="A1" t="inlineStr">{_is("Sample")}</c>')]
+    for r in range(2, rows + 2):
+        weights = "".join(f'<c r="{col}{r}"><v>{rng.uniform(8.1, 8.6):.3f}</v></c>' for col in "BCDEFG")
+        strengths = "".join(f'<c r="{col}{r}"><v>{rng.uniform(20.0, 40.0):.2f}</v></c>' for col in "IJKLMN")
+        out.append((r, f'<c r="A{r}"><v>{r - 1}</v></c>{weights}{strengths}'))
+    _write_package(path, [("Data", _worksheet(out))])
+
+
+def ensure_fixtures(sheets, root=FIXTURE_DIR):
+    """
+    Build (or reuse) the fixture set for a *sheets*-sheet template.
+
+    Returns a dict with ``template``, ``calendar`` and ``grade_files`` paths.
+    """
+    folder = os.path.join(root, f"v{FIXTURE_VERSION}-{sheets}")
+    template = os.path.join(folder, "template.xlsx")
+    calendar = os.path.join(root, f"v{FIXTURE_VERSION}-calendar.xlsx")
+    os.makedirs(folder, exist_ok=True)
+
+    if not os.path.exists(calendar):
+        build_calendar(calendar)
+    if not os.path.exists(template):
+        build_template(template, sheets)
+
+    per_grade = {}
+    for i in range(sheets):
+        grade = B12_SPELLINGS[i % len(B12_SPELLINGS)][1]
+        if grade:
+            per_grade[grade] = per_grade.get(grade, 0) + 1
+    grade_files = []
+    for n, (grade, count) in enumerate(sorted(per_grade.items())):
+        path = os.path.join(folder, grade_file_name(grade))
+        if not os.path.exists(path):
+            build_grade_file(path, count, seed=sheets * 100 + n)
+        grade_files.append(path)
+
+    return {"template": template, "calendar": calendar, "grade_files": grade_files}
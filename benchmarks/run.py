@@ -0,0 +1,193 @@
+"""
+Benchmark runner.
+
+    python -m benchmarks.run                       # 100 and 1 000 sheets
+    python -m benchmarks.run --sizes 100,1000,10000,50000 --engines stream
+    python -m benchmarks.run compare old.json new.json --threshold 0.10
+
+Every (size, engine, mode) case runs ``processor.process`` in a fresh
+interpreter so peak RSS is that case's alone.  Results — wall time, peak
+RSS, the processor's per-phase breakdown, plus commit, platform and
+library versions — are written as JSON to benchmarks/results/ and can be
+diffed with ``compare``, which exits 1 when any case got slower than the
+threshold allows.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import ensure_fixtures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+DEFAULT_SIZES = (100, 1000)
+ENGINES = ("stream", "openpyxl")
+MODES = ("generate+date", "generate", "date_only", "grade_files+date", "grade_files")
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:             # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_case(spec):
+    """Child-process body: run one case and print its JSON record."""
+    import processor
+
+    with tempfile.TemporaryDirectory() as out:
+        started = time.perf_counter()
+        result = processor.process(
+            spec["template"], out, spec["mode"], lambda msg: None,
+            grade_files=spec["grade_files"], calendar_file=spec["calendar"],
+            seed=spec["seed"], engine=spec["engine"], use_cache=False, history=False,
+            sheet_workers=spec["sheet_workers"])
+        wall = time.perf_counter() - started
+    print(json.dumps({
+        "ok": result.ok,
+        "error": result.error,
+        "total": result.total,
+        "dates_updated": result.dates_updated,
+        "wall": round(wall, 4),
+        "peak_rss_mb": _peak_rss_mb(),
+        "phases": {k: round(v, 4) for k, v in result.phases.items()},
+        "counters": result.counters,
+    }))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment():
+    import numpy
+    import openpyxl
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "openpyxl": openpyxl.__version__,
+    }
+
+
+def case_key(case):
+    return f"{case['sheets']}/{case['engine']}/{case['mode']}"
+
+
+def run(sizes, engines, modes, seed=1234, sheet_workers=1, repeat=1, log=print):
+    """Run the benchmark matrix and return the report dict."""
+    cases = []
+    for sheets in sizes:
+        fixtures = ensure_fixtures(sheets)
+        for engine in engines:
+            for mode in modes:
+                spec = dict(fixtures, sheets=sheets, engine=engine, mode=mode,
+                            seed=seed, sheet_workers=sheet_workers)
+                runs = []
+                for _ in range(repeat):
+                    proc = subprocess.run(
+                        [sys.executable, "-m", "benchmarks.run", "_case", json.dumps(spec)],
+                        cwd=ROOT, capture_output=True, text=True)
+                    if proc.returncode:
+                        runs.append({"ok": False, "error": proc.stderr.strip().splitlines()[-1:]})
+                        break
+                    runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+                best = min(runs, key=lambda r: r.get("wall", float("inf")))
+                case = {"sheets": sheets, "engine": engine, "mode": mode, **best}
+                cases.append(case)
+                log(f"{case_key(case):<40} {case.get('wall', float('nan')):>9.3f}s "
+                    f"{case.get('peak_rss_mb') or 0:>8.1f} MB  {'ok' if case['ok'] else case['error']}")
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": _environment(),
+        "seed": seed,
+        "sheet_workers": sheet_workers,
+        "repeat": repeat,
+        "cases": cases,
+    }
+
+
+def compare(old, new, threshold=0.10, log=print):
+    """Print per-case wall/RSS deltas; return True if no case regressed past *threshold*."""
+    before = {case_key(c): c for c in old["cases"] if c.get("ok")}
+    ok = True
+    for case in new["cases"]:
+        key = case_key(case)
+        prev = before.get(key)
+        if not prev or not case.get("ok"):
+            log(f"{key:<40} {'(no baseline)' if case.get('ok') else 'FAILED'}")
+            ok = ok and case.get("ok", False)
+            continue
+        delta = case["wall"] / prev["wall"] - 1 if prev["wall"] else 0.0
+        flag = ""
+        if delta > threshold:
+            flag = "  REGRESSION"
+            ok = False
+        log(f"{key:<40} {prev['wall']:>9.3f}s → {case['wall']:>9.3f}s  {delta:+7.1%}"
+            f"  rss {prev.get('peak_rss_mb') or 0:.0f} → {case.get('peak_rss_mb') or 0:.0f} MB{flag}")
+    return ok
+
+
+def _csv(value, cast=str):
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["_case"]:
+        _run_case(json.loads(argv[1]))
+        return 0
+    if argv[:1] == ["compare"]:
+        p = argparse.ArgumentParser(prog="python -m benchmarks.run compare")
+        p.add_argument("old")
+        p.add_argument("new")
+        p.add_argument("--threshold", type=float, default=0.10,
+                       help="allowed relative wall-time increase (default: %(default)s)")
+        args = p.parse_args(argv[1:])
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        return 0 if compare(old, new, args.threshold) else 1
+
+    p = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    p.add_argument("--sizes", type=lambda v: _csv(v, int), default=list(DEFAULT_SIZES),
+                   help="comma-separated sheet counts (default: 100,1000)")
+    p.add_argument("--engines", type=_csv, default=list(ENGINES))
+    p.add_argument("--modes", type=_csv, default=list(MODES))
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("--sheet-workers", type=int, default=1)
+    p.add_argument("--repeat", type=int, default=1, help="runs per case; the fastest is kept")
+    p.add_argument("-o", "--output", help="result file (default: benchmarks/results/<timestamp>.json)")
+    args = p.parse_args(argv)
+
+    report = run(args.sizes, args.engines, args.modes, args.seed,
+                 args.sheet_workers, args.repeat)
+    out = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"→ {out}")
+    return 0 if all(c["ok"] for c in report["cases"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Sampler microbenchmark.
+
+    python -m benchmarks.sampler                   # 10 000 rows per grade
+    python -m benchmarks.sampler --rows 100000 -o sampler.json
+
+Times lattice construction, ``generate_batch`` and the per-sheet
+``generate_for_sheets`` path for every entry of ``ALL_TYPES``, and checks
+each generated row against its grade's ranges: values in range, on the
+rounding lattice, distinct and at least the minimum gap apart.  Exits 1 if
+any row violates them.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from generator import (
+    ALL_TYPES, STRENGTH_7D_RANGES, STRENGTH_28D_RANGES, WEIGHT_RANGES,
+    _gap_params, generate_batch, generate_for_sheets, grade_lattices,
+)
+
+
+def _violations(values, bounds, decimals, min_gap):
+    """Number of rows of *values* breaking the sampler's guarantees."""
+    lo, hi = bounds
+    scale = 10 ** decimals
+    ticks = values * scale
+    on_lattice = np.abs(ticks - np.round(ticks)) < 1e-6
+    in_range = (values >= lo - 1e-9) & (values <= hi + 1e-9)
+    ordered = np.sort(np.round(ticks).astype(np.int64), axis=1)
+    gap = max(1, int(np.ceil(round(min_gap * scale, 6))))
+    spaced = (np.diff(ordered, axis=1) >= gap).all(axis=1)
+    ok = on_lattice.all(axis=1) & in_range.all(axis=1) & spaced
+    return int((~ok).sum())
+
+
+def check(grade, rows):
+    weights, s7, s28 = rows
+    weight_gap, strength_gap = _gap_params(grade)
+    return (_violations(weights, WEIGHT_RANGES[grade], 3, weight_gap)
+            + _violations(s7, STRENGTH_7D_RANGES[grade], 2, strength_gap)
+            + _violations(s28, STRENGTH_28D_RANGES[grade], 2, strength_gap))
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def run(rows, sheets, seed=1234, log=print):
+    results = []
+    for grade in ALL_TYPES:
+        grade_lattices.cache_clear()
+        _, build = _timed(grade_lattices, grade)
+        batch, batch_time = _timed(generate_batch, grade, rows, seed)
+        names = [f"Sheet {i}" for i in range(sheets)]
+        per_sheet, sheet_time = _timed(generate_for_sheets, grade, names, seed)
+        bad = check(grade, batch) + check(grade, per_sheet)
+        results.append({
+            "grade": grade,
+            "lattice_build_ms": round(build * 1e3, 3),
+            "batch_rows": rows,
+            "batch_us_per_row": round(batch_time / rows * 1e6, 3),
+            "sheets": sheets,
+            "per_sheet_us_per_row": round(sheet_time / sheets * 1e6, 3),
+            "violations": bad,
+        })
+        log(f"{grade:<5} lattice {build * 1e3:7.3f} ms  batch {batch_time / rows * 1e6:7.3f} µs/row"
+            f"  per-sheet {sheet_time / sheets * 1e6:7.3f} µs/row  {'ok' if not bad else f'{bad} BAD'}")
+    return results
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m benchmarks.sampler")
+    p.add_argument("--rows", type=int, default=10000, help="rows per generate_batch call")
+    p.add_argument("--sheets", type=int, default=2000, help="sheets per generate_for_sheets call")
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("-o", "--output", help="also write the results as JSON")
+    args = p.parse_args(argv)
+
+    results = run(args.rows, args.sheets, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    return 0 if not any(r["violations"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
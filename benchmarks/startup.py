@@ -0,0 +1,85 @@
+"""
+Import-time benchmark.
+
+    python -m benchmarks.startup                   # app.py, default budget
+    python -m benchmarks.startup --module cube_data --budget-ms 150
+
+Imports the module in a fresh interpreter under ``-X importtime`` (best of
+``--repeat`` runs) and reports its cumulative import time and the slowest
+top-level imports.  Exits 1 if the import exceeds ``--budget-ms`` or pulls
+in any module that must stay lazy (numpy, openpyxl, pandas by default):
+those belong on the background preload / first processing run, not on the
+path to the first window.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+from benchmarks.run import ROOT
+
+DEFAULT_BUDGET_MS = 400
+LAZY_MODULES = ("numpy", "openpyxl", "pandas")
+
+
+def measure(module):
+    """``{package: (self_us, cumulative_us)}`` for one cold import of *module*."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name[1:].rstrip()] = (int(self_us), int(cumulative_us))   # keeps tree indent
+    return timings
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    p.add_argument("--module", default="app", help="module to import (default: %(default)s)")
+    p.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                   help="allowed cumulative import time (default: %(default)s)")
+    p.add_argument("--lazy", default=",".join(LAZY_MODULES),
+                   help="comma-separated modules that must not be imported (default: %(default)s)")
+    p.add_argument("--repeat", type=int, default=5, help="runs; the fastest is reported")
+    p.add_argument("--top", type=int, default=10, help="slowest top-level imports to list")
+    p.add_argument("-o", "--output", help="also write the report as JSON")
+    args = p.parse_args(argv)
+
+    try:
+        runs = [measure(args.module) for _ in range(args.repeat)]
+    except RuntimeError as e:
+        print(f"error: cannot import {args.module}: {e}", file=sys.stderr)
+        return 2
+    timings = min(runs, key=lambda t: t[args.module][1])
+    total_ms = timings[args.module][1] / 1000
+    # Top level = no leading indentation in the importtime tree
+    top = sorted(((name, cum) for name, (_, cum) in timings.items() if not name.startswith(" ")),
+                 key=lambda item: item[1], reverse=True)[:args.top]
+    imported = {name.strip() for name in timings}
+    eager = sorted(m for m in args.lazy.split(",") if m and m in imported)
+
+    print(f"{args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    for name, cum in top:
+        print(f"  {cum / 1000:8.1f} ms  {name}")
+    for m in eager:
+        print(f"  ✖ {m} is imported eagerly")
+
+    ok = total_ms <= args.budget_ms and not eager
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"module": args.module, "import_ms": round(total_ms, 3),
+                       "budget_ms": args.budget_ms, "eager": eager, "ok": ok,
+                       "top": [{"module": n, "ms": round(c / 1000, 3)} for n, c in top]},
+                      f, indent=2)
+            f.write("\n")
+    print("ok" if ok else "over budget" if not eager else "lazy modules imported eagerly")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+"""
+Persistent cache of data derived from input workbooks (template indexes,
+compiled calendars).
+
+Entries live under ~/.cube_data_aio/cache (next to settings.json, or the
+``paths.cache`` setting) and are
+keyed by the source file's path, size, mtime and SHA-256, so an unchanged
+template or calendar is never re-scanned.  The cache is LRU-evicted once it
+exceeds MAX_ENTRIES or MAX_BYTES.  Any cache failure is treated as a miss.
+
+Batch, watch and job-server workers share one cache, so every change to
+the manifest is made under a lock file (read, modify, write); a cache hit
+only writes when its LRU stamp is more than TOUCH_INTERVAL seconds old.
+"""
+
+import hashlib
+import json
+import os
+import time
+import zlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:             # Windows
+    fcntl = None
+    import msvcrt
+
+from atomicfile import write_bytes
+import settings
+
+_MANIFEST_NAME = "manifest.json"
+_LOCK_NAME = "manifest.lock"
+
+MAX_ENTRIES = 256
+MAX_BYTES = 64 * 1024 * 1024
+_MAX_PATHS = 4 * MAX_ENTRIES
+TOUCH_INTERVAL = 60.0           # seconds; LRU stamps are refreshed at most this often
+
+# Bump when a serialized layout (or the date-key scheme) changes.
+TEMPLATE_INDEX_KIND = "template-index-v2"
+CALENDAR_KIND = "calendar-v1"
+
+
+# ── Fingerprints ────────────────────────────────────────────────────────────
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _atomic_write(path, data):
+    # Cache entries are disposable: atomic rename, but no fsync
+    write_bytes(path, data, fsync=False)
+
+
+# ── Manifest ────────────────────────────────────────────────────────────────
+
+def _valid_path(rec):
+    return (isinstance(rec, dict) and isinstance(rec.get("size"), int)
+            and isinstance(rec.get("mtime_ns"), int) and isinstance(rec.get("sha256"), str)
+            and isinstance(rec.get("seen"), (int, float)))
+
+
+def _valid_entry(entry):
+    return (isinstance(entry, dict) and isinstance(entry.get("file"), str)
+            and isinstance(entry.get("bytes"), int) and isinstance(entry.get("used"), (int, float)))
+
+
+def _load_manifest(cache_dir):
+    """The manifest, with malformed records dropped (empty if missing or corrupt)."""
+    try:
+        with open(os.path.join(cache_dir, _MANIFEST_NAME), "r", encoding="utf-8") as f:
+            m = json.load(f)
+    except (OSError, ValueError):
+        m = None
+    if not isinstance(m, dict) or not isinstance(m.get("paths"), dict) \
+            or not isinstance(m.get("entries"), dict):
+        return {"paths": {}, "entries": {}}
+    return {"paths": {p: r for p, r in m["paths"].items() if _valid_path(r)},
+            "entries": {k: e for k, e in m["entries"].items() if _valid_entry(e)}}
+
+
+def _save_manifest(cache_dir, m):
+    os.makedirs(cache_dir, exist_ok=True)
+    _atomic_write(os.path.join(cache_dir, _MANIFEST_NAME), json.dumps(m, separators=(",", ":")).encode("utf-8"))
+
+
+@contextmanager
+def _locked(cache_dir):
+    """Hold the cache's lock file (blocks while another process holds it)."""
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, _LOCK_NAME), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)     # OSError after ~10 s
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _update(cache_dir, snapshot, change):
+    """
+    Apply ``change(m) -> changed`` to the manifest.
+
+    It is tried on *snapshot* (read without the lock) first, so a no-op
+    costs no lock and no write; otherwise it is re-applied to the current
+    manifest under the lock and written back.
+    """
+    if not change(snapshot):
+        return
+    with _locked(cache_dir):
+        m = _load_manifest(cache_dir)
+        if change(m):
+            _save_manifest(cache_dir, m)
+
+
+def _path_record(m, abspath):
+    """Fingerprint record for *abspath*: the recorded one if size/mtime match, else hashed."""
+    st = os.stat(abspath)
+    rec = m["paths"].get(abspath)
+    if rec and rec["size"] == st.st_size and rec["mtime_ns"] == st.st_mtime_ns:
+        return rec
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_hash(abspath),
+            "seen": 0}
+
+
+def _note_paths(m, records, now):
+    """Merge fingerprint *records* ({abspath: record}) into *m*; returns True if it changed."""
+    changed = False
+    paths = m["paths"]
+    for abspath, rec in records.items():
+        cur = paths.get(abspath)
+        if cur is None or (cur["size"], cur["mtime_ns"], cur["sha256"]) != \
+                (rec["size"], rec["mtime_ns"], rec["sha256"]):
+            paths[abspath] = dict(rec, seen=now)
+            changed = True
+        elif now - cur["seen"] > TOUCH_INTERVAL:
+            cur["seen"] = now
+            changed = True
+    if len(paths) > _MAX_PATHS:
+        for p in sorted(paths, key=lambda p: paths[p]["seen"])[:len(paths) - _MAX_PATHS]:
+            del paths[p]
+    return changed
+
+
+def _evict(cache_dir, m):
+    """Drop least-recently-used entries over the limits, and .bin files no entry owns."""
+    entries = m["entries"]
+    total = sum(e["bytes"] for e in entries.values())
+    for key in sorted(entries, key=lambda k: entries[k]["used"]):
+        if len(entries) <= MAX_ENTRIES and total <= MAX_BYTES:
+            break
+        total -= entries[key]["bytes"]
+        try:
+            os.remove(os.path.join(cache_dir, entries.pop(key)["file"]))
+        except OSError:
+            pass
+    owned = {e["file"] for e in entries.values()}
+    for name in os.listdir(cache_dir):
+        if name.endswith(".bin") and name not in owned:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+# ── Public API ──────────────────────────────────────────────────────────────
+
+def get(kind, path):
+    """Return cached bytes of *kind* for the file at *path*, or None."""
+    try:
+        cache_dir = settings.cache_dir()
+        m = _load_manifest(cache_dir)
+        abspath = os.path.abspath(path)
+        rec = _path_record(m, abspath)
+        key = f"{kind}-{rec['sha256']}"
+        entry = m["entries"].get(key)
+        data = None
+        if entry:
+            try:
+                with open(os.path.join(cache_dir, entry["file"]), "rb") as f:
+                    data = f.read()
+            except OSError:
+                pass
+        lost = entry is not None and data is None
+        now = time.time()
+
+        def change(m):
+            changed = _note_paths(m, {abspath: rec}, now)
+            current = m["entries"].get(key)
+            if current is None:
+                return changed
+            if lost:
+                if not os.path.exists(os.path.join(cache_dir, current["file"])):
+                    del m["entries"][key]           # its file is gone
+                    changed = True
+            elif data is not None and now - current["used"] > TOUCH_INTERVAL:
+                current["used"] = now
+                changed = True
+            return changed
+        _update(cache_dir, m, change)
+        return data
+    except (OSError, ValueError):
+        return None
+
+
+def put(kind, path, data):
+    """Store *data* (bytes) as the *kind* entry for the file at *path*."""
+    try:
+        cache_dir = settings.cache_dir()
+        abspath = os.path.abspath(path)
+        rec = _path_record(_load_manifest(cache_dir), abspath)
+        key = f"{kind}-{rec['sha256']}"
+        now = time.time()
+        with _locked(cache_dir):
+            m = _load_manifest(cache_dir)
+            _atomic_write(os.path.join(cache_dir, key + ".bin"), data)
+            _note_paths(m, {abspath: rec}, now)
+            m["entries"][key] = {"file": key + ".bin", "bytes": len(data), "used": now}
+            _evict(cache_dir, m)
+            _save_manifest(cache_dir, m)
+    except (OSError, ValueError):
+        pass
+
+
+def content_hashes(paths):
+    """
+    ``{path: sha256 or None}`` for *paths*, reusing digests the cache has
+    already recorded for unchanged files (same size and mtime) instead of
+    re-reading them.  Missing files map to None.
+    """
+    cache_dir = settings.cache_dir()
+    m = _load_manifest(cache_dir)
+    out, records = {}, {}
+    for path in paths:
+        abspath = os.path.abspath(path)
+        try:
+            records[abspath] = _path_record(m, abspath)
+        except OSError:
+            out[path] = None
+            continue
+        out[path] = records[abspath]["sha256"]
+    now = time.time()
+    try:
+        _update(cache_dir, m, lambda m: _note_paths(m, records, now))
+    except OSError:
+        pass
+    return out
+
+
+# ── Row tables ──────────────────────────────────────────────────────────────
+
+def _get_rows(kind, path):
+    data = get(kind, path)
+    if data is None:
+        return None
+    try:
+        return json.loads(zlib.decompress(data).decode("utf-8"))
+    except (zlib.error, ValueError):
+        return None
+
+
+def _put_rows(kind, path, rows):
+    payload = json.dumps([list(r) for r in rows], separators=(",", ":"))
+    put(kind, path, zlib.compress(payload.encode("utf-8")))
+
+
+def load_template_index(path):
+    """Cached template index rows ``[name, b12, grade, casting, part]`` or None."""
+    return _get_rows(TEMPLATE_INDEX_KIND, path)
+
+
+def store_template_index(path, rows):
+    """Cache template index rows for the file at *path*."""
+    _put_rows(TEMPLATE_INDEX_KIND, path, rows)
+
+
+def load_calendar(path):
+    """Cached compiled calendar rows ``[date_key, 7_days, 28_days]`` or None."""
+    return _get_rows(CALENDAR_KIND, path)
+
+
+def store_calendar(path, rows):
+    """Cache compiled calendar rows for the calendar file at *path*."""
+    _put_rows(CALENDAR_KIND, path, rows)
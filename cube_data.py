@@ -0,0 +1,169 @@
+"""
+Headless command-line entry point.
+
+    python -m cube_data "templates/*.xlsx" --mode generate+date \
+        --calendar calendar.xlsx --output out/ --seed 1234
+
+Processes every matching template in one invocation and prints a JSON
+summary on stdout (logs go to stderr).  Nothing here imports Tk or
+customtkinter, so it starts fast enough for cron and CI.
+
+Exit status: 0 if every template succeeded, 1 if any failed, 2 on bad usage.
+
+    python -m cube_data history --metric elapsed --by mode
+    python -m cube_data watch INBOX --outbox OUTBOX --calendar calendar.xlsx
+    python -m cube_data serve --host 0.0.0.0 --token SECRET
+
+report percentiles and trends from the local run history (``history``),
+process templates dropped into a folder until stopped (``watch``) and
+serve jobs to GUI/remote clients over HTTP (``serve``, see ``jobserver``);
+``<command> --help`` lists their options.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+MODES = ("generate+date", "generate", "date_only", "grade_files+date", "grade_files")
+
+
+def expand_templates(patterns):
+    """Expand glob patterns to a sorted, de-duplicated list of template files.
+
+    Excel lock files (``~$...``) and previous ``*_Processed.xlsx`` outputs
+    are skipped so an output folder can safely overlap the input folder.
+    """
+    found = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) or ([pattern] if os.path.isfile(pattern) else [])
+        for path in matches:
+            name = os.path.basename(path)
+            if name.startswith("~$") or name.endswith("_Processed.xlsx") or not os.path.isfile(path):
+                continue
+            found.add(os.path.abspath(path))
+    return sorted(found)
+
+
+def build_parser():
+    p = argparse.ArgumentParser(
+        prog="python -m cube_data",
+        description="Generate and apply cube test data to office templates (no GUI).")
+    p.add_argument("templates", nargs="+", metavar="TEMPLATE_GLOB",
+                   help="template file(s) or glob pattern(s), e.g. 'site/*.xlsx'")
+    p.add_argument("-m", "--mode", choices=MODES, default="generate+date",
+                   help="processing mode (default: %(default)s)")
+    p.add_argument("-c", "--calendar", help="calendar workbook (required for *date modes)")
+    p.add_argument("-o", "--output", required=True, help="output folder")
+    p.add_argument("-s", "--seed", type=int,
+                   help="master seed; each template gets a seed derived from it")
+    p.add_argument("-g", "--grades",
+                   help="comma-separated grades to fill (default: auto-detect from B12)")
+    p.add_argument("--grade-file", action="append", default=[], dest="grade_files",
+                   metavar="PATH",
+                   help="grade file, .xlsx/.csv/.npz/.parquet named after its grade (repeatable)")
+    p.add_argument("--engine", choices=("stream", "openpyxl"), default="stream",
+                   help="workbook engine (default: %(default)s)")
+    p.add_argument("-j", "--workers", type=int, default=1,
+                   help="templates processed in parallel; 0 = one per CPU (default: 1)")
+    p.add_argument("--sheet-workers", type=int, default=1, metavar="N",
+                   help="stream engine: patch a workbook's sheets in N processes (0 = per CPU); "
+                        "capped at CPUs / --workers when several templates run at once")
+    p.add_argument("--max-task-memory", type=int, metavar="MB",
+                   help="per-worker memory cap in MB (POSIX only)")
+    p.add_argument("--no-cache", action="store_true", help="do not read or write the index cache")
+    p.add_argument("--incremental", action="store_true",
+                   help="stream engine: reuse the previous output's seed and unchanged sheets")
+    p.add_argument("--summary", metavar="PATH", help="also write the JSON summary to PATH")
+    p.add_argument("--profile-cpu", action="store_true",
+                   help="include a cProfile summary in each result")
+    p.add_argument("--profile-memory", action="store_true",
+                   help="include tracemalloc peak/top allocations in each result")
+    p.add_argument("--trace", metavar="DIR",
+                   help="write a Chrome trace (<template>.trace.json) per template to DIR")
+    p.add_argument("-q", "--quiet", action="store_true", help="suppress per-sheet logging")
+    return p
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["history"]:
+        import history
+        return history.main(argv[1:])
+    if argv[:1] == ["watch"]:
+        import watch
+        return watch.main(argv[1:])
+    if argv[:1] == ["serve"]:
+        import jobserver
+        return jobserver.main(argv[1:])
+    args = build_parser().parse_args(argv)
+
+    templates = expand_templates(args.templates)
+    if not templates:
+        print("error: no templates matched", file=sys.stderr)
+        return 2
+    if "date" in args.mode and not args.calendar:
+        print(f"error: --calendar is required for mode {args.mode}", file=sys.stderr)
+        return 2
+    if "grade_files" in args.mode and not args.grade_files:
+        print(f"error: --grade-file is required for mode {args.mode}", file=sys.stderr)
+        return 2
+    if args.incremental and args.engine != "stream":
+        print("error: --incremental needs --engine stream", file=sys.stderr)
+        return 2
+    os.makedirs(args.output, exist_ok=True)
+    if args.trace:
+        os.makedirs(args.trace, exist_ok=True)
+
+    from processor import process_many
+
+    def log(msg):
+        if not args.quiet:
+            print(msg, file=sys.stderr)
+
+    # Share the CPUs between template and sheet workers instead of starting
+    # workers × sheet_workers processes
+    cpus = os.cpu_count() or 1
+    workers = min(args.workers or cpus, len(templates))
+    sheet_workers = args.sheet_workers or cpus
+    if workers > 1:
+        sheet_workers = min(sheet_workers, max(1, cpus // workers))
+
+    started = time.perf_counter()
+    results = process_many(
+        templates, args.output, args.mode, log,
+        seed=args.seed,
+        workers=workers,
+        max_task_memory_mb=args.max_task_memory,
+        selected_grades=[g.strip() for g in args.grades.split(",")] if args.grades else None,
+        grade_files=args.grade_files or None,
+        calendar_file=args.calendar,
+        engine=args.engine,
+        sheet_workers=sheet_workers,
+        use_cache=not args.no_cache,
+        incremental=args.incremental,
+        profile_cpu=args.profile_cpu,
+        profile_memory=args.profile_memory,
+        trace_file=args.trace,
+    )
+    summary = {
+        "ok": all(r.ok for r in results),
+        "mode": args.mode,
+        "templates": len(results),
+        "failed": sum(not r.ok for r in results),
+        "elapsed": round(time.perf_counter() - started, 3),
+        "results": [r.to_dict() for r in results],
+    }
+
+    text = json.dumps(summary, indent=2, ensure_ascii=False)
+    print(text)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0 if summary["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
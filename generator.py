@@ -6,6 +6,13 @@ in-memory, ready for direct processing without intermediate Excel files.
 Based on: https://github.com/Sandeep2062/Cube-Data-Generator
 """
 
+import functools
+import hashlib
+import os
+import struct
+import zipfile
+from collections import namedtuple
+
 import numpy as np
 
 
@@ -39,28 +46,169 @@ STRENGTH_28D_RANGES = {
 ALL_TYPES = CONCRETE_GRADES + MORTAR_TYPES
 
 
-def _generate_unique_values(min_val, max_val, count, decimals=2, min_gap=0.0):
-    """Generate *count* unique random values in [min_val, max_val] with a minimum gap."""
-    values = []
-    max_attempts = 2000
+# ── Random streams ─────────────────────────────────────────────────────────
+
+# Uniform draws consumed per row: a Floyd pick and a shuffle key for each of
+# the 6 weights, 3 seven-day and 3 twenty-eight-day values.
+DRAWS_PER_ROW = 2 * (6 + 3 + 3)
+
+_default_rng = None
+
+
+def new_seed():
+    """Return a fresh random master seed (an int suitable for logging/reuse)."""
+    return int(np.random.SeedSequence().entropy)
+
+
+def make_rng(seed=None):
+    """
+    Return a ``numpy.random.Generator``.
 
-    attempts = 0
-    while len(values) < count and attempts < max_attempts:
-        val = round(np.random.uniform(min_val, max_val), decimals)
-        if val not in values and all(abs(val - v) >= min_gap for v in values):
-            values.append(val)
-        attempts += 1
+    *seed* may be ``None`` (shared process-wide stream), an int master seed,
+    a ``SeedSequence`` or an existing ``Generator`` (returned unchanged).
+    """
+    global _default_rng
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if seed is None:
+        if _default_rng is None:
+            _default_rng = np.random.default_rng()
+        return _default_rng
+    return np.random.default_rng(seed)
 
-    # Fallback – nudge duplicates
-    while len(values) < count:
-        val = values[-1] + round(np.random.uniform(0.001, 0.009), 3)
-        if min_val <= val <= max_val and val not in values:
-            values.append(round(val, decimals))
 
-    return values[:count]
+def sheet_key(sheet_name):
+    """
+    Stable spawn key for a sheet name: its 128-bit BLAKE2b digest as four
+    32-bit words, wide enough that two names never share a stream.
+    """
+    digest = hashlib.blake2b(str(sheet_name).encode("utf-8"), digest_size=16).digest()
+    return tuple(int.from_bytes(digest[i:i + 4], "little") for i in range(0, 16, 4))
 
 
-def generate_row(grade_or_type):
+def sheet_seed_sequence(seed, sheet_name):
+    """
+    Child ``SeedSequence`` for one sheet of a run seeded with *seed*.
+
+    Like a child of ``SeedSequence(seed).spawn``, but addressed by the sheet's
+    name instead of its position, so a sheet keeps its values when other
+    sheets are added, removed or processed elsewhere.
+    """
+    return np.random.SeedSequence(seed, spawn_key=sheet_key(sheet_name))
+
+
+def derive_seed(seed, name):
+    """Child master seed (int) for a named unit of work, e.g. one template in a batch."""
+    return int(sheet_seed_sequence(seed, name).generate_state(1, np.uint64)[0])
+
+
+def sheet_rng(seed, sheet_name):
+    """Independent ``Generator`` for one sheet of a run seeded with *seed*."""
+    return np.random.default_rng(sheet_seed_sequence(seed, sheet_name))
+
+
+# ── Value lattices ─────────────────────────────────────────────────────────
+
+# Admissible values of one field: every 10**-decimals step in its range.
+# ``count`` values are drawn per row, neighbours at least ``gap`` steps apart;
+# ``slots`` is the size of the shrunk index space those draws are made in.
+Lattice = namedtuple("Lattice", ["values", "count", "gap", "slots"])
+
+
+def _gap_params(grade_or_type):
+    """Return (weight_gap, strength_gap) for a grade/type."""
+    if grade_or_type in MORTAR_TYPES:
+        return 0.005, 1.0
+    return 0.015, 5.0
+
+
+def _lattice(min_val, max_val, count, decimals, min_gap):
+    """
+    Lattice for *count* values in [min_val, max_val] at least *min_gap* apart.
+
+    Raises ValueError when they cannot fit, so an impossible range fails
+    up front instead of sampling forever.
+    """
+    scale = 10 ** decimals
+    lo = int(np.ceil(round(min_val * scale, 6)))
+    hi = int(np.floor(round(max_val * scale, 6)))
+    gap = max(1, int(np.ceil(round(min_gap * scale, 6))))
+    slots = (hi - lo) - (count - 1) * (gap - 1) + 1
+    if count < 1 or slots < count:
+        raise ValueError(
+            f"cannot draw {count} values from [{min_val}, {max_val}] at {decimals} "
+            f"decimals with a minimum gap of {min_gap}")
+    values = np.round(np.arange(lo, hi + 1) / scale, decimals)
+    values.setflags(write=False)
+    return Lattice(values, count, gap, slots)
+
+
+@functools.lru_cache(maxsize=None)
+def grade_lattices(grade_or_type):
+    """
+    (weights, 7-day, 28-day) ``Lattice`` for a grade/type.
+
+    Built on first use and memoized for the life of the process.
+    """
+    weight_gap, strength_gap = _gap_params(grade_or_type)
+    return (
+        _lattice(*WEIGHT_RANGES[grade_or_type], 6, 3, weight_gap),
+        _lattice(*STRENGTH_7D_RANGES[grade_or_type], 3, 2, strength_gap),
+        _lattice(*STRENGTH_28D_RANGES[grade_or_type], 3, 2, strength_gap),
+    )
+
+
+# ── Sampling ────────────────────────────────────────────────────────────────
+
+def sample_unique_values(min_val, max_val, count, decimals=2, min_gap=0.0, rng=None):
+    """
+    Draw *count* distinct values in [min_val, max_val], rounded to *decimals*
+    and pairwise at least *min_gap* apart, in random order.
+
+    Uses exactly ``2 * count`` uniforms and O(count**2) work however tight the
+    range is; raises ValueError if the values cannot fit.
+    """
+    lattice = _lattice(min_val, max_val, count, decimals, min_gap)
+    return _sample_gapped(lattice, make_rng(rng).random((1, 2 * count)))[0].tolist()
+
+
+def _sample_gapped(lattice, draws):
+    """
+    Turn ``draws`` (shape ``(n, 2*count)``, uniform in [0, 1)) into *n* rows
+    of ``lattice.count`` values from ``lattice.values``.
+
+    Each row is a uniformly chosen gap-respecting subset: ``count`` distinct
+    slots are picked with a vectorized Floyd's algorithm (a fixed number of
+    draws, no rejection), then spread ``gap - 1`` steps apart and looked up
+    in the lattice.  The second half of each draw row shuffles the result.
+    """
+    values, count, gap, slots = lattice
+    n = draws.shape[0]
+
+    picked = np.empty((n, count), dtype=np.int64)
+    for i, j in enumerate(range(slots - count, slots)):
+        t = (draws[:, i] * (j + 1)).astype(np.int64)
+        dup = (picked[:, :i] == t[:, None]).any(axis=1)
+        picked[:, i] = np.where(dup, j, t)
+
+    picked.sort(axis=1)
+    picked += np.arange(count) * (gap - 1)
+
+    order = np.argsort(draws[:, count:2 * count], axis=1)
+    return values[np.take_along_axis(picked, order, axis=1)]
+
+
+def _rows_from_draws(grade_or_type, draws):
+    """Map a ``(n, DRAWS_PER_ROW)`` block of uniforms to weight/strength arrays."""
+    weights, strength_7d, strength_28d = grade_lattices(grade_or_type)
+    return (
+        _sample_gapped(weights, draws[:, 0:12]),
+        _sample_gapped(strength_7d, draws[:, 12:18]),
+        _sample_gapped(strength_28d, draws[:, 18:24]),
+    )
+
+
+def generate_row(grade_or_type, rng=None):
     """
     Generate a single row of test data for the given grade / mortar type.
 
@@ -70,31 +218,218 @@ def generate_row(grade_or_type):
     strength_7d : list[float] — 3 values
     strength_28d : list[float] — 3 values
     """
-    w_min, w_max = WEIGHT_RANGES[grade_or_type]
-    s7_min, s7_max = STRENGTH_7D_RANGES[grade_or_type]
-    s28_min, s28_max = STRENGTH_28D_RANGES[grade_or_type]
+    weights, strength_7d, strength_28d = generate_batch(grade_or_type, 1, rng)
+    return weights[0].tolist(), strength_7d[0].tolist(), strength_28d[0].tolist()
+
+
+def generate_rows(grade_or_type, count, rng=None):
+    """Yield *count* rows of (weights, strength_7d, strength_28d)."""
+    weights, strength_7d, strength_28d = generate_batch(grade_or_type, count, rng)
+    for w, s7, s28 in zip(weights.tolist(), strength_7d.tolist(), strength_28d.tolist()):
+        yield w, s7, s28
+
+
+def generate_batch(grade_or_type, n, rng=None):
+    """
+    Generate *n* rows of test data for the given grade / mortar type at once.
+
+    *rng* is anything ``make_rng`` accepts; all rows come from that one stream.
+
+    Returns
+    -------
+    weights : np.ndarray      — shape (n, 6)
+    strength_7d : np.ndarray  — shape (n, 3)
+    strength_28d : np.ndarray — shape (n, 3)
+    """
+    draws = make_rng(rng).random((n, DRAWS_PER_ROW))
+    return _rows_from_draws(grade_or_type, draws)
 
-    is_mortar = grade_or_type in MORTAR_TYPES
-    weight_decimals = 3
-    weight_gap = 0.005 if is_mortar else 0.015
-    strength_gap = 1.0 if is_mortar else 5.0
 
-    weights = _generate_unique_values(w_min, w_max, 6, decimals=weight_decimals, min_gap=weight_gap)
-    np.random.shuffle(weights)
+def generate_for_sheets(grade_or_type, sheet_names, seed):
+    """
+    Generate one row per sheet, each from that sheet's own stream.
 
-    strength_7d = _generate_unique_values(s7_min, s7_max, 3, decimals=2, min_gap=strength_gap)
-    np.random.shuffle(strength_7d)
+    Row *i* depends only on ``(seed, sheet_names[i], grade_or_type)``, so any
+    single sheet can be regenerated on its own and parallel workers produce
+    exactly what a serial run does.  Returns arrays shaped like
+    ``generate_batch``.
+    """
+    draws = np.empty((len(sheet_names), DRAWS_PER_ROW))
+    for i, name in enumerate(sheet_names):
+        draws[i] = sheet_rng(seed, name).random(DRAWS_PER_ROW)
+    return _rows_from_draws(grade_or_type, draws)
 
-    strength_28d = _generate_unique_values(s28_min, s28_max, 3, decimals=2, min_gap=strength_gap)
-    np.random.shuffle(strength_28d)
 
-    return weights, strength_7d, strength_28d
+# ── Import / export ─────────────────────────────────────────────────────────
 
+# Row layout shared by every format: 6 weights, 3 seven-day, 3 28-day strengths
+ROW_COLUMNS = ([f"w{i}" for i in range(1, 7)] + [f"s7_{i}" for i in range(1, 4)]
+               + [f"s28_{i}" for i in range(1, 4)])
+ROW_FORMATS = (".csv", ".npz", ".parquet")
+EXPORT_CHUNK_ROWS = 65536
 
-def generate_rows(grade_or_type, count):
-    """Yield *count* rows of (weights, strength_7d, strength_28d)."""
-    for _ in range(count):
-        yield generate_row(grade_or_type)
+_CSV_FORMAT = ["%.3f"] * 6 + ["%.2f"] * 6
+_NPZ_MEMBER = "rows.npy"
+
+
+def _row_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in ROW_FORMATS:
+        raise ValueError(f"unsupported row format {ext!r} (expected one of {', '.join(ROW_FORMATS)})")
+    return ext
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet support needs pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+def _split_rows(table):
+    """(n, 12) row table → (weights, strength_7d, strength_28d) views."""
+    return table[:, 0:6], table[:, 6:9], table[:, 9:12]
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        self._f = open(path, "w", encoding="utf-8", newline="")
+        self._f.write(",".join(ROW_COLUMNS) + "\n")
+
+    def write(self, table):
+        np.savetxt(self._f, table, fmt=_CSV_FORMAT, delimiter=",")
+
+    def close(self):
+        self._f.close()
+
+
+class _NpzWriter:
+    """One uncompressed ``rows.npy`` member, streamed, so it can be memory-mapped."""
+
+    def __init__(self, path, rows):
+        self._zf = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True)
+        self._f = self._zf.open(_NPZ_MEMBER, "w", force_zip64=True)
+        np.lib.format.write_array_header_1_0(
+            self._f, {"descr": "<f8", "fortran_order": False, "shape": (rows, len(ROW_COLUMNS))})
+
+    def write(self, table):
+        self._f.write(np.ascontiguousarray(table, dtype="<f8").tobytes())
+
+    def close(self):
+        self._f.close()
+        self._zf.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path):
+        pa = _pyarrow()
+        self._pa = pa
+        self._writer = pa.parquet.ParquetWriter(
+            path, pa.schema([(name, pa.float64()) for name in ROW_COLUMNS]))
+
+    def write(self, table):
+        self._writer.write_table(self._pa.table(
+            {name: table[:, i] for i, name in enumerate(ROW_COLUMNS)}))
+
+    def close(self):
+        self._writer.close()
+
+
+_WRITERS = {".csv": _CsvWriter, ".parquet": _ParquetWriter}
+
+
+def _open_writer(path, rows):
+    """Writer for *path*'s format; NPZ needs the row count up front for its header."""
+    ext = _row_format(path)
+    return _NpzWriter(path, rows) if ext == ".npz" else _WRITERS[ext](path)
+
+
+def write_rows(path, weights, strength_7d, strength_28d):
+    """Write generated arrays (as returned by ``generate_batch``) to CSV, NPZ or Parquet."""
+    table = np.hstack([weights, strength_7d, strength_28d])
+    writer = _open_writer(path, len(table))
+    try:
+        writer.write(table)
+    finally:
+        writer.close()
+
+
+def export_generated(path, grade_or_type, count, rng=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Generate *count* rows for a grade/type straight into a CSV, NPZ or
+    Parquet file, ``chunk_rows`` at a time, so memory stays flat however
+    many rows are requested.  The rows equal ``generate_batch(grade, count, rng)``.
+    """
+    rng = make_rng(rng)
+    writer = _open_writer(path, count)
+    try:
+        for start in range(0, count, chunk_rows):
+            n = min(chunk_rows, count - start)
+            writer.write(np.hstack(generate_batch(grade_or_type, n, rng)))
+    finally:
+        writer.close()
+
+
+def _npz_member(path):
+    """
+    The array member of an NPZ: ``rows.npy`` as written here, or the only
+    array of any other NPZ (``np.savez(path, table)`` stores ``arr_0.npy``).
+    """
+    with zipfile.ZipFile(path) as zf:
+        names = [name for name in zf.namelist() if name.endswith(".npy")]
+    if _NPZ_MEMBER in names:
+        return _NPZ_MEMBER
+    if len(names) != 1:
+        raise ValueError(f"{os.path.basename(path)}: expected one array in the NPZ, "
+                         f"found {len(names)}")
+    return names[0]
+
+
+def _npz_memmap(path, member):
+    """Memory-map *member* of an uncompressed NPZ (None if it is compressed)."""
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(member)
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None
+        with open(path, "rb") as f:
+            f.seek(info.header_offset)
+            local = f.read(30)
+            name_len, extra_len = struct.unpack("<HH", local[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                           else np.lib.format.read_array_header_2_0)
+            shape, fortran, dtype = read_header(f)
+            offset = f.tell()
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape,
+                     order="F" if fortran else "C")
+
+
+def read_rows(path, mmap=True):
+    """
+    Load rows written by ``write_rows`` / ``export_generated``.
+
+    Returns ``(weights, strength_7d, strength_28d)`` float64 arrays shaped
+    like ``generate_batch``.  NPZ files are memory-mapped when *mmap* is set,
+    so only the rows actually used are read from disk.
+    """
+    ext = _row_format(path)
+    if ext == ".csv":
+        table = np.loadtxt(path, delimiter=",", skiprows=1, dtype=np.float64, ndmin=2)
+    elif ext == ".npz":
+        member = _npz_member(path)
+        table = _npz_memmap(path, member) if mmap else None
+        if table is None:
+            with np.load(path) as npz:
+                table = npz[member[:-4]]
+    else:
+        data = _pyarrow().parquet.read_table(path, columns=ROW_COLUMNS)
+        table = np.column_stack([data.column(name).to_numpy() for name in ROW_COLUMNS])
+    if table.ndim != 2 or table.shape[1] != len(ROW_COLUMNS):
+        raise ValueError(f"{os.path.basename(path)}: expected {len(ROW_COLUMNS)} columns")
+    return _split_rows(np.asarray(table, dtype=np.float64))
 
 
 def grade_display_name(grade_or_type):
@@ -0,0 +1,304 @@
+"""
+Local run history for capacity planning.
+
+Every ``process()`` run is recorded in ``~/.cube_data_aio/history.sqlite3``:
+template fingerprint (SHA-256 + size), mode, engine, app version, sheet
+counts per grade, per-phase timings, peak memory, seed and output path.
+The database runs in WAL mode so the GUI, CLI and batch workers can read
+while another run is being recorded; a batch is written in one
+transaction.
+
+``percentiles`` and ``trend`` summarise the history; the same reports
+are available from the command line:
+
+    python -m cube_data history --metric elapsed --by mode
+    python -m cube_data history --metric sheets_per_s --trend version
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from cache import content_hashes
+from settings import _SETTINGS_DIR
+from version import VERSION
+
+HISTORY_DB = os.path.join(_SETTINGS_DIR, "history.sqlite3")
+
+SCHEMA_VERSION = 1
+BUSY_TIMEOUT_MS = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id              INTEGER PRIMARY KEY,
+    recorded        REAL NOT NULL,          -- unix time the run finished
+    version         TEXT,
+    template        TEXT NOT NULL,
+    template_sha256 TEXT,
+    template_size   INTEGER,
+    mode            TEXT,
+    engine          TEXT,
+    ok              INTEGER NOT NULL,
+    cancelled       INTEGER NOT NULL,
+    error           TEXT,
+    seed            TEXT,                   -- text: master seeds exceed 64 bits
+    output          TEXT,
+    sheets          INTEGER,
+    total           INTEGER,
+    elapsed         REAL,
+    peak_memory     INTEGER,
+    counters        TEXT                    -- JSON
+);
+CREATE INDEX IF NOT EXISTS runs_template ON runs (template_sha256);
+CREATE INDEX IF NOT EXISTS runs_recorded ON runs (recorded);
+CREATE TABLE IF NOT EXISTS run_grades (
+    run_id  INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    grade   TEXT NOT NULL,
+    sheets  INTEGER NOT NULL,
+    PRIMARY KEY (run_id, grade)
+);
+CREATE TABLE IF NOT EXISTS run_phases (
+    run_id  INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    phase   TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (run_id, phase)
+);
+"""
+
+# Metrics understood by percentiles()/trend(); "phase:<path>" selects a phase time
+METRICS = ("elapsed", "sheets_per_s", "peak_memory", "sheets", "total")
+GROUPS = ("mode", "engine", "template", "version")
+TRENDS = ("version", "day", "week", "month")
+
+
+def connect(path=None):
+    """Open (creating if needed) the history database in WAL mode."""
+    path = path or HISTORY_DB
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        with conn:
+            conn.executescript(_SCHEMA)
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return conn
+
+
+# ── Recording ───────────────────────────────────────────────────────────────
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def _run_row(result, recorded, sha):
+    size = _size(result.template) if sha else None
+    counters = result.profile.get("counters", {})
+    return (
+        recorded, VERSION, os.path.abspath(result.template), sha, size,
+        result.mode, getattr(result, "engine", None), int(result.ok), int(result.cancelled),
+        result.error, None if result.seed is None else str(result.seed), result.output,
+        result.sheets, result.total, result.elapsed, getattr(result, "peak_memory", None),
+        json.dumps(counters, separators=(",", ":")),
+    )
+
+
+def record(results, path=None, hashes=None):
+    """
+    Append ``ProcessResult`` objects to the history in one transaction.
+
+    *hashes* ({template path: SHA-256}) supplies digests the caller already
+    has; the others come from the cache manifest.  Returns the new run ids.  Failures to record never fail a run: they
+    raise ``sqlite3.Error``/``OSError`` for the caller to log and ignore.
+    """
+    results = list(results)
+    if not results:
+        return []
+    recorded = time.time()
+    # Template digests come from the cache manifest, so unchanged templates are not re-hashed
+    known = {os.path.abspath(p): sha for p, sha in (hashes or {}).items()}
+    hashes = content_hashes({os.path.abspath(r.template) for r in results} - set(known))
+    hashes.update(known)
+    rows = [_run_row(r, recorded, hashes[os.path.abspath(r.template)]) for r in results]
+    conn = connect(path)
+    try:
+        ids = []
+        with conn:
+            for result, row in zip(results, rows):
+                cur = conn.execute(
+                    "INSERT INTO runs (recorded, version, template, template_sha256, template_size,"
+                    " mode, engine, ok, cancelled, error, seed, output, sheets, total, elapsed,"
+                    " peak_memory, counters) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", row)
+                ids.append(cur.lastrowid)
+            conn.executemany(
+                "INSERT INTO run_grades (run_id, grade, sheets) VALUES (?,?,?)",
+                [(run_id, grade, n) for run_id, r in zip(ids, results)
+                 for grade, n in (getattr(r, "grades", None) or {}).items()])
+            conn.executemany(
+                "INSERT INTO run_phases (run_id, phase, seconds) VALUES (?,?,?)",
+                [(run_id, phase, secs) for run_id, r in zip(ids, results)
+                 for phase, secs in r.profile.get("phases", {}).items()])
+        return ids
+    finally:
+        conn.close()
+
+
+# ── Queries ─────────────────────────────────────────────────────────────────
+
+def runs(template=None, mode=None, since=None, ok_only=True, limit=None, path=None):
+    """
+    Recorded runs, newest first, as dicts with ``grades`` and ``phases``.
+
+    *template* matches the path or SHA-256; *since* is a unix time.
+    """
+    where, args = [], []
+    if template:
+        where.append("(template = ? OR template_sha256 = ?)")
+        args += [os.path.abspath(template), template]
+    if mode:
+        where.append("mode = ?")
+        args.append(mode)
+    if since is not None:
+        where.append("recorded >= ?")
+        args.append(since)
+    if ok_only:
+        where.append("ok = 1")
+    filt = (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY recorded DESC, id DESC"
+    if limit:
+        filt += f" LIMIT {int(limit)}"
+    selected = f"SELECT id FROM runs{filt}"
+
+    conn = connect(path)
+    try:
+        out = {row["id"]: dict(row, grades={}, phases={})
+               for row in conn.execute(f"SELECT * FROM runs{filt}", args)}
+        for run_id, grade, n in conn.execute(
+                f"SELECT run_id, grade, sheets FROM run_grades WHERE run_id IN ({selected})", args):
+            out[run_id]["grades"][grade] = n
+        for run_id, phase, secs in conn.execute(
+                f"SELECT run_id, phase, seconds FROM run_phases WHERE run_id IN ({selected})", args):
+            out[run_id]["phases"][phase] = secs
+    finally:
+        conn.close()
+    for run in out.values():
+        run["counters"] = json.loads(run["counters"] or "{}")
+    return list(out.values())
+
+
+def _metric(run, metric):
+    if metric.startswith("phase:"):
+        return run["phases"].get(metric[len("phase:"):])
+    if metric == "sheets_per_s":
+        return run["sheets"] / run["elapsed"] if run["sheets"] and run["elapsed"] else None
+    return run.get(metric)
+
+
+def _percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an ascending list."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _summary(values, pcts):
+    values = sorted(values)
+    out = {"runs": len(values)}
+    out.update({f"p{p:g}": round(_percentile(values, p), 6) for p in pcts})
+    return out
+
+
+def _bucket(run, by):
+    if by in ("day", "week", "month"):
+        d = datetime.fromtimestamp(run["recorded"])
+        if by == "day":
+            return d.strftime("%Y-%m-%d")
+        if by == "week":
+            year, week, _ = d.isocalendar()
+            return f"{year}-W{week:02d}"
+        return d.strftime("%Y-%m")
+    return run.get(by)
+
+
+def percentiles(metric="elapsed", by="mode", pcts=(50, 90, 99), **filters):
+    """
+    ``{group: {"runs": n, "p50": ..., ...}}`` of *metric* grouped by *by*.
+
+    *filters* are passed to ``runs``.
+    """
+    groups = {}
+    for run in runs(**filters):
+        value = _metric(run, metric)
+        if value is not None:
+            groups.setdefault(_bucket(run, by), []).append(value)
+    return {group: _summary(values, pcts) for group, values in sorted(groups.items(),
+                                                                      key=lambda kv: str(kv[0]))}
+
+
+def trend(metric="sheets_per_s", by="version", **filters):
+    """
+    Median of *metric* per version or per day/week/month, oldest first, with
+    the change relative to the previous bucket.
+    """
+    buckets = {}
+    for run in reversed(runs(**filters)):       # oldest first, so versions keep release order
+        value = _metric(run, metric)
+        if value is not None:
+            buckets.setdefault(_bucket(run, by), []).append(value)
+    out, previous = [], None
+    for key, values in buckets.items():
+        median = _percentile(sorted(values), 50)
+        out.append({by: key, "runs": len(values), "median": round(median, 6),
+                    "change": round(median / previous - 1, 4) if previous else None})
+        previous = median
+    return out
+
+
+# ── Command line ────────────────────────────────────────────────────────────
+
+def build_parser():
+    import argparse
+    p = argparse.ArgumentParser(
+        prog="python -m cube_data history",
+        description="Report percentiles and trends from the local run history.")
+    p.add_argument("--metric", default="elapsed",
+                   help=f"one of {', '.join(METRICS)} or phase:<name> (default: %(default)s)")
+    p.add_argument("--by", choices=GROUPS, default="mode",
+                   help="group percentiles by this field (default: %(default)s)")
+    p.add_argument("--trend", choices=TRENDS,
+                   help="report the median per version/day/week/month instead")
+    p.add_argument("--template", help="only runs of this template (path or SHA-256)")
+    p.add_argument("--mode", help="only runs in this mode")
+    p.add_argument("--days", type=float, help="only runs from the last N days")
+    p.add_argument("--runs", type=int, metavar="N", help="list the last N runs instead")
+    p.add_argument("--db", help=f"history database (default: {HISTORY_DB})")
+    return p
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metric not in METRICS and not args.metric.startswith("phase:"):
+        print(f"error: unknown metric {args.metric!r}", file=sys.stderr)
+        return 2
+    filters = {"template": args.template, "mode": args.mode, "path": args.db,
+               "since": time.time() - args.days * 86400 if args.days else None}
+    if not os.path.exists(args.db or HISTORY_DB):
+        report = [] if args.runs or args.trend else {}
+    elif args.runs:
+        report = runs(limit=args.runs, ok_only=False, **filters)
+    elif args.trend:
+        report = trend(args.metric, args.trend, **filters)
+    else:
+        report = percentiles(args.metric, args.by, **filters)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
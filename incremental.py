@@ -0,0 +1,105 @@
+"""
+Incremental re-processing for the stream engine.
+
+Next to every ``<base>_Processed.xlsx`` a ``<base>_Processed.manifest.json``
+records, per sheet, what went into its output part: B12, the C17 casting
+date, the calendar entry, the master seed, the template part's CRC/size and
+a digest of the cells written.  An output sheet part is a pure function of
+the template part and the cells written into it, so when a later run
+computes the same fingerprint for a sheet its compressed bytes are copied
+from the previous output instead of being patched again — new or changed
+sheets are the only ones re-patched, everything else stays byte-identical.
+
+The manifest is ignored (full rebuild) if the output was modified since it
+was written, or was produced for a different template or mode.
+"""
+
+import hashlib
+import json
+import os
+import zipfile
+
+from atomicfile import write_bytes
+
+MANIFEST_VERSION = 2             # 2: 128-bit per-sheet spawn keys
+
+
+def manifest_path(out_path):
+    """Manifest file that belongs to the output workbook *out_path*."""
+    return os.path.splitext(out_path)[0] + ".manifest.json"
+
+
+def sheet_fingerprint(source_info, writes):
+    """Digest of a template part (its ZipInfo) plus the cells written into it."""
+    h = hashlib.sha256()
+    h.update(f"{source_info.CRC}:{source_info.file_size}".encode("ascii"))
+    for ref in sorted(writes):
+        h.update(f"\0{ref}={writes[ref]!r}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def load(out_path, template, mode):
+    """
+    Previous run's manifest for *out_path*, or None when it cannot be trusted
+    (missing, unreadable, other template/mode, or output changed since).
+    """
+    try:
+        with open(manifest_path(out_path), "r", encoding="utf-8") as f:
+            m = json.load(f)
+        st = os.stat(out_path)
+    except (OSError, ValueError):
+        return None
+    if (not isinstance(m, dict) or m.get("version") != MANIFEST_VERSION
+            or m.get("template") != os.path.abspath(template) or m.get("mode") != mode
+            or m.get("output") != {"size": st.st_size, "mtime_ns": st.st_mtime_ns}):
+        return None
+    return m
+
+
+def reusable_parts(manifest, fingerprints):
+    """
+    ``{part: ZipInfo}`` of previous-output members that can be copied as-is.
+
+    *fingerprints* maps sheet name → (part, fingerprint) for this run.  A
+    part is reused when its fingerprint is unchanged and the previous output
+    still holds the exact member the manifest describes.
+    """
+    if not manifest:
+        return {}
+    previous = manifest.get("sheets", {})
+    try:
+        with zipfile.ZipFile(manifest["output_path"]) as zf:
+            infos = {i.filename: i for i in zf.infolist()}
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return {}
+    reuse = {}
+    for name, (part, fp) in fingerprints.items():
+        rec = previous.get(name)
+        info = infos.get(part)
+        if (rec and info and rec["part"] == part and rec["fingerprint"] == fp
+                and rec["output_crc"] == info.CRC):
+            reuse[part] = info
+    return reuse
+
+
+def save(out_path, template, mode, seed, sheets):
+    """
+    Record the manifest for the output just written to *out_path*.
+
+    *sheets* maps sheet name → dict with ``part``, ``fingerprint`` and the
+    informational ``b12`` / ``casting`` / ``calendar`` fields.
+    """
+    with zipfile.ZipFile(out_path) as zf:
+        crcs = {i.filename: i.CRC for i in zf.infolist()}
+    st = os.stat(out_path)
+    m = {
+        "version": MANIFEST_VERSION,
+        "template": os.path.abspath(template),
+        "mode": mode,
+        "seed": seed,
+        "output_path": os.path.abspath(out_path),
+        "output": {"size": st.st_size, "mtime_ns": st.st_mtime_ns},
+        "sheets": {name: dict(rec, output_crc=crcs.get(rec["part"]))
+                   for name, rec in sheets.items()},
+    }
+    write_bytes(manifest_path(out_path), json.dumps(m, separators=(",", ":")).encode("utf-8"))
@@ -0,0 +1,272 @@
+"""
+Client for ``jobserver``: run a job on a processing box instead of locally.
+
+``RemoteJob`` has the same interface as ``processor.Job`` (start, cancel,
+status, done, result), so callers such as the GUI can pick local or remote
+execution with one constructor:
+
+    job = RemoteJob("http://box:8765", template, out_dir, "generate+date", log,
+                    calendar_file=cal, token="SECRET").start()
+    result = job.result()       # ProcessResult; output downloaded to out_dir
+
+Files are uploaded (content-addressed, so a calendar already on the server
+is stored once), the job's log and progress are streamed back as they
+happen, and the processed workbook is downloaded atomically into the local
+output folder.
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future
+
+from atomicfile import atomic_output
+
+TIMEOUT = 30                # seconds per request (the event stream has none)
+CHUNK = 1 << 20
+
+# process() options a remote job can carry
+REMOTE_OPTIONS = ("selected_grades", "grade_files", "calendar_file", "seed", "engine")
+
+
+class RemoteError(Exception):
+    """The job server rejected a request or could not be reached."""
+
+
+class JobClient:
+    """Thin HTTP wrapper around the job server's endpoints."""
+
+    def __init__(self, server, token=None):
+        self.server = server.rstrip("/")
+        if "://" not in self.server:
+            self.server = "http://" + self.server
+        self.token = token
+
+    def _request(self, method, path, body=None, headers=None, timeout=TIMEOUT):
+        req = urllib.request.Request(self.server + path, data=body, method=method,
+                                     headers=dict(headers or {}))
+        if self.token:
+            # UTF-8 bytes: http.client would encode a str as latin-1
+            req.add_header("Authorization", f"Bearer {self.token}".encode("utf-8"))
+        try:
+            return urllib.request.urlopen(req, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.load(e).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise RemoteError(f"{method} {path}: {e.code} {message}") from None
+        except (urllib.error.URLError, OSError) as e:
+            raise RemoteError(f"cannot reach {self.server}: {e}") from None
+
+    def _json(self, method, path, data=None):
+        body = None if data is None else json.dumps(data).encode("utf-8")
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        with self._request(method, path, body, headers) as resp:
+            return json.load(resp)
+
+    def upload(self, path):
+        """Upload a file; returns its server-side id."""
+        name = urllib.parse.quote(os.path.basename(path))
+        with open(path, "rb") as f:
+            headers = {"Content-Type": "application/octet-stream",
+                       "Content-Length": str(os.fstat(f.fileno()).st_size)}
+            with self._request("POST", f"/uploads?name={name}", f, headers,
+                               timeout=None) as resp:
+                return json.load(resp)["id"]
+
+    def submit(self, spec):
+        return self._json("POST", "/jobs", spec)
+
+    def status(self, job_id):
+        return self._json("GET", f"/jobs/{job_id}")
+
+    def jobs(self):
+        return self._json("GET", "/jobs")
+
+    def cancel(self, job_id):
+        return self._json("DELETE", f"/jobs/{job_id}")
+
+    def events(self, job_id):
+        """Yield the job's events (dicts) until its final "result" event."""
+        with self._request("GET", f"/jobs/{job_id}/events", timeout=None) as resp:
+            for line in resp:
+                if line.strip():
+                    event = json.loads(line)
+                    yield event
+                    if event["event"] == "result":
+                        return
+        raise RemoteError("event stream ended before the job finished")
+
+    def download(self, job_id, dst):
+        """Save the job's output workbook to *dst* (atomically)."""
+        with self._request("GET", f"/jobs/{job_id}/output", timeout=None) as resp:
+            with atomic_output(dst) as tmp:
+                with open(tmp, "wb") as f:
+                    for chunk in iter(lambda: resp.read(CHUNK), b""):
+                        f.write(chunk)
+
+
+class RemoteJob:
+    """
+    One ``process()`` run on a job server, driven from a background thread.
+
+    Mirrors ``processor.Job``; keyword arguments are the ``process()``
+    options in REMOTE_OPTIONS (anything else raises TypeError).
+    """
+
+    def __init__(self, server, office_file, output_folder, mode, log=None, progress_cb=None,
+                 token=None, **kwargs):
+        unknown = set(kwargs) - set(REMOTE_OPTIONS)
+        if unknown:
+            raise TypeError(f"options not supported remotely: {', '.join(sorted(unknown))}")
+        self.client = JobClient(server, token)
+        self.office_file = office_file
+        self.output_folder = output_folder
+        self.mode = mode
+        self.future = Future()
+        self.job_id = None
+        self._log = log or (lambda msg: None)
+        self._progress_cb = progress_cb
+        self._kwargs = kwargs
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._state = "pending"
+        self._progress = 0.0
+        self._started = self._finished = None
+
+    def start(self):
+        with self._lock:
+            if self._state != "pending":
+                raise RuntimeError(f"job already {self._state}")
+            self._state = "running"
+        threading.Thread(target=self._run, daemon=True,
+                         name=f"remote-{os.path.basename(self.office_file)}").start()
+        return self
+
+    def _run(self):
+        self._started = time.perf_counter()
+        if not self.future.set_running_or_notify_cancel():
+            self._set_state("cancelled")
+            return
+        try:
+            result = self._execute()
+        except BaseException as e:
+            self._set_state("failed")
+            self.future.set_exception(e)
+            return
+        self._set_state("cancelled" if result.cancelled else "done" if result.ok else "failed")
+        self.future.set_result(result)
+
+    def _execute(self):
+        from processor import ProcessResult
+
+        kw = self._kwargs
+        self._log(f"  Server: {self.client.server}")
+        self._log("  Uploading inputs...")
+        spec = {
+            "name": os.path.basename(self.office_file),
+            "template": self.client.upload(self.office_file),
+            "mode": self.mode,
+            "seed": kw.get("seed"),
+            "grades": kw.get("selected_grades"),
+            "engine": kw.get("engine", "stream"),
+        }
+        if kw.get("calendar_file"):
+            spec["calendar"] = self.client.upload(kw["calendar_file"])
+        if kw.get("grade_files"):
+            spec["grade_files"] = [{"id": self.client.upload(f), "name": os.path.basename(f)}
+                                   for f in kw["grade_files"]]
+
+        result = ProcessResult(self.office_file, self.mode, engine=spec["engine"])
+        if self._cancel.is_set():
+            result.ok, result.cancelled, result.error = False, True, "Cancelled"
+            return result
+
+        self.job_id = self.client.submit(spec)["id"]
+        if self._cancel.is_set():               # cancelled during submit
+            self._request_cancel()
+        remote = {}
+        for event in self.client.events(self.job_id):
+            kind = event["event"]
+            if kind == "log":
+                self._log(event["message"])
+            elif kind == "progress":
+                self._on_progress(event["value"])
+            elif kind == "state" and event["state"] == "running":
+                self._log("  Running on server")
+            elif kind == "result":
+                remote = event["result"]
+
+        for key in ("ok", "cancelled", "error", "total", "seed", "sheets", "dates_updated",
+                    "elapsed", "grades", "peak_memory", "profile"):
+            if remote.get(key) is not None:
+                setattr(result, key, remote[key])
+        if result.ok and remote.get("output_name"):
+            out_path = os.path.join(self.output_folder, remote["output_name"])
+            self._log("  Downloading output...")
+            self.client.download(self.job_id, out_path)
+            result.output = out_path
+        return result
+
+    def _on_progress(self, value):
+        self._progress = value
+        if self._progress_cb:
+            self._progress_cb(value)
+
+    def _request_cancel(self):
+        try:
+            self.client.cancel(self.job_id)
+        except RemoteError:
+            pass            # already finished; the event stream reports the outcome
+
+    def _set_state(self, state):
+        with self._lock:
+            self._state = state
+            self._finished = time.perf_counter()
+
+    def cancel(self):
+        """Request cancellation; returns False if the job has already finished."""
+        with self._lock:
+            if self._state in ("done", "failed", "cancelled"):
+                return False
+            if self._state == "running":
+                self._state = "cancelling"
+        self._cancel.set()
+        if self.job_id is not None:
+            threading.Thread(target=self._request_cancel, daemon=True).start()
+        return True
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """The ``ProcessResult`` (waits up to *timeout* seconds)."""
+        return self.future.result(timeout)
+
+    def status(self):
+        """Snapshot of the job's state, progress and elapsed time."""
+        with self._lock:
+            state, started, finished = self._state, self._started, self._finished
+        end = finished if finished is not None else time.perf_counter()
+        return {
+            "template": self.office_file,
+            "mode": self.mode,
+            "state": state,
+            "phase": None,
+            "progress": round(self._progress, 4),
+            "elapsed": round(end - started, 3) if started is not None else 0.0,
+            "server": self.client.server,
+            "job_id": self.job_id,
+        }
+
+    def __repr__(self):
+        return f"<RemoteJob {os.path.basename(self.office_file)} {self._state} @ {self.client.server}>"
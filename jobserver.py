@@ -0,0 +1,586 @@
+"""
+HTTP job server: one processing box for many desktops (stdlib only).
+
+    python -m cube_data serve --host 0.0.0.0 --port 8765 --workers 4 --token SECRET
+
+Clients upload their files, submit a job that refers to them and follow
+its progress as a stream of JSON lines (``jobclient.RemoteJob`` does all
+of this and is what the GUI uses when a server URL is set):
+
+    POST   /uploads?name=site.xlsx    raw file body → {"id": "<sha256>.xlsx"}
+    POST   /jobs                      JSON {"template": id, "name": "site.xlsx",
+                                            "mode": ..., "calendar": id, "seed": ...,
+                                            "grades": [...], "engine": ...,
+                                            "grade_files": [{"id": ..., "name": ...}]}
+                                      → {"id": job id}
+    GET    /jobs                      status of every job
+    GET    /jobs/<id>                 status
+    GET    /jobs/<id>/events          log/progress/state events as JSON lines,
+                                      replayed from the oldest kept (the last
+                                      MAX_EVENTS), ending with "result"
+    GET    /jobs/<id>/output          the processed workbook
+    DELETE /jobs/<id>                 cancel (queued or running)
+
+Uploads are stored content-addressed under ``--data``, so a calendar that
+every client sends is kept once.  At most ``--workers`` jobs run at a time
+on a process pool through ``processor.process``; up to ``--max-queue``
+more wait their turn, and further submissions get 503.  Finished jobs and
+their outputs are dropped after JOB_TTL seconds, and uploads no live job
+uses after UPLOAD_TTL seconds.  Job state lives in
+memory only: restarting the server forgets it.
+
+The server binds to 127.0.0.1 unless told otherwise.  When it listens on
+the network, set ``--token`` (or CUBE_DATA_TOKEN) so that every request
+must carry ``Authorization: Bearer <token>``.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, urlsplit
+
+from settings import _SETTINGS_DIR
+
+DEFAULT_PORT = 8765
+DATA_DIR = os.path.join(_SETTINGS_DIR, "server")
+MAX_UPLOAD_BYTES = 1 << 30
+MAX_JSON_BYTES = 1 << 20
+MAX_QUEUE = 32
+JOB_TTL = 3600
+UPLOAD_TTL = 3600           # an upload is kept this long after it was last sent
+MAX_EVENTS = 1000           # events kept per job for replay; older ones are dropped
+CHUNK = 1 << 20
+UPLOAD_EXTENSIONS = (".xlsx", ".csv", ".npz", ".parquet")
+
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{64}(\.xlsx|\.csv|\.npz|\.parquet)$")
+_REASONS = {200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request",
+            401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+            409: "Conflict", 411: "Length Required", 413: "Payload Too Large",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+_FINISHED = ("done", "failed", "cancelled")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ── Pool workers ────────────────────────────────────────────────────────────
+
+# Set in pool workers by _init_worker
+_worker_queue = None
+_worker_flags = None
+
+
+def _init_worker(queue, flags):
+    global _worker_queue, _worker_flags
+    _worker_queue, _worker_flags = queue, flags
+
+
+class _SlotFlag:
+    """``threading.Event``-like view of one cancel flag shared with the server."""
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def is_set(self):
+        return bool(_worker_flags[self.slot])
+
+
+def _run_job(job_id, slot, template, output_folder, mode, kwargs):
+    """Pool worker body: run one job, streaming log/progress events to the server."""
+    import processor
+    queue = _worker_queue
+    try:
+        result = processor.process(template, output_folder, mode,
+                                   lambda msg: queue.put((job_id, "log", msg)),
+                                   progress_cb=lambda v: queue.put((job_id, "progress", v)),
+                                   cancel=_SlotFlag(slot), **kwargs)
+    except Exception as e:
+        result = processor.ProcessResult(template, mode, ok=False, error=str(e))
+    return result.to_dict()
+
+
+# ── Jobs ────────────────────────────────────────────────────────────────────
+
+class _Job:
+    def __init__(self, job_id, name, mode, folder):
+        self.id = job_id
+        self.name = name
+        self.mode = mode
+        self.folder = folder
+        self.state = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.submitted = time.time()
+        self.started = self.finished = None
+        self.slot = None
+        self.task = None
+        self.uploads = set()        # upload ids placed into this job
+        self.events = deque(maxlen=MAX_EVENTS)     # (sequence number, event)
+        self.sequence = 0
+        self.changed = asyncio.Condition()
+
+    async def emit(self, event):
+        async with self.changed:
+            # Only the latest progress matters: replace a progress event still at the end
+            if event["event"] == "progress" and self.events \
+                    and self.events[-1][1]["event"] == "progress":
+                self.events.pop()
+            self.sequence += 1
+            self.events.append((self.sequence, event))
+            self.changed.notify_all()
+
+    async def set_state(self, state):
+        self.state = state
+        if state == "running":
+            self.started = time.time()
+        elif state in _FINISHED:
+            self.finished = time.time()
+        await self.emit({"event": "state", "state": state})
+
+    def status(self):
+        end = self.finished or time.time()
+        return {
+            "id": self.id,
+            "template": self.name,
+            "mode": self.mode,
+            "state": self.state,
+            "progress": round(self.progress, 4),
+            "elapsed": round(end - self.started, 3) if self.started else 0.0,
+            "submitted": self.submitted,
+            "output": bool(self.result and self.result.get("output")),
+        }
+
+
+class JobServer:
+    """Job registry, upload store and process pool behind the HTTP handler."""
+
+    def __init__(self, data_dir=DATA_DIR, workers=1, max_queue=MAX_QUEUE, token=None,
+                 log=None):
+        self.data_dir = os.path.abspath(data_dir)
+        self.uploads = os.path.join(self.data_dir, "uploads")
+        self.jobs_dir = os.path.join(self.data_dir, "jobs")
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.token = token
+        self.log = log or (lambda msg: None)
+        self.jobs = {}
+        self._free_slots = list(range(self.workers))
+        self._slots = asyncio.Semaphore(self.workers)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queue = self._ctx.Queue()
+        self._flags = self._ctx.Array("b", self.workers, lock=False)
+        self._pool = self._new_pool()
+        for folder in (self.uploads, self.jobs_dir):
+            os.makedirs(folder, exist_ok=True)
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=self._ctx,
+                                   initializer=_init_worker,
+                                   initargs=(self._queue, self._flags))
+
+    # ── Uploads ────────────────────────────────────────────────────────
+
+    async def store_upload(self, reader, length, name):
+        ext = os.path.splitext(name)[1].lower()
+        if ext not in UPLOAD_EXTENSIONS:
+            raise HTTPError(400, f"unsupported file type {ext!r}")
+        if length > MAX_UPLOAD_BYTES:
+            raise HTTPError(413, "upload too large")
+        h = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.uploads, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                remaining = length
+                while remaining:
+                    chunk = await reader.read(min(CHUNK, remaining))
+                    if not chunk:
+                        raise HTTPError(400, "upload truncated")
+                    h.update(chunk)
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            upload_id = h.hexdigest() + ext
+            os.replace(tmp, os.path.join(self.uploads, upload_id))     # new mtime: fresh again
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self._expire()
+        return upload_id
+
+    def _upload_path(self, upload_id):
+        if not isinstance(upload_id, str) or not _UPLOAD_ID_RE.match(upload_id):
+            raise HTTPError(400, f"bad upload id {upload_id!r}")
+        path = os.path.join(self.uploads, upload_id)
+        if not os.path.exists(path):
+            raise HTTPError(404, f"unknown upload {upload_id}")
+        return path
+
+    def _place(self, upload_id, folder, name):
+        """Link (or copy) an upload into a job folder under its original name."""
+        name = os.path.basename(str(name or ""))
+        if not name or name.startswith("."):
+            raise HTTPError(400, f"bad file name {name!r}")
+        src, dst = self._upload_path(upload_id), os.path.join(folder, name)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+        return dst
+
+    # ── Jobs ───────────────────────────────────────────────────────────
+
+    def submit(self, spec):
+        from cube_data import MODES
+        mode = spec.get("mode", "generate+date")
+        if mode not in MODES:
+            raise HTTPError(400, f"unknown mode {mode!r}")
+        if "date" in mode and not spec.get("calendar"):
+            raise HTTPError(400, f"mode {mode} needs a calendar")
+        if "grade_files" in mode and not spec.get("grade_files"):
+            raise HTTPError(400, f"mode {mode} needs grade files")
+        if sum(j.state == "queued" for j in self.jobs.values()) >= self.max_queue:
+            raise HTTPError(503, "job queue is full, try again later")
+
+        job_id = uuid.uuid4().hex
+        folder = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(os.path.join(folder, "in"))
+        try:
+            template = self._place(spec.get("template"), folder, spec.get("name"))
+            kwargs = {
+                "engine": spec.get("engine", "stream"),
+                "seed": _int_or_none(spec.get("seed")),
+                "selected_grades": spec.get("grades") or None,
+            }
+            if spec.get("calendar"):
+                kwargs["calendar_file"] = self._place(spec["calendar"], os.path.join(folder, "in"),
+                                                      "calendar" + os.path.splitext(
+                                                          spec["calendar"])[1])
+            if spec.get("grade_files"):
+                kwargs["grade_files"] = [self._place(g.get("id"), os.path.join(folder, "in"),
+                                                     g.get("name"))
+                                         for g in spec["grade_files"]]
+        except BaseException:
+            shutil.rmtree(folder, ignore_errors=True)
+            raise
+        if kwargs["engine"] not in ("stream", "openpyxl"):
+            shutil.rmtree(folder, ignore_errors=True)
+            raise HTTPError(400, f"unknown engine {kwargs['engine']!r}")
+
+        job = _Job(job_id, os.path.basename(template), mode, folder)
+        job.uploads = {spec["template"], spec.get("calendar")} \
+            | {g.get("id") for g in spec.get("grade_files") or ()}
+        self.jobs[job_id] = job
+        self._expire()
+        job.task = asyncio.get_running_loop().create_task(self._run(job, template, kwargs))
+        self.log(f"queued {job_id} {job.name} ({mode})")
+        return job
+
+    async def _run(self, job, template, kwargs):
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._slots:
+                job.slot = self._free_slots.pop()
+                self._flags[job.slot] = 0
+                await job.set_state("running")
+                pool = self._pool
+                try:
+                    result = await loop.run_in_executor(
+                        pool, _run_job, job.id, job.slot, template, job.folder,
+                        job.mode, kwargs)
+                finally:
+                    self._free_slots.append(job.slot)
+        except asyncio.CancelledError:          # cancelled while queued
+            result = {"ok": False, "cancelled": True, "error": "Cancelled"}
+        except BrokenProcessPool as e:          # a worker died; later jobs get a fresh pool
+            result = {"ok": False, "cancelled": False, "error": str(e) or "worker process died"}
+            if self._pool is pool:
+                self.log("⚠ Worker pool broken; starting a new one")
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._new_pool()
+        except Exception as e:                  # pickling errors, ...
+            result = {"ok": False, "cancelled": False, "error": str(e)}
+        job.result = result
+        if result.get("ok"):
+            job.progress = 1.0
+        await job.set_state("cancelled" if result.get("cancelled")
+                            else "done" if result.get("ok") else "failed")
+        await job.emit({"event": "result", "result": _public_result(result)})
+        self.log(f"{job.state} {job.id} {job.name}")
+
+    def cancel(self, job):
+        if job.state in _FINISHED:
+            return False
+        if job.state == "queued":
+            job.task.cancel()
+        elif job.slot is not None:
+            self._flags[job.slot] = 1
+        return True
+
+    def _expire(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.state in _FINISHED and now - job.finished > JOB_TTL:
+                shutil.rmtree(job.folder, ignore_errors=True)
+                del self.jobs[job_id]
+
+        # Uploads (and temp files of aborted ones) that no live job uses
+        live = set().union(*(job.uploads for job in self.jobs.values()
+                             if job.state not in _FINISHED))
+        for name in os.listdir(self.uploads):
+            if name in live:
+                continue
+            path = os.path.join(self.uploads, name)
+            try:
+                if now - os.stat(path).st_mtime > UPLOAD_TTL:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    async def pump_events(self):
+        """Forward log/progress events from pool workers to their jobs."""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await loop.run_in_executor(None, self._queue.get)
+            if item is None:
+                return
+            job_id, kind, payload = item
+            job = self.jobs.get(job_id)
+            if job is None:
+                continue
+            if kind == "progress":
+                job.progress = payload
+                await job.emit({"event": "progress", "value": round(payload, 4)})
+            else:
+                await job.emit({"event": "log", "message": payload})
+
+    def close(self):
+        self._queue.put(None)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ── HTTP ───────────────────────────────────────────────────────────
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                await self._dispatch(reader, writer)
+            except HTTPError as e:
+                await _send_json(writer, e.status, {"error": str(e)})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            except Exception as e:
+                self.log(f"error: {e!r}")
+                await _send_json(writer, 500, {"error": str(e)})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader, writer):
+        line = await reader.readline()
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        # Compare bytes: compare_digest rejects non-ASCII str with TypeError
+        if self.token and not hmac.compare_digest(
+                headers.get("authorization", "").encode("latin-1"),
+                f"Bearer {self.token}".encode("utf-8")):
+            raise HTTPError(401, "missing or wrong token")
+
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split("/") if p]
+        length = _content_length(headers, method)
+
+        if parts == ["uploads"] and method == "POST":
+            upload_id = await self.store_upload(reader, length, query.get("name", ""))
+            return await _send_json(writer, 201, {"id": upload_id})
+        if parts == ["jobs"] and method == "POST":
+            if length > MAX_JSON_BYTES:
+                raise HTTPError(413, "request too large")
+            try:
+                spec = json.loads(await reader.readexactly(length))
+            except ValueError:
+                raise HTTPError(400, "body must be JSON")
+            if not isinstance(spec, dict):
+                raise HTTPError(400, "body must be a JSON object")
+            job = self.submit(spec)
+            return await _send_json(writer, 202, job.status())
+        if parts == ["jobs"] and method == "GET":
+            return await _send_json(writer, 200, [j.status() for j in self.jobs.values()])
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise HTTPError(404, "unknown job")
+            tail = parts[2:]
+            if tail == [] and method == "GET":
+                return await _send_json(writer, 200, job.status())
+            if tail == [] and method == "DELETE":
+                if not self.cancel(job):
+                    raise HTTPError(409, f"job already {job.state}")
+                return await _send_json(writer, 202, job.status())
+            if tail == ["events"] and method == "GET":
+                return await _stream_events(writer, job)
+            if tail == ["output"] and method == "GET":
+                output = job.result and job.result.get("output")
+                if not output or not os.path.exists(output):
+                    raise HTTPError(409, f"job is {job.state}, no output")
+                return await _send_file(writer, output)
+        raise HTTPError(404 if method in ("GET", "POST", "DELETE") else 405, "no such endpoint")
+
+
+def _int_or_none(value):
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"bad seed {value!r}")
+
+
+def _public_result(result):
+    """Result fields worth sending to a client (no server paths)."""
+    out = {k: result.get(k) for k in ("ok", "cancelled", "error", "total", "seed", "sheets",
+                                      "dates_updated", "elapsed", "grades", "peak_memory")}
+    out["output_name"] = os.path.basename(result["output"]) if result.get("output") else None
+    out["profile"] = {k: v for k, v in (result.get("profile") or {}).items()
+                      if k in ("phases", "counters")}
+    return out
+
+
+def _content_length(headers, method):
+    if method not in ("POST", "PUT"):
+        return 0
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(411, "chunked uploads are not supported; send Content-Length")
+    try:
+        return int(headers["content-length"])
+    except (KeyError, ValueError):
+        raise HTTPError(411, "Content-Length required")
+
+
+def _head(status, content_type, length=None):
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+             f"Content-Type: {content_type}", "Connection: close", "Cache-Control: no-store"]
+    if length is not None:
+        lines.append(f"Content-Length: {length}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _send_json(writer, status, data):
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    writer.write(_head(status, "application/json", len(body)) + body)
+    await writer.drain()
+
+
+async def _send_file(writer, path):
+    loop = asyncio.get_running_loop()
+    with open(path, "rb") as f:
+        writer.write(_head(200, "application/vnd.openxmlformats-officedocument"
+                                ".spreadsheetml.sheet", os.fstat(f.fileno()).st_size))
+        while True:
+            chunk = await loop.run_in_executor(None, f.read, CHUNK)
+            if not chunk:
+                break
+            writer.write(chunk)
+            await writer.drain()
+
+
+async def _stream_events(writer, job):
+    """JSON lines, replayed from the oldest kept event; the body ends after "result"."""
+    writer.write(_head(200, "application/x-ndjson"))
+    sent = 0
+    while True:
+        async with job.changed:
+            await job.changed.wait_for(lambda: job.sequence > sent)
+            batch = [event for seq, event in job.events if seq > sent]
+            sent = job.sequence
+        writer.write(b"".join(json.dumps(e, ensure_ascii=False).encode("utf-8") + b"\n"
+                              for e in batch))
+        await writer.drain()
+        if batch[-1]["event"] == "result":
+            return
+
+
+# ── Command line ────────────────────────────────────────────────────────────
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT, **kwargs):
+    """Run a ``JobServer`` until cancelled (or sent SIGTERM)."""
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, task.cancel)
+    except NotImplementedError:         # Windows event loops
+        signal.signal(signal.SIGTERM, lambda *_: loop.call_soon_threadsafe(task.cancel))
+    server = JobServer(**kwargs)
+    pump = asyncio.create_task(server.pump_events())
+    http = await asyncio.start_server(server.handle, host, port)
+    server.log(f"Serving on http://{host}:{port}/ ({server.workers} worker(s), "
+               f"data in {server.data_dir})")
+    try:
+        async with http:
+            await http.serve_forever()
+    finally:
+        server.close()
+        await pump
+
+
+def build_parser():
+    p = argparse.ArgumentParser(
+        prog="python -m cube_data serve",
+        description="Serve processing jobs over HTTP to GUI and script clients.")
+    p.add_argument("--host", default="127.0.0.1",
+                   help="address to listen on; 0.0.0.0 for the LAN (default: %(default)s)")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT, help="default: %(default)s")
+    p.add_argument("-j", "--workers", type=int, default=1,
+                   help="jobs run at once; 0 = one per CPU (default: 1)")
+    p.add_argument("--max-queue", type=int, default=MAX_QUEUE,
+                   help="jobs allowed to wait for a worker (default: %(default)s)")
+    p.add_argument("--data", default=DATA_DIR, help="uploads and job folders (default: %(default)s)")
+    p.add_argument("--token", default=os.environ.get("CUBE_DATA_TOKEN"),
+                   help="shared secret clients must send (default: $CUBE_DATA_TOKEN)")
+    return p
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.host not in ("127.0.0.1", "localhost", "::1") and not args.token:
+        print("warning: listening beyond localhost without --token", file=sys.stderr)
+
+    def log(msg):
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {msg}", file=sys.stderr, flush=True)
+
+    try:
+        asyncio.run(serve(args.host, args.port, data_dir=args.data,
+                          workers=args.workers or os.cpu_count() or 1,
+                          max_queue=args.max_queue, token=args.token, log=log))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        log("Stopped")
+    return 0
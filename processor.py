@@ -5,11 +5,32 @@ Reads generated data and populates an office template workbook.
 Based on: https://github.com/Sandeep2062/Cube-Data-Processor
 """
 
+import datetime
+import multiprocessing
 import os
-import shutil
+import re
+import threading
+import time
+import zipfile
+from collections import Counter, namedtuple
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait,
+)
+from queue import Empty
+
+import numpy as np
 import openpyxl
 
-from generator import generate_rows, grade_display_name, MORTAR_TYPES, ALL_TYPES
+import cache
+import history as run_history
+from atomicfile import atomic_output
+import incremental as incremental_manifest
+from profiling import NULL_PROFILER, PeakRss, Profiler
+from xlsx_stream import PatchWorkbook, scan_cells
+from generator import (
+    derive_seed, generate_batch, generate_for_sheets, grade_display_name, new_seed,
+    read_rows, MORTAR_TYPES, ALL_TYPES, ROW_FORMATS,
+)
 
 
 # ── Helpers ─────────────────────────────────────────────────────────────────
@@ -29,6 +50,38 @@ def _extract_grade_from_filename(filepath):
     return name.replace("_", "").replace("-", "").strip()
 
 
+_ISO_DATE_RE = re.compile(r"^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?$")
+
+
+def date_key(value):
+    """
+    Canonical calendar key for a casting date.
+
+    Date cells and year-first text ("2026-01-05", "2026/1/5 00:00:00") map to
+    the same proleptic ordinal int, so a datetime cell matches its text
+    spelling.  Anything else falls back to its whitespace-normalised text.
+    """
+    if isinstance(value, datetime.datetime):
+        return value.date().toordinal()
+    if isinstance(value, datetime.date):
+        return value.toordinal()
+    text = " ".join(str(value).split())
+    m = _ISO_DATE_RE.match(text)
+    if m:
+        try:
+            return datetime.date(*map(int, m.groups())).toordinal()
+        except ValueError:
+            pass
+    return text
+
+
+def format_date_key(key):
+    """Human-readable form of a ``date_key`` result."""
+    if isinstance(key, int):
+        return datetime.date.fromordinal(key).isoformat()
+    return key
+
+
 def _load_workbook(filepath):
     """Open a workbook with safe defaults."""
     try:
@@ -37,16 +90,45 @@ def _load_workbook(filepath):
         return openpyxl.load_workbook(filepath)
 
 
+class Cancelled(Exception):
+    """Raised at a checkpoint once the run's cancel event is set."""
+
+
+def _checkpoint(cancel):
+    """Cooperative cancellation point (between sheets, phases and archive members)."""
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+
+
+def _open_template(office_file, engine, use_cache, log, profiler=NULL_PROFILER, cancel=None):
+    """
+    Open the template for *engine*; return (office_wb, index).
+
+    The index always comes from the cache or a streaming B12/C17 scan of the
+    archive, so the stream engine never builds a workbook at all and the
+    openpyxl engine only loads one for the cells it is about to write.
+    """
+    with profiler.phase("index"):
+        index = TemplateIndex.load_cached(office_file) if use_cache else None
+        if index is not None:
+            log("  Template index: cached")
+        else:
+            index = TemplateIndex.from_template(office_file, cancel)
+            profiler.count("sheets_scanned", len(index))
+            if use_cache:
+                index.store_cached(office_file)
+
+    if engine == "stream":
+        return PatchWorkbook(office_file, [(e.name, e.part) for e in index]), index
+    _checkpoint(cancel)
+    with profiler.phase("load"):
+        office_wb = _load_workbook(office_file)
+    return office_wb, index
+
+
 def _find_sheets_for_grade(office_wb, grade_name, log):
     """Return list of sheet names whose B12 matches *grade_name*."""
-    target = _normalise_grade_name(grade_name)
-    matches = []
-    for sheet_name in office_wb.sheetnames:
-        ws = office_wb[sheet_name]
-        b12 = ws["B12"].value
-        if b12 and _normalise_grade_name(str(b12)) == target:
-            matches.append(sheet_name)
-    return matches
+    return TemplateIndex.from_workbook(office_wb).sheets_for_grade(grade_name)
 
 
 def _grade_from_template_cell(value):
@@ -83,32 +165,131 @@ def _grade_from_template_cell(value):
     return None
 
 
-# ── Calendar logic ──────────────────────────────────────────────────────────
+# ── Template index ──────────────────────────────────────────────────────────
 
-def load_calendar_data(calendar_file, log):
-    """Load calendar Excel → dict[casting_date_str] → {7_days, 28_days}."""
-    if not calendar_file or not os.path.exists(calendar_file):
-        log("⚠ No calendar file selected")
+# One template sheet: raw B12 text, resolved grade, casting-date key, XML part
+SheetEntry = namedtuple("SheetEntry", ["name", "b12", "grade", "casting", "part"])
+
+
+def _casting_key(value):
+    """Calendar lookup key for a C17 casting date (None when blank)."""
+    if not value:
         return None
+    return date_key(value)
+
 
+class TemplateIndex:
+    """
+    Per-sheet grade and casting date of a template, built in a single pass.
+
+    Every apply_* function works from the index, so a workbook is scanned
+    once per run regardless of how many grades or modes are combined.
+    """
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self._by_b12 = {}
+        for e in self.entries:
+            if e.b12:
+                self._by_b12.setdefault(_normalise_grade_name(e.b12), []).append(e.name)
+
+    @classmethod
+    def from_workbook(cls, office_wb, cancel=None):
+        """Scan B12/C17 of every sheet once (openpyxl or stream workbook)."""
+        entries = []
+        for ws in office_wb.worksheets:
+            _checkpoint(cancel)
+            b12 = ws["B12"].value
+            entries.append(SheetEntry(
+                name=ws.title,
+                b12=str(b12) if b12 else None,
+                grade=_grade_from_template_cell(b12),
+                casting=_casting_key(ws["C17"].value),
+                part=getattr(ws, "part", None),
+            ))
+        return cls(entries)
+
+    @classmethod
+    def from_template(cls, filepath, cancel=None):
+        """Scan B12/C17 straight from the template's XML, without a workbook."""
+        return cls(SheetEntry(
+            name=name,
+            b12=str(cells["B12"]) if cells["B12"] else None,
+            grade=_grade_from_template_cell(cells["B12"]),
+            casting=_casting_key(cells["C17"]),
+            part=part,
+        ) for name, part, cells in scan_cells(filepath, ("B12", "C17"),
+                                                checkpoint=lambda: _checkpoint(cancel)))
+
+    @classmethod
+    def load_cached(cls, filepath):
+        """Index for *filepath* from the on-disk cache, or None on a miss."""
+        rows = cache.load_template_index(filepath)
+        if rows is None:
+            return None
+        return cls(SheetEntry(*row) for row in rows)
+
+    def store_cached(self, filepath):
+        """Save this index to the on-disk cache (sheet parts must be known)."""
+        if all(e.part for e in self.entries):
+            cache.store_template_index(filepath, self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def sheets_for_grade(self, grade_name):
+        """Sheet names whose B12 matches *grade_name* (spaces/case ignored)."""
+        return list(self._by_b12.get(_normalise_grade_name(grade_name), []))
+
+    def supported(self):
+        """[(sheet_name, grade)] for sheets whose B12 resolves to a known grade/type."""
+        return [(e.name, e.grade) for e in self.entries if e.grade]
+
+
+# ── Calendar logic ──────────────────────────────────────────────────────────
+
+def _read_calendar(calendar_file):
+    """Stream the calendar sheet → dict[date_key] → {7_days, 28_days}."""
+    wb = openpyxl.load_workbook(calendar_file, read_only=True, data_only=False, keep_links=False)
     try:
-        wb = _load_workbook(calendar_file)
-        ws = wb.active
         cal = {}
-        row = 2
-        while True:
-            casting = ws.cell(row=row, column=1).value
+        for casting, d7, d28 in wb.active.iter_rows(min_row=2, max_col=3, values_only=True):
             if not casting:
                 break
-            d7 = ws.cell(row=row, column=2).value
-            d28 = ws.cell(row=row, column=3).value
-            key = str(casting).strip()
-            cal[key] = {
+            cal[date_key(casting)] = {
                 "7_days": str(d7).strip() if d7 else "",
                 "28_days": str(d28).strip() if d28 else "",
             }
-            row += 1
+        return cal
+    finally:
         wb.close()
+
+
+def load_calendar_data(calendar_file, log, use_cache=True):
+    """
+    Load calendar Excel → dict[date_key] → {7_days, 28_days}.
+
+    The compiled mapping is cached (see ``cache``) and reused until the
+    calendar file changes.
+    """
+    if not calendar_file or not os.path.exists(calendar_file):
+        log("⚠ No calendar file selected")
+        return None
+
+    try:
+        rows = cache.load_calendar(calendar_file) if use_cache else None
+        if rows is not None:
+            cal = {key: {"7_days": d7, "28_days": d28} for key, d7, d28 in rows}
+            log(f"✓ Calendar loaded: {len(cal)} dates (cached)")
+            return cal
+
+        cal = _read_calendar(calendar_file)
+        if use_cache:
+            cache.store_calendar(calendar_file,
+                                 [(key, v["7_days"], v["28_days"]) for key, v in cal.items()])
         log(f"✓ Calendar loaded: {len(cal)} dates")
         return cal
     except Exception as e:
@@ -118,32 +299,68 @@ def load_calendar_data(calendar_file, log):
 
 # ── Date processing ─────────────────────────────────────────────────────────
 
-def apply_dates(office_wb, calendar_data, log):
+def apply_dates(office_wb, calendar_data, log, index=None, profiler=NULL_PROFILER,
+                cancel=None):
     """Write 7-day/28-day dates into every sheet based on C17 casting date."""
+    if index is None:
+        index = TemplateIndex.from_workbook(office_wb)
+    with profiler.phase("write"):
+        return _write_dates(office_wb, calendar_data, log, index, profiler, cancel)
+
+
+def _write_dates(office_wb, calendar_data, log, index, profiler, cancel):
     updated = 0
-    for sheet_name in office_wb.sheetnames:
-        ws = office_wb[sheet_name]
-        casting = ws["C17"].value
-        if not casting:
+    for entry in index:
+        _checkpoint(cancel)
+        key = entry.casting
+        if key is None:
             continue
-        key = str(casting).strip()
         if key in calendar_data:
+            ws = office_wb[entry.name]
             d7 = calendar_data[key]["7_days"]
             d28 = calendar_data[key]["28_days"]
             if d7:
                 ws["C18"] = d7
             if d28:
                 ws["F18"] = d28
+            profiler.count("cells_written", bool(d7) + bool(d28))
             updated += 1
-            log(f"  ✓ {sheet_name}: {key} → 7d:{d7}, 28d:{d28}")
+            log(f"  ✓ {entry.name}: {format_date_key(key)} → 7d:{d7}, 28d:{d28}")
         else:
-            log(f"  ⚠ Date not in calendar: {key} ({sheet_name})")
+            log(f"  ⚠ Date not in calendar: {format_date_key(key)} ({entry.name})")
     return updated
 
 
 # ── Grade processing (in-memory generation) ─────────────────────────────────
 
-def apply_generated_grades(office_wb, selected_grades, num_rows, log, progress_cb=None):
+# Cells one generated or grade-file row fills: 6 weights + 3 + 3 strengths
+_ROW_CELLS = 12
+
+
+def _write_generated_row(ws, weights, s7d, s28d):
+    """Write one generated row (NumPy arrays) into a template sheet."""
+    # Weights → row 25, columns C-H (3-8)
+    for i, v in enumerate(weights.tolist()):
+        ws.cell(row=25, column=3 + i, value=v)
+
+    # 7-day strengths → row 27, columns C-E (3-5)
+    for i, v in enumerate(s7d.tolist()):
+        ws.cell(row=27, column=3 + i, value=v)
+
+    # 28-day strengths → row 27, columns F-H (6-8)
+    for i, v in enumerate(s28d.tolist()):
+        ws.cell(row=27, column=6 + i, value=v)
+
+
+def _generate_for(grade, sheet_names, seed):
+    """Rows for *sheet_names*: per-sheet streams when seeded, one batch otherwise."""
+    if seed is None:
+        return generate_batch(grade, len(sheet_names))
+    return generate_for_sheets(grade, sheet_names, seed)
+
+
+def apply_generated_grades(office_wb, selected_grades, num_rows, log, progress_cb=None,
+                           seed=None, index=None, profiler=NULL_PROFILER, cancel=None):
     """
     For each selected grade, generate data in-memory and write directly
     into matching sheets of the office workbook.
@@ -155,43 +372,38 @@ def apply_generated_grades(office_wb, selected_grades, num_rows, log, progress_c
     num_rows : int                   rows to generate per grade (should >= sheets)
     log : callable
     progress_cb : callable(float)    optional 0-1 progress callback
+    seed : int | None                master seed; each sheet gets its own stream
+    index : TemplateIndex | None     prebuilt index (built from office_wb if None)
+    profiler : Profiler              optional phase timers ("generate", "write")
+    cancel : threading.Event | None  checked between sheets; raises Cancelled once set
 
     Returns total number of sheets populated.
     """
+    if index is None:
+        index = TemplateIndex.from_workbook(office_wb)
     total = 0
     grade_count = len(selected_grades)
 
     for gi, grade in enumerate(selected_grades):
         display = grade_display_name(grade)
-        sheets = _find_sheets_for_grade(office_wb, grade, log)
+        sheets = index.sheets_for_grade(grade)
         log(f"\n  Grade: {display}  →  {len(sheets)} matching sheets")
 
         if not sheets:
             log(f"  ⚠ No sheets with B12 = '{grade}'")
             continue
 
-        rows_needed = len(sheets)
-        gen = generate_rows(grade, rows_needed)
+        with profiler.phase("generate"):
+            weights, s7d, s28d = _generate_for(grade, sheets, seed)
+        profiler.count("rows_generated", len(sheets))
 
-        for si, (weights, s7d, s28d) in enumerate(gen):
-            if si >= len(sheets):
-                break
-            ws = office_wb[sheets[si]]
-
-            # Weights → row 25, columns C-H (3-8)
-            for i, v in enumerate(weights):
-                ws.cell(row=25, column=3 + i, value=v)
-
-            # 7-day strengths → row 27, columns C-E (3-5)
-            for i, v in enumerate(s7d):
-                ws.cell(row=27, column=3 + i, value=v)
-
-            # 28-day strengths → row 27, columns F-H (6-8)
-            for i, v in enumerate(s28d):
-                ws.cell(row=27, column=6 + i, value=v)
-
-            total += 1
-            log(f"    ✓ {sheets[si]} filled")
+        with profiler.phase("write"):
+            for si, sheet_name in enumerate(sheets):
+                _checkpoint(cancel)
+                _write_generated_row(office_wb[sheet_name], weights[si], s7d[si], s28d[si])
+                total += 1
+                log(f"    ✓ {sheet_name} filled")
+        profiler.count("cells_written", _ROW_CELLS * len(sheets))
 
         if progress_cb:
             progress_cb((gi + 1) / grade_count * 0.8)
@@ -199,19 +411,17 @@ def apply_generated_grades(office_wb, selected_grades, num_rows, log, progress_c
     return total
 
 
-def apply_generated_grades_from_template(office_wb, log, progress_cb=None):
+def apply_generated_grades_from_template(office_wb, log, progress_cb=None, seed=None,
+                                         index=None, profiler=NULL_PROFILER, cancel=None):
     """
-    Auto mode: read each sheet B12, detect grade/type, generate one row,
-    and write directly into that sheet.
+    Auto mode: use each sheet's B12 grade/type from the index, generate one
+    batch per detected grade, and write one row directly into each sheet.
     """
+    if index is None:
+        index = TemplateIndex.from_workbook(office_wb)
     total = 0
 
-    supported_sheets = []
-    for sheet_name in office_wb.sheetnames:
-        ws = office_wb[sheet_name]
-        grade = _grade_from_template_cell(ws["B12"].value)
-        if grade:
-            supported_sheets.append((sheet_name, grade))
+    supported_sheets = index.supported()
 
     total_supported = len(supported_sheets)
     log(f"  Supported sheets detected from B12: {total_supported}")
@@ -220,73 +430,144 @@ def apply_generated_grades_from_template(office_wb, log, progress_cb=None):
         log("  ⚠ No supported grades/types found in template B12 cells")
         return 0
 
-    for i, (sheet_name, grade) in enumerate(supported_sheets):
-        ws = office_wb[sheet_name]
-        weights, s7d, s28d = next(generate_rows(grade, 1))
-
-        for idx, value in enumerate(weights):
-            ws.cell(row=25, column=3 + idx, value=value)
-        for idx, value in enumerate(s7d):
-            ws.cell(row=27, column=3 + idx, value=value)
-        for idx, value in enumerate(s28d):
-            ws.cell(row=27, column=6 + idx, value=value)
+    # One vectorized batch per grade, handed out in sheet order
+    by_grade = {}
+    for sheet_name, grade in supported_sheets:
+        by_grade.setdefault(grade, []).append(sheet_name)
+    with profiler.phase("generate"):
+        batches = {grade: _generate_for(grade, names, seed) for grade, names in by_grade.items()}
+    profiler.count("rows_generated", total_supported)
+    cursor = dict.fromkeys(by_grade, 0)
+
+    with profiler.phase("write"):
+        for i, (sheet_name, grade) in enumerate(supported_sheets):
+            _checkpoint(cancel)
+            weights, s7d, s28d = batches[grade]
+            row = cursor[grade]
+            cursor[grade] += 1
+            _write_generated_row(office_wb[sheet_name], weights[row], s7d[row], s28d[row])
 
-        total += 1
-        log(f"    ✓ {sheet_name} filled ({grade_display_name(grade)})")
+            total += 1
+            log(f"    ✓ {sheet_name} filled ({grade_display_name(grade)})")
 
-        if progress_cb:
-            progress_cb((i + 1) / total_supported * 0.8)
+            if progress_cb:
+                progress_cb((i + 1) / total_supported * 0.8)
+    profiler.count("cells_written", _ROW_CELLS * total)
 
     return total
 
 
 # ── Grade processing (from existing Excel files – legacy) ──────────────────
 
-def apply_grade_files(office_wb, grade_files, log, progress_cb=None):
-    """Read existing grade Excel files and populate office template (legacy mode)."""
-    total = 0
-    file_count = len(grade_files)
+# Grade-file columns: weights in B:G, 7-day in I:K, 28-day in L:N (1-based 2-7, 9-14);
+# column H is not data and is never read.  Offsets are into iter_rows(min_col=2).
+_GRADE_WEIGHT_COLS = slice(0, 6)
+_GRADE_STRENGTH_COLS = slice(7, 13)
 
-    for fi, grade_file in enumerate(grade_files):
-        grade_wb = _load_workbook(grade_file)
-        grade_ws = grade_wb.active
-        grade_name = _extract_grade_from_filename(grade_file)
 
-        log(f"\n  File: {os.path.basename(grade_file)}  (grade: {grade_name})")
+def _grade_cell(value):
+    """
+    Number → float, empty → NaN; anything else (text, numeric text, formulas,
+    dates, booleans) is kept as-is, exactly as the legacy copy wrote it.
+    """
+    if value is None:
+        return np.nan
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return value
 
-        # Find last data row
-        row = 2
-        while grade_ws.cell(row=row, column=2).value not in (None, ""):
-            row += 1
-        last_row = row - 1
-        log(f"  Data rows: {last_row - 1}")
 
-        sheets = _find_sheets_for_grade(office_wb, grade_name, log)
-        log(f"  Matching sheets: {len(sheets)}")
+# One grade file read into float64 columns (NaN = empty cell); object columns
+# when a data cell holds text or a formula, which is written through as-is
+GradeRows = namedtuple("GradeRows", ["path", "grade", "weights", "strength_7d", "strength_28d"])
 
-        if not sheets:
-            grade_wb.close()
-            continue
 
-        si = 0
-        for r in range(2, last_row + 1):
-            if si >= len(sheets):
-                log("  ⚠ More data rows than sheets")
+def read_grade_file(grade_file):
+    """
+    Read a grade file into ``GradeRows``; the grade comes from the file name.
+
+    .xlsx files are streamed read-only from row 2 until the first row with an
+    empty column B.  Formula cells are read as their formula text (not cached
+    values), as the legacy cell-by-cell copy did, so they stay formulas in
+    the template.  CSV, NPZ and Parquet row files (see
+    ``generator.read_rows``) are loaded directly, NPZ memory-mapped.
+    Weights come back as ``(rows, 6)``, strengths as ``(rows, 3)`` arrays.
+    """
+    grade = _extract_grade_from_filename(grade_file)
+    if os.path.splitext(grade_file)[1].lower() in ROW_FORMATS:
+        return GradeRows(grade_file, grade, *read_rows(grade_file))
+
+    wb = openpyxl.load_workbook(grade_file, read_only=True, data_only=False, keep_links=False)
+    try:
+        rows = []
+        for values in wb.active.iter_rows(min_row=2, min_col=2, max_col=14, values_only=True):
+            if not values or values[0] in (None, ""):
                 break
-            ws = office_wb[sheets[si]]
+            values = tuple(values) + (None,) * (13 - len(values))
+            rows.append([_grade_cell(v) for v in
+                         values[_GRADE_WEIGHT_COLS] + values[_GRADE_STRENGTH_COLS]])
+    finally:
+        wb.close()
 
-            weights = [grade_ws.cell(row=r, column=c).value for c in range(2, 8)]
-            strengths = [grade_ws.cell(row=r, column=c).value for c in range(9, 15)]
+    numeric = all(isinstance(v, float) for row in rows for v in row)
+    table = np.array(rows, dtype=np.float64 if numeric else object).reshape(-1, 12)
+    return GradeRows(grade_file, grade, table[:, :6], table[:, 6:9], table[:, 9:12])
 
-            for i, v in enumerate(weights):
-                ws.cell(row=25, column=3 + i, value=v)
-            for i, v in enumerate(strengths):
-                ws.cell(row=27, column=3 + i, value=v)
 
-            total += 1
-            si += 1
+def read_grade_files(grade_files, workers=None):
+    """``read_grade_file`` for each file, loaded concurrently; input order is kept."""
+    if len(grade_files) < 2:
+        return [read_grade_file(f) for f in grade_files]
+    workers = workers or min(len(grade_files), (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(read_grade_file, grade_files))
+
+
+def _write_grade_row(ws, weights, strengths):
+    """Write one grade-file row into a template sheet (empty cells are skipped)."""
+    for i, v in enumerate(weights):
+        if v == v:                              # not NaN
+            ws.cell(row=25, column=3 + i, value=v)
+    for i, v in enumerate(strengths):           # 7-day C:E, then 28-day F:H
+        if v == v:
+            ws.cell(row=27, column=3 + i, value=v)
+
+
+def apply_grade_files(office_wb, grade_files, log, progress_cb=None, index=None,
+                      profiler=NULL_PROFILER, cancel=None):
+    """
+    Populate the office template from grade files (legacy mode): .xlsx grade
+    workbooks or CSV/NPZ/Parquet row files named after their grade.
+    """
+    if index is None:
+        index = TemplateIndex.from_workbook(office_wb)
+    total = 0
+    file_count = len(grade_files)
+
+    with profiler.phase("read"):
+        tables = read_grade_files(grade_files)
+
+    for fi, table in enumerate(tables):
+        log(f"\n  File: {os.path.basename(table.path)}  (grade: {table.grade})")
+        log(f"  Data rows: {len(table.weights)}")
+
+        sheets = index.sheets_for_grade(table.grade)
+        log(f"  Matching sheets: {len(sheets)}")
+
+        if not sheets:
+            continue
 
-        grade_wb.close()
+        if len(table.weights) > len(sheets):
+            log("  ⚠ More data rows than sheets")
+        n = min(len(table.weights), len(sheets))
+        with profiler.phase("write"):
+            strengths = np.hstack([table.strength_7d[:n], table.strength_28d[:n]])
+            for sheet_name, weights, row in zip(sheets, table.weights[:n].tolist(),
+                                                strengths.tolist()):
+                _checkpoint(cancel)
+                _write_grade_row(office_wb[sheet_name], weights, row)
+        total += n
+        profiler.count("cells_written", _ROW_CELLS * n)
 
         if progress_cb:
             progress_cb((fi + 1) / file_count * 0.8)
@@ -296,6 +577,44 @@ def apply_grade_files(office_wb, grade_files, log, progress_cb=None):
 
 # ── Main orchestrator ───────────────────────────────────────────────────────
 
+class ProcessResult:
+    """Outcome of one ``process()`` run (JSON-friendly via ``to_dict``)."""
+
+    def __init__(self, template, mode, output=None, total=0, seed=None, sheets=0,
+                 dates_updated=0, elapsed=0.0, ok=True, error=None, profile=None,
+                 cancelled=False, engine=None):
+        self.template = template
+        self.mode = mode
+        self.engine = engine
+        self.output = output
+        self.total = total
+        self.seed = seed
+        self.sheets = sheets
+        self.dates_updated = dates_updated
+        self.elapsed = elapsed
+        self.ok = ok
+        self.error = error
+        self.cancelled = cancelled
+        self.profile = profile or {}     # Profiler.to_dict(): phases, counters, cpu, memory
+        self.grades = {}                 # grade → template sheets of that grade
+        self.peak_memory = None          # this run's peak RSS in bytes (tracemalloc peak or None where unmeasurable)
+
+    @property
+    def phases(self):
+        return self.profile.get("phases", {})
+
+    @property
+    def counters(self):
+        return self.profile.get("counters", {})
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    def __repr__(self):
+        state = "ok" if self.ok else f"error={self.error!r}"
+        return f"<ProcessResult {os.path.basename(self.template)} total={self.total} {state}>"
+
+
 def process(
     office_file,
     output_folder,
@@ -306,63 +625,469 @@ def process(
     grade_files=None,        # for legacy grade-file modes
     calendar_file=None,
     progress_cb=None,
+    seed=None,               # master seed; a fresh one is drawn and logged if None
+    engine="openpyxl",       # "openpyxl" (full load + save) or "stream" (patch sheet XML)
+    use_cache=True,          # reuse/store the template index under ~/.cube_data_aio/cache
+    sheet_workers=1,         # stream engine: patch sheet parts in this many processes
+    profiler=None,           # profiling.Profiler to collect timings/counters into
+    profile_cpu=False,       # capture a cProfile summary into result.profile["cpu"]
+    profile_memory=False,    # capture tracemalloc peak/top allocations into result.profile["memory"]
+    trace_file=None,         # write a Chrome trace here (a directory → <base>.trace.json)
+    incremental=False,       # stream engine: re-patch only sheets whose inputs changed
+    cancel=None,             # threading.Event; once set the run stops at the next checkpoint
+    history=True,            # record the run in the local run history (see ``history``)
 ):
     """
     One-shot processing entry point.
 
-    Returns total count of sheet operations performed.
+    Generated values are reproducible: re-running with the logged seed
+    yields identical sheets.
+
+    The "stream" engine never loads the whole workbook: it only patches the
+    touched cells in each worksheet's XML and copies everything else as-is.
+    With ``sheet_workers > 1`` those sheet parts are patched in parallel
+    processes; values come from per-sheet seeds, so the output is identical
+    to a serial run.
+
+    With ``incremental`` (stream engine) a manifest beside the output
+    records each sheet's inputs; the next run reuses the previous seed and
+    copies every unchanged sheet from the previous output, patching only new
+    or changed ones (see ``incremental``).  Other engines log a warning and
+    rebuild everything.
+
+    The template is only ever read.  The output is written to a temp file
+    in ``output_folder``, fsynced and renamed over ``<base>_Processed.xlsx``
+    (see ``atomicfile``), so a crash never leaves a truncated workbook
+    under the real name.
+
+    Setting ``cancel`` stops the run at the next sheet boundary (or archive
+    member while saving) without leaving a partial output; the result then
+    has ``cancelled`` set.  ``Job`` wraps this for background use.
+
+    Returns a ``ProcessResult``; ``result.total`` is the count of sheet
+    operations performed.  ``result.profile`` holds the seconds spent per
+    phase (load, index, calendar, generate, read, write, save), counters
+    (sheets_scanned, rows_generated, cells_written) and, when
+    requested, cProfile and tracemalloc summaries.
+
+    Errors do not propagate: the result has ``ok`` False and ``error`` set.
+    Every run, including failed and cancelled ones, is recorded in the
+    local run history (``history``) unless ``history`` is False.
     """
-    log(f"\n{'═' * 60}")
-    log(f"  MODE: {mode.upper().replace('_', ' ')}")
-    log(f"{'═' * 60}")
+    started = time.perf_counter()
+    result = ProcessResult(office_file, mode, seed=seed, engine=engine)
+    profiler = profiler or Profiler(cpu=profile_cpu, memory=profile_memory)
+    profiler.start()
+    peak_rss = PeakRss().start()
+    office_wb = None
+    try:
+        log(f"\n{'═' * 60}")
+        log(f"  MODE: {mode.upper().replace('_', ' ')}")
+        log(f"{'═' * 60}")
+
+        # Prepare output
+        base = os.path.splitext(os.path.basename(office_file))[0]
+        out_name = f"{base}_Processed.xlsx"
+        out_path = os.path.join(output_folder, out_name)
+
+        office_wb, index = _open_template(office_file, engine, use_cache, log, profiler, cancel)
+        log(f"  Template sheets indexed: {len(index)}")
+        result.sheets = len(index)
+        result.grades = dict(Counter(e.grade for e in index if e.grade))
+
+        if incremental and engine != "stream":
+            log("  ⚠ Incremental mode needs the stream engine; running a full rebuild")
+            incremental = False
+        previous = incremental_manifest.load(out_path, office_file, mode) if incremental else None
+
+        total = 0
+
+        # Calendar
+        calendar_data = None
+        if "date" in mode:
+            with profiler.phase("calendar"):
+                calendar_data = load_calendar_data(calendar_file, log, use_cache=use_cache)
+            if not calendar_data:
+                log("✖ Cannot proceed without valid calendar file")
+                result.ok = False
+                result.error = "Cannot proceed without valid calendar file"
+                return result
+
+        # Grade generation (AIO)
+        if "generate" in mode:
+            log("\n── GENERATING & APPLYING GRADE DATA ──")
+            if seed is None and previous and previous.get("seed") is not None:
+                seed = previous["seed"]
+                log(f"  Seed: {seed} (from previous run)")
+            else:
+                if seed is None:
+                    seed = new_seed()
+                log(f"  Seed: {seed}")
+            result.seed = seed
+            if selected_grades:
+                total += apply_generated_grades(office_wb, selected_grades, num_rows, log,
+                                                progress_cb, seed=seed, index=index,
+                                                profiler=profiler, cancel=cancel)
+            else:
+                log("  Auto mode: detecting grade/type from each sheet B12")
+                total += apply_generated_grades_from_template(office_wb, log, progress_cb,
+                                                              seed=seed, index=index,
+                                                              profiler=profiler, cancel=cancel)
+
+        # Grade files (legacy)
+        if "grade_files" in mode and grade_files:
+            log("\n── APPLYING GRADE FILES ──")
+            total += apply_grade_files(office_wb, grade_files, log, progress_cb, index=index,
+                                       profiler=profiler, cancel=cancel)
+
+        # Dates
+        if calendar_data:
+            log("\n── APPLYING DATES ──")
+            updated = apply_dates(office_wb, calendar_data, log, index=index, profiler=profiler,
+                                  cancel=cancel)
+            log(f"  Sheets updated with dates: {updated}")
+            result.dates_updated = updated
+
+        # Save
+        reuse = records = None
+        if incremental:
+            with profiler.phase("fingerprint"):
+                records, reuse = _incremental_plan(office_file, office_wb, index, calendar_data,
+                                                   previous)
+            changed = sum(1 for name in office_wb.sheetnames if office_wb[name].writes) - len(reuse)
+            profiler.count("sheets_reused", len(reuse))
+            profiler.count("sheets_patched", changed)
+            log(f"\n  Incremental: {changed} sheet(s) to patch, {len(reuse)} unchanged"
+                + ("" if previous else " (no usable previous run)"))
+
+        _checkpoint(cancel)
+        with profiler.phase("save"):
+            if engine == "stream":
+                office_wb.save(out_path, workers=sheet_workers, reuse=reuse,
+                               checkpoint=lambda: _checkpoint(cancel))
+            else:
+                with atomic_output(out_path) as tmp:
+                    office_wb.save(tmp)
+            if incremental:
+                incremental_manifest.save(out_path, office_file, mode, result.seed, records)
+
+        log(f"\n{'═' * 60}")
+        log(f"  ✓ SAVED → {out_path}")
+        log(f"{'═' * 60}")
 
-    # Prepare output
-    base = os.path.splitext(os.path.basename(office_file))[0]
-    out_name = f"{base}_Processed.xlsx"
-    out_path = os.path.join(output_folder, out_name)
-    shutil.copy2(office_file, out_path)
-    office_wb = _load_workbook(out_path)
+        if progress_cb:
+            progress_cb(1.0)
+
+        result.output = out_path
+        result.total = total
+    except Cancelled:
+        log("\n✖ Cancelled — no output written")
+        result.ok = False
+        result.cancelled = True
+        result.error = "Cancelled"
+    except Exception as e:
+        log(f"\n✖ ERROR: {e}")
+        result.ok = False
+        result.error = str(e)
+    finally:
+        # Always release the workbook and stop cProfile/tracemalloc, so one
+        # failing template cannot leave profiling running for the next
+        if office_wb is not None:
+            office_wb.close()
+        _finish(result, profiler, peak_rss, started, trace_file, log, history)
+    return result
+
+
+def _incremental_plan(office_file, office_wb, index, calendar_data, previous):
+    """Per-sheet manifest records for this run and the parts reusable from the last one."""
+    records, fingerprints = {}, {}
+    with zipfile.ZipFile(office_file) as zf:
+        for e in index:
+            writes = office_wb[e.name].writes
+            fp = incremental_manifest.sheet_fingerprint(zf.getinfo(e.part), writes)
+            cal = calendar_data.get(e.casting) if calendar_data and e.casting is not None else None
+            records[e.name] = {
+                "part": e.part,
+                "fingerprint": fp,
+                "b12": e.b12,
+                "casting": format_date_key(e.casting) if e.casting is not None else None,
+                "calendar": [cal["7_days"], cal["28_days"]] if cal else None,
+            }
+            if writes:
+                fingerprints[e.name] = (e.part, fp)
+    return records, incremental_manifest.reusable_parts(previous, fingerprints)
 
-    total = 0
 
-    # Calendar
-    calendar_data = None
-    if "date" in mode:
-        calendar_data = load_calendar_data(calendar_file, log)
-        if not calendar_data:
-            log("✖ Cannot proceed without valid calendar file")
-            office_wb.close()
-            return 0
+def _finish(result, profiler, peak_rss, started, trace_file, log, history):
+    """
+    Stop profiling, attach its report to *result*, write the trace and record the run.
 
-    # Grade generation (AIO)
-    if "generate" in mode:
-        log("\n── GENERATING & APPLYING GRADE DATA ──")
-        if selected_grades:
-            total += apply_generated_grades(office_wb, selected_grades, num_rows, log, progress_cb)
-        else:
-            log("  Auto mode: detecting grade/type from each sheet B12")
-            total += apply_generated_grades_from_template(office_wb, log, progress_cb)
+    Never raises: a trace or history failure is logged and noted in
+    ``result.error`` (``ok`` is left as the run itself ended).
+    """
+    profiler.stop()
+    result.profile = profiler.to_dict()
+    result.elapsed = time.perf_counter() - started
+    result.peak_memory = peak_rss.stop() or result.profile.get("memory", {}).get("peak_bytes")
+    if trace_file:
+        try:
+            base = os.path.splitext(os.path.basename(result.template))[0]
+            path = (os.path.join(trace_file, f"{base}.trace.json") if os.path.isdir(trace_file)
+                    else trace_file)
+            profiler.write_chrome_trace(path, name=os.path.basename(result.template))
+        except Exception as e:
+            log(f"⚠ Trace not written: {e}")
+            _note_error(result, f"trace not written: {e}")
+    if history:
+        error = _record_history([result], log)
+        if error:
+            _note_error(result, f"run history not recorded: {error}")
+    return result
+
+
+def _note_error(result, message):
+    result.error = f"{result.error}; {message}" if result.error else message
+
+
+def _record_history(results, log):
+    """Record *results*; returns the error message if that failed, else None."""
+    # Run history is best-effort: a locked or unwritable database (or a
+    # corrupt cache manifest) never fails a run
+    try:
+        run_history.record(results)
+    except Exception as e:
+        log(f"⚠ Run history not recorded: {e}")
+        return str(e)
+    return None
 
-    # Grade files (legacy)
-    if "grade_files" in mode and grade_files:
-        log("\n── APPLYING GRADE FILES ──")
-        total += apply_grade_files(office_wb, grade_files, log, progress_cb)
 
-    # Dates
-    if calendar_data:
-        log("\n── APPLYING DATES ──")
-        updated = apply_dates(office_wb, calendar_data, log)
-        log(f"  Sheets updated with dates: {updated}")
+# ── Background jobs ─────────────────────────────────────────────────────────
 
-    # Save
-    office_wb.save(out_path)
-    office_wb.close()
+class Job:
+    """
+    One ``process()`` run on a background thread.
 
-    log(f"\n{'═' * 60}")
-    log(f"  ✓ SAVED → {out_path}")
-    log(f"{'═' * 60}")
+        job = Job(template, out_dir, "generate+date", log, calendar_file=cal).start()
+        job.status()     # {"state": "running", "phase": "write", "progress": 0.4, ...}
+        job.cancel()     # stops at the next sheet boundary, no output written
+        job.result()     # ProcessResult (blocks); also available as job.future
 
-    if progress_cb:
-        progress_cb(1.0)
+    Keyword arguments are passed through to ``process()``.
+    """
 
-    return total
+    def __init__(self, office_file, output_folder, mode, log=None, progress_cb=None, **kwargs):
+        self.office_file = office_file
+        self.output_folder = output_folder
+        self.mode = mode
+        self.future = Future()
+        self._log = log or (lambda msg: None)
+        self._progress_cb = progress_cb
+        self._kwargs = kwargs
+        self._profiler = kwargs.pop("profiler", None) or Profiler(
+            cpu=kwargs.pop("profile_cpu", False), memory=kwargs.pop("profile_memory", False))
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._state = "pending"
+        self._progress = 0.0
+        self._started = self._finished = None
+
+    def start(self):
+        with self._lock:
+            if self._state != "pending":
+                raise RuntimeError(f"job already {self._state}")
+            self._state = "running"
+        threading.Thread(target=self._run, daemon=True,
+                         name=f"job-{os.path.basename(self.office_file)}").start()
+        return self
+
+    def _on_progress(self, value):
+        self._progress = value
+        if self._progress_cb:
+            self._progress_cb(value)
+
+    def _run(self):
+        self._started = time.perf_counter()
+        if not self.future.set_running_or_notify_cancel():
+            self._set_state("cancelled")
+            return
+        try:
+            result = process(self.office_file, self.output_folder, self.mode, self._log,
+                             progress_cb=self._on_progress, profiler=self._profiler,
+                             cancel=self._cancel, **self._kwargs)
+        except BaseException as e:
+            self._set_state("failed")
+            self.future.set_exception(e)
+            return
+        self._set_state("cancelled" if result.cancelled else "done" if result.ok else "failed")
+        self.future.set_result(result)
+
+    def _set_state(self, state):
+        with self._lock:
+            self._state = state
+            self._finished = time.perf_counter()
+
+    def cancel(self):
+        """Request cancellation; returns False if the job has already finished."""
+        with self._lock:
+            if self._state in ("done", "failed", "cancelled"):
+                return False
+            if self._state == "running":
+                self._state = "cancelling"
+        self._cancel.set()
+        return True
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """The ``ProcessResult`` (waits up to *timeout* seconds)."""
+        return self.future.result(timeout)
+
+    def status(self):
+        """Snapshot of the job's state, current phase, progress and elapsed time."""
+        with self._lock:
+            state, started, finished = self._state, self._started, self._finished
+        end = finished if finished is not None else time.perf_counter()
+        return {
+            "template": self.office_file,
+            "mode": self.mode,
+            "state": state,
+            "phase": self._profiler.current if state in ("running", "cancelling") else None,
+            "progress": round(self._progress, 4),
+            "elapsed": round(end - started, 3) if started is not None else 0.0,
+        }
+
+    def __repr__(self):
+        return f"<Job {os.path.basename(self.office_file)} {self._state}>"
+
+
+def _template_seed(seed, office_file):
+    """Per-template seed derived from a batch master seed."""
+    return None if seed is None else derive_seed(seed, os.path.basename(office_file))
+
+
+# Set in pool workers by _init_worker: queue carrying log/progress events home
+_worker_queue = None
+
+
+def _init_worker(queue, max_task_memory_mb):
+    global _worker_queue
+    _worker_queue = queue
+    if max_task_memory_mb:
+        try:
+            import resource
+        except ImportError:     # Windows: no per-process address-space limit
+            return
+        limit = int(max_task_memory_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _run_task(task_id, office_file, output_folder, mode, kwargs):
+    """Pool worker body: run one template, streaming events to the parent."""
+    queue = _worker_queue
+    try:
+        return process(office_file, output_folder, mode,
+                       lambda msg: queue.put(("log", task_id, msg)),
+                       progress_cb=lambda v: queue.put(("progress", task_id, v)),
+                       **kwargs)
+    except MemoryError:
+        return ProcessResult(office_file, mode, ok=False, error="Task memory limit exceeded")
+
+
+def _process_pool(office_files, output_folder, mode, log, progress_cb, workers,
+                  max_task_memory_mb, task_kwargs):
+    names = [os.path.basename(f) for f in office_files]
+    results = [None] * len(office_files)
+    fractions = [0.0] * len(office_files)
+
+    def drain():
+        while True:
+            try:
+                kind, task_id, payload = queue.get_nowait()
+            except Empty:
+                return
+            if kind == "log":
+                body = payload.lstrip("\n")
+                log(payload[:len(payload) - len(body)] + f"[{names[task_id]}] {body}")
+            elif progress_cb:
+                fractions[task_id] = payload
+                progress_cb(sum(fractions) / len(fractions))
+
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(queue, max_task_memory_mb)) as pool:
+        futures = {pool.submit(_run_task, i, f, output_folder, mode, task_kwargs[i]): i
+                   for i, f in enumerate(office_files)}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            drain()
+            for fut in done:
+                i = futures[fut]
+                try:
+                    results[i] = fut.result()
+                except Exception as e:      # includes BrokenProcessPool if a worker died
+                    log(f"✖ {names[i]}: {e}")
+                    results[i] = ProcessResult(office_files[i], mode, ok=False, error=str(e))
+                fractions[i] = 1.0
+    time.sleep(0.05)                        # let the queue feeder flush the last events
+    drain()
+    return results
+
+
+def process_many(office_files, output_folder, mode, log, progress_cb=None, seed=None,
+                 workers=1, max_task_memory_mb=None, **kwargs):
+    """
+    Batch mode: run ``process`` for each template in *office_files*.
+
+    With a master *seed*, each template gets its own seed derived from the
+    seed and the template's file name (recorded in its result), so batches
+    are reproducible without every template getting identical values.
+    A failing template is recorded as an error result; the batch goes on.
+
+    ``workers > 1`` fans templates out to a process pool.  Worker logs are
+    merged into *log* (prefixed with the template name) and *progress_cb*
+    receives the overall fraction.  ``max_task_memory_mb`` caps each
+    worker's address space where the OS supports it (POSIX); a task that
+    hits the cap fails on its own without stopping the batch.
+
+    The whole batch is recorded in the run history in one transaction once
+    it finishes (``history=False`` skips it).
+
+    Returns a list of ``ProcessResult`` in input order.
+    """
+    office_files = list(office_files)
+    history = kwargs.pop("history", True)
+    task_kwargs = [dict(kwargs, seed=_template_seed(seed, f), history=False)
+                   for f in office_files]
+
+    if workers > 1 and len(office_files) > 1:
+        results = _process_pool(office_files, output_folder, mode, log, progress_cb,
+                                min(workers, len(office_files)), max_task_memory_mb, task_kwargs)
+    else:
+        results = _process_serial(office_files, output_folder, mode, log, progress_cb,
+                                  task_kwargs)
+    if history:
+        _record_history(results, log)
+    return results
+
+
+def _process_serial(office_files, output_folder, mode, log, progress_cb, task_kwargs):
+    results = []
+    count = len(office_files)
+    for i, office_file in enumerate(office_files):
+        task_cb = None
+        if progress_cb:
+            task_cb = lambda v, i=i: progress_cb((i + v) / count)
+        try:
+            results.append(process(office_file, output_folder, mode, log,
+                                   progress_cb=task_cb, **task_kwargs[i]))
+        except Exception as e:
+            log(f"✖ {os.path.basename(office_file)}: {e}")
+            results.append(ProcessResult(office_file, mode, ok=False, error=str(e)))
+    return results
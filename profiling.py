@@ -0,0 +1,236 @@
+"""
+Lightweight run instrumentation.
+
+A ``Profiler`` collects wall-clock time per named phase.  Phases nest:
+timing "write" inside "apply" is recorded as "apply/write".  Repeated
+phases accumulate, so per-grade work adds up to one figure per phase,
+while every individual span is also kept for a Chrome trace
+(chrome://tracing, Perfetto).
+
+Counters (sheets scanned, cells written, ...) are plain integers.  CPU
+(cProfile) and memory (tracemalloc) capture are opt-in because both slow
+the run down noticeably.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Entries kept in the cProfile / tracemalloc summaries
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 10
+
+
+class Profiler:
+    """Accumulating nested phase timers and counters for one processing run."""
+
+    def __init__(self, cpu=False, memory=False):
+        self._stack = []
+        self._origin = time.perf_counter()
+        self.phases = {}            # "outer/inner" → seconds
+        self.counters = {}          # name → int
+        self.spans = []             # (path, start offset, duration) for traces
+        self.cpu = None             # cProfile summary once stopped
+        self.memory = None          # tracemalloc summary once stopped
+        self._cpu = cProfile.Profile() if cpu else None
+        self._memory = memory
+        self._owns_tracemalloc = False
+
+    @contextmanager
+    def phase(self, name):
+        self._stack.append(name)
+        path = "/".join(self._stack)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[path] = self.phases.get(path, 0.0) + elapsed
+            self.spans.append((path, start - self._origin, elapsed))
+            self._stack.pop()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @property
+    def current(self):
+        """Path of the phase running right now, or None."""
+        return "/".join(self._stack) or None
+
+    # ── CPU / memory capture ───────────────────────────────────────────
+
+    def start(self):
+        """Begin cProfile/tracemalloc capture (whichever were requested)."""
+        if self._memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        if self._memory:
+            tracemalloc.reset_peak()
+        if self._cpu is not None:
+            self._cpu.enable()
+
+    def stop(self):
+        """End capture and summarise it into ``cpu`` / ``memory``."""
+        if self._cpu is not None:
+            self._cpu.disable()
+            self.cpu = _cpu_summary(self._cpu)
+        if self._memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+            self.memory = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top": [{"where": str(s.traceback[0]), "bytes": s.size, "blocks": s.count}
+                        for s in top],
+            }
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+                self._owns_tracemalloc = False
+
+    # ── Reports ────────────────────────────────────────────────────────
+
+    def to_dict(self):
+        report = {
+            "phases": {k: round(v, 6) for k, v in self.phases.items()},
+            "counters": dict(self.counters),
+        }
+        if self.cpu is not None:
+            report["cpu"] = self.cpu
+        if self.memory is not None:
+            report["memory"] = self.memory
+        return report
+
+    def chrome_trace(self, name="process"):
+        """Trace Event Format dict: one complete event per phase span."""
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                   "args": {"name": name}}]
+        for path, start, elapsed in sorted(self.spans, key=lambda s: (s[1], -s[2])):
+            events.append({
+                "name": path.rsplit("/", 1)[-1], "cat": "phase", "ph": "X",
+                "ts": round(start * 1e6, 1), "dur": round(elapsed * 1e6, 1),
+                "pid": pid, "tid": 0, "args": {"path": path},
+            })
+        end = max((s + d for _, s, d in self.spans), default=0.0)
+        if self.counters:
+            events.append({"name": "counters", "ph": "C", "ts": round(end * 1e6, 1),
+                           "pid": pid, "tid": 0, "args": dict(self.counters)})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_json(self, path):
+        _write_json(path, self.to_dict())
+
+    def write_chrome_trace(self, path, name="process"):
+        _write_json(path, self.chrome_trace(name))
+
+
+def _cpu_summary(profile):
+    """Top functions of a cProfile run by cumulative time."""
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda kv: kv[1][3], reverse=True)[:TOP_FUNCTIONS]
+    return [{
+        "function": f"{os.path.basename(filename)}:{line}({func})",
+        "calls": nc,
+        "tottime": round(tt, 6),
+        "cumtime": round(ct, 6),
+    } for (filename, line, func), (cc, nc, tt, ct, _) in rows]
+
+
+# Peak RSS per run.  ru_maxrss only ever grows over the life of a process, so
+# it says nothing about one run in the GUI, a batch or a pool worker; Linux
+# lets the high-water mark (VmHWM) be reset instead.  Runs that overlap in
+# one process cannot be told apart, so they get no figure at all.
+_rss_lock = threading.Lock()
+_rss_active = 0
+_rss_epoch = 0
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:             # not Linux, or clear_refs not writable
+        return False
+
+
+def _read_peak_rss():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class PeakRss:
+    """
+    Peak resident set size of one run, in bytes.
+
+    ``start()`` resets the process's high-water mark to its current RSS;
+    ``stop()`` returns the peak since then (so it includes memory the
+    process already held), or None where it cannot be reset or another
+    run in this process overlapped.
+    """
+
+    def __init__(self):
+        self._token = None
+
+    def start(self):
+        global _rss_active, _rss_epoch
+        with _rss_lock:
+            _rss_active += 1
+            _rss_epoch += 1
+            self._token = (_rss_epoch, _rss_active == 1 and _reset_peak_rss())
+        return self
+
+    def stop(self):
+        global _rss_active
+        if self._token is None:
+            return None
+        epoch, reset = self._token
+        self._token = None
+        with _rss_lock:
+            _rss_active -= 1
+            if not reset or epoch != _rss_epoch:
+                return None
+            return _read_peak_rss()
+
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+class _NullProfiler:
+    """Drop-in Profiler that records nothing (used when none is supplied)."""
+
+    phases = {}
+    counters = {}
+
+    @contextmanager
+    def phase(self, name):
+        yield self
+
+    def count(self, name, n=1):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def to_dict(self):
+        return {"phases": {}, "counters": {}}
+
+
+NULL_PROFILER = _NullProfiler()
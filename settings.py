@@ -1,40 +1,290 @@
 """
 Cross-platform settings store using a local JSON file.
 Replaces the Windows-only registry approach.
+
+Settings are held in memory: reads never touch the file unless another
+process changed it (its mtime/size moved), and writes update the
+in-memory copy immediately and are flushed from a background thread
+after WRITE_DELAY seconds of quiet, atomically (temp file + rename).
+Pending writes are flushed at interpreter exit, or on demand via flush().
+
+Besides flat keys the file holds structured sections:
+
+    "recent_templates"  most-recently-used template paths (MAX_RECENT)
+    "templates"         per-template options, keyed by absolute path
+    "paths"             storage locations, e.g. {"cache": "..."}
+
+Secrets (the job-server token) are never written to the file: they go to
+the OS keyring when the optional ``keyring`` package is installed, and are
+otherwise kept only for the life of the process.
 """
 
+import atexit
+import copy
 import json
 import os
+import threading
+import time
+
+from atomicfile import write_bytes
 
 _SETTINGS_DIR = os.path.join(os.path.expanduser("~"), ".cube_data_aio")
 _SETTINGS_FILE = os.path.join(_SETTINGS_DIR, "settings.json")
 
+DEFAULT_CACHE_DIR = os.path.join(_SETTINGS_DIR, "cache")
+
+WRITE_DELAY = 0.5        # seconds of quiet before a change is written
+RETRY_DELAY = 5.0        # seconds before retrying a failed write
+STAT_INTERVAL = 1.0      # at most one mtime check per this many seconds
+MAX_RECENT = 10
+
 
 def _ensure_dir():
     os.makedirs(_SETTINGS_DIR, exist_ok=True)
 
 
-def load():
-    """Return the full settings dict (empty dict if not found)."""
+def _stamp(path):
     try:
-        with open(_SETTINGS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
         return {}
 
 
+class _Store:
+    """In-memory settings with mtime invalidation and a debounced writer thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Condition()      # guards the dict and the fields below
+        self._io = threading.Lock()             # one file write at a time; never taken under _lock
+        self._data = None
+        self._stamp = None
+        self._checked = 0.0
+        self._dirty = False
+        self._version = 0                       # bumped on every change
+        self._due = 0.0                         # monotonic time the pending write is due
+        self._writer = None
+
+    def _current(self):
+        # Caller holds the lock.  Unwritten local changes always win.
+        now = time.monotonic()
+        if self._data is None or (not self._dirty and now - self._checked >= STAT_INTERVAL):
+            stamp = _stamp(self.path)
+            if self._data is None or stamp != self._stamp:
+                self._data, self._stamp = _read(self.path), stamp
+            self._checked = now
+        return self._data
+
+    def read(self, fn):
+        with self._lock:
+            return fn(self._current())
+
+    def update(self, fn):
+        """Apply *fn* to the settings dict in place and schedule a write."""
+        with self._lock:
+            result = fn(self._current())
+            self._dirty = True
+            self._version += 1
+            self._due = time.monotonic() + WRITE_DELAY
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop,
+                                                 name="settings-writer", daemon=True)
+                self._writer.start()
+            self._lock.notify_all()
+            return result
+
+    def _write_loop(self):
+        while True:
+            with self._lock:
+                while True:
+                    if not self._dirty:
+                        self._lock.wait()
+                        continue
+                    delay = self._due - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._lock.wait(delay)
+            self.flush()
+
+    def flush(self):
+        """
+        Write pending changes.  The payload is built under the lock but the
+        file is written outside it, so readers never wait on disk I/O.
+        """
+        with self._io:
+            with self._lock:
+                if not self._dirty:
+                    return
+                payload = json.dumps(self._data, indent=2, ensure_ascii=False).encode("utf-8")
+                version = self._version
+            try:
+                _ensure_dir()
+                write_bytes(self.path, payload)
+            except OSError:
+                # Keep the change pending and back off (e.g. a virus scanner
+                # holding the file on Windows); a later change or retry writes it.
+                with self._lock:
+                    self._due = max(self._due, time.monotonic() + RETRY_DELAY)
+                return
+            stamp = _stamp(self.path)
+            with self._lock:
+                if self._version == version:
+                    self._dirty = False
+                self._stamp = stamp
+                self._checked = time.monotonic()
+
+
+_store = _Store(_SETTINGS_FILE)
+atexit.register(_store.flush)
+
+
+# ── Flat keys ───────────────────────────────────────────────────────────────
+
+def load():
+    """Return a copy of the full settings dict (empty dict if not found)."""
+    return _store.read(copy.deepcopy)
+
+
 def save(data: dict):
-    """Persist the full settings dict."""
-    _ensure_dir()
-    with open(_SETTINGS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    """Replace the full settings dict (written in the background)."""
+    data = copy.deepcopy(data)
+
+    def replace(d):
+        d.clear()
+        d.update(data)
+    _store.update(replace)
 
 
 def get(key, default=None):
-    return load().get(key, default)
+    return _store.read(lambda d: copy.deepcopy(d.get(key, default)))
 
 
 def put(key, value):
-    d = load()
-    d[key] = value
-    save(d)
+    value = copy.deepcopy(value)
+    _store.update(lambda d: d.__setitem__(key, value))
+
+
+def update(values: dict):
+    """Merge *values* into the settings, leaving other keys and sections alone."""
+    values = copy.deepcopy(values)
+    _store.update(lambda d: d.update(values))
+
+
+def remove(key):
+    """Drop *key* (no-op if absent)."""
+    _store.update(lambda d: d.pop(key, None))
+
+
+def flush():
+    """Write any pending change now (blocking)."""
+    _store.flush()
+
+
+# ── Sections ────────────────────────────────────────────────────────────────
+
+def _section(d, name):
+    sec = d.get(name)
+    if not isinstance(sec, dict):
+        sec = d[name] = {}
+    return sec
+
+
+def recent_templates():
+    """Most-recently-used template paths, newest first."""
+    return get("recent_templates", [])
+
+
+def add_recent_template(path):
+    path = os.path.abspath(path)
+
+    def add(d):
+        recent = [p for p in d.get("recent_templates", []) if p != path]
+        d["recent_templates"] = [path] + recent[:MAX_RECENT - 1]
+    _store.update(add)
+
+
+def template_options(path):
+    """Options remembered for the template at *path* (empty dict if none)."""
+    path = os.path.abspath(path)
+    return _store.read(lambda d: copy.deepcopy(d.get("templates", {}).get(path, {})))
+
+
+def set_template_options(path, **options):
+    """Merge *options* into the options remembered for *path*."""
+    path = os.path.abspath(path)
+    options = copy.deepcopy(options)
+    _store.update(lambda d: _section(_section(d, "templates"), path).update(options))
+
+
+def cache_dir():
+    """Directory for the derived-data cache (``paths.cache`` or the default)."""
+    return _store.read(lambda d: d.get("paths", {}).get("cache")) or DEFAULT_CACHE_DIR
+
+
+def set_cache_dir(path):
+    """Move the cache to *path* (None restores the default)."""
+    def set_(d):
+        paths = _section(d, "paths")
+        if path:
+            paths["cache"] = os.path.abspath(path)
+        else:
+            paths.pop("cache", None)
+    _store.update(set_)
+
+
+# ── Secrets ─────────────────────────────────────────────────────────────────
+
+KEYRING_SERVICE = "cube_data_aio"
+
+_secrets = {}           # name → value, for this process
+
+
+def _keyring():
+    try:
+        import keyring
+    except ImportError:
+        return None
+    return keyring
+
+
+def get_secret(name):
+    """Secret *name* from this session or the OS keyring (None if unknown)."""
+    if name in _secrets:
+        return _secrets[name]
+    kr = _keyring()
+    if kr is None:
+        return None
+    try:
+        value = kr.get_password(KEYRING_SERVICE, name)
+    except Exception:           # no usable backend, locked keychain, ...
+        return None
+    _secrets[name] = value
+    return value
+
+
+def set_secret(name, value):
+    """Remember secret *name* (None/"" forgets it), in the OS keyring when available."""
+    value = value or None
+    if name in _secrets and _secrets[name] == value:
+        return
+    _secrets[name] = value
+    kr = _keyring()
+    if kr is None:
+        return
+    try:
+        if value is not None:
+            kr.set_password(KEYRING_SERVICE, name, value)
+        elif kr.get_password(KEYRING_SERVICE, name) is not None:
+            kr.delete_password(KEYRING_SERVICE, name)
+    except Exception:           # kept for this session only
+        pass
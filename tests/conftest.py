@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The app is a set of top-level modules; make them importable from tests/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import ensure_fixtures  # noqa: E402
+
+FIXTURE_SHEETS = 26         # two of every B12 spelling
+
+
+@pytest.fixture(scope="session")
+def fixtures(tmp_path_factory):
+    """Small synthetic template, calendar and grade files (see benchmarks.fixtures)."""
+    return ensure_fixtures(FIXTURE_SHEETS, root=str(tmp_path_factory.mktemp("fixtures")))
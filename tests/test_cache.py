@@ -0,0 +1,97 @@
+"""Tests for the shared derived-data cache in ``cache``."""
+
+import json
+import multiprocessing
+import os
+
+import pytest
+
+import cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    folder = str(tmp_path / "cache")
+    monkeypatch.setattr(cache.settings, "cache_dir", lambda: folder)
+    return folder
+
+
+def _sources(tmp_path, n, prefix="src"):
+    paths = []
+    for i in range(n):
+        path = tmp_path / f"{prefix}{i}.xlsx"
+        path.write_bytes(f"{prefix} {i}".encode())
+        paths.append(str(path))
+    return paths
+
+
+def _manifest(cache_dir):
+    with open(os.path.join(cache_dir, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _put_many(cache_dir, paths):
+    """Pool worker: store one entry per path."""
+    cache.settings.cache_dir = lambda: cache_dir
+    for path in paths:
+        cache.put(cache.CALENDAR_KIND, path, os.path.basename(path).encode())
+
+
+def test_concurrent_puts_keep_every_entry(cache_dir, tmp_path):
+    paths = _sources(tmp_path, 40)
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_put_many, args=(cache_dir, paths[i::4])) for i in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+
+    entries = _manifest(cache_dir)["entries"]
+    assert len(entries) == len(paths)
+    bins = {name for name in os.listdir(cache_dir) if name.endswith(".bin")}
+    assert bins == {e["file"] for e in entries.values()}
+    for path in paths:
+        assert cache.get(cache.CALENDAR_KIND, path) == os.path.basename(path).encode()
+
+
+def test_hit_does_not_rewrite_manifest(cache_dir, tmp_path):
+    (path,) = _sources(tmp_path, 1)
+    cache.put(cache.CALENDAR_KIND, path, b"rows")
+    manifest = os.path.join(cache_dir, "manifest.json")
+    before = os.stat(manifest).st_mtime_ns, os.path.getsize(manifest)
+    os.utime(manifest, ns=(1, 1))
+    assert cache.get(cache.CALENDAR_KIND, path) == b"rows"
+    assert os.stat(manifest).st_mtime_ns == 1, "a fresh hit rewrote the manifest"
+    assert os.path.getsize(manifest) == before[1]
+
+
+def test_eviction_enforces_limits_and_removes_orphans(cache_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "MAX_ENTRIES", 3)
+    os.makedirs(cache_dir)
+    orphan = os.path.join(cache_dir, "calendar-v1-deadbeef.bin")
+    with open(orphan, "wb") as f:
+        f.write(b"lost update")
+    for path in _sources(tmp_path, 5):
+        cache.put(cache.CALENDAR_KIND, path, b"x" * 10)
+    entries = _manifest(cache_dir)["entries"]
+    assert len(entries) == 3
+    assert not os.path.exists(orphan)
+    assert {n for n in os.listdir(cache_dir) if n.endswith(".bin")} == \
+        {e["file"] for e in entries.values()}
+
+
+@pytest.mark.parametrize("manifest", [
+    "not json",
+    '["a list"]',
+    '{"paths": {"/x": 1, "/y": {"size": "big"}}, "entries": {"k": null}}',
+])
+def test_corrupt_manifest_is_a_miss(cache_dir, tmp_path, manifest):
+    (path,) = _sources(tmp_path, 1)
+    os.makedirs(cache_dir)
+    with open(os.path.join(cache_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        f.write(manifest)
+    assert cache.get(cache.CALENDAR_KIND, path) is None
+    assert cache.content_hashes([path])[path] == cache.file_hash(path)
+    cache.put(cache.CALENDAR_KIND, path, b"rows")
+    assert cache.get(cache.CALENDAR_KIND, path) == b"rows"
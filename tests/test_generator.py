@@ -0,0 +1,140 @@
+"""
+Property tests for the sampler in ``generator``.
+
+Every generated row must hold the guarantees ``_lattice``/``_sample_gapped``
+promise: values inside the range, on the 10**-decimals lattice, and pairwise
+at least the minimum gap apart.  Ranges are drawn at random from a fixed
+seed, so failures reproduce.
+"""
+
+import numpy as np
+import pytest
+
+from generator import (
+    ALL_TYPES, STRENGTH_7D_RANGES, STRENGTH_28D_RANGES, WEIGHT_RANGES,
+    _gap_params, generate_batch, grade_lattices, read_rows, sample_unique_values, sheet_key,
+    sheet_rng, write_rows,
+)
+
+CASES = 500
+
+
+def _ticks(values, decimals):
+    """Values as integer lattice steps; fails if any value is off the lattice."""
+    ticks = np.asarray(values, dtype=np.float64) * 10 ** decimals
+    steps = np.round(ticks)
+    assert np.abs(ticks - steps).max() < 1e-6, "value not rounded to the lattice"
+    return steps.astype(np.int64)
+
+
+def assert_sampled(values, bounds, decimals, min_gap):
+    """Check each row of *values* against range, lattice and gap."""
+    values = np.atleast_2d(values)
+    lo, hi = bounds
+    assert (values >= lo - 1e-9).all() and (values <= hi + 1e-9).all(), "value out of range"
+    gap = max(1, int(np.ceil(round(min_gap * 10 ** decimals, 6))))
+    steps = np.diff(np.sort(_ticks(values, decimals), axis=1), axis=1)
+    assert (steps >= gap).all(), "values closer than the minimum gap"
+
+
+@pytest.mark.parametrize("grade", ALL_TYPES)
+def test_generated_rows_hold_grade_guarantees(grade):
+    weights, s7, s28 = generate_batch(grade, 5000, rng=1234)
+    assert weights.shape == (5000, 6) and s7.shape == (5000, 3) and s28.shape == (5000, 3)
+    weight_gap, strength_gap = _gap_params(grade)
+    assert_sampled(weights, WEIGHT_RANGES[grade], 3, weight_gap)
+    assert_sampled(s7, STRENGTH_7D_RANGES[grade], 2, strength_gap)
+    assert_sampled(s28, STRENGTH_28D_RANGES[grade], 2, strength_gap)
+
+
+@pytest.mark.parametrize("grade", ALL_TYPES)
+def test_grade_lattices_cover_their_ranges(grade):
+    for lattice, bounds, decimals in zip(
+            grade_lattices(grade),
+            (WEIGHT_RANGES[grade], STRENGTH_7D_RANGES[grade], STRENGTH_28D_RANGES[grade]),
+            (3, 2, 2)):
+        steps = _ticks(lattice.values, decimals)
+        assert (np.diff(steps) == 1).all()
+        assert lattice.values[0] >= bounds[0] - 1e-9 and lattice.values[-1] <= bounds[1] + 1e-9
+        assert lattice.slots >= lattice.count
+
+
+def _random_range(rng, slack):
+    """(min_val, max_val, count, decimals, min_gap, gap steps) with *slack* spare steps."""
+    decimals = int(rng.integers(0, 4))
+    scale = 10 ** decimals
+    count = int(rng.integers(1, 9))
+    gap = int(rng.integers(0, 20))
+    lo = int(rng.integers(-1000, 1000))
+    hi = lo + (count - 1) * max(1, gap) + slack
+    return lo / scale, hi / scale, count, decimals, gap / scale, max(1, gap)
+
+
+def test_sample_unique_values_on_random_feasible_ranges():
+    rng = np.random.default_rng(20240601)
+    for _ in range(CASES):
+        slack = int(rng.integers(0, 50))
+        min_val, max_val, count, decimals, min_gap, gap = _random_range(rng, slack)
+        values = sample_unique_values(min_val, max_val, count, decimals, min_gap, rng=rng)
+        assert len(values) == count
+        assert len(set(values)) == count
+        assert_sampled(values, (min_val, max_val), decimals, min_gap)
+        if slack == 0:          # no room to move: the only admissible set
+            expected = _ticks(min_val, decimals) + gap * np.arange(count)
+            assert sorted(_ticks(values, decimals)) == expected.tolist()
+
+
+def test_sample_unique_values_rejects_infeasible_ranges():
+    rng = np.random.default_rng(20240602)
+    for _ in range(CASES):
+        min_val, max_val, count, decimals, min_gap, gap = _random_range(rng, 0)
+        if count < 2:
+            count = 2
+            max_val = min_val + (gap - 1) / 10 ** decimals
+        else:
+            max_val -= int(rng.integers(1, gap + 1)) / 10 ** decimals
+        with pytest.raises(ValueError):
+            sample_unique_values(min_val, max_val, count, decimals, min_gap, rng=rng)
+
+
+@pytest.mark.parametrize("args", [(1.0, 2.0, 0), (5.0, 4.0, 1), (0.0, 0.05, 7, 2)])
+def test_sample_unique_values_rejects_degenerate_requests(args):
+    with pytest.raises(ValueError):
+        sample_unique_values(*args)
+
+
+@pytest.mark.parametrize("ext", [".csv", ".npz"])
+@pytest.mark.parametrize("mmap", [True, False])
+def test_rows_round_trip(tmp_path, ext, mmap):
+    rows = generate_batch("M25", 50, rng=5)
+    path = str(tmp_path / f"rows{ext}")
+    write_rows(path, *rows)
+    for got, want in zip(read_rows(path, mmap=mmap), rows):
+        np.testing.assert_allclose(got, want)
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_read_rows_accepts_any_single_array_npz(tmp_path, mmap):
+    table = np.hstack(generate_batch("1:4", 20, rng=6))
+    plain, compressed = str(tmp_path / "plain.npz"), str(tmp_path / "compressed.npz")
+    np.savez(plain, table)
+    np.savez_compressed(compressed, table.astype(np.float32))
+    np.testing.assert_array_equal(np.hstack(read_rows(plain, mmap=mmap)), table)
+    assert read_rows(compressed, mmap=mmap)[0].dtype == np.float64
+
+
+def test_read_rows_rejects_npz_with_several_arrays(tmp_path):
+    path = str(tmp_path / "two.npz")
+    np.savez(path, a=np.zeros((2, 12)), b=np.zeros((2, 12)))
+    with pytest.raises(ValueError, match="one array"):
+        read_rows(path)
+
+
+def test_sheet_keys_are_wide_and_stable():
+    names = [f"Cube {i:05d}" for i in range(20000)] + ["M20", "m20", "", "Ωmega"]
+    keys = [sheet_key(n) for n in names]
+    assert all(len(k) == 4 and all(0 <= w < 2 ** 32 for w in k) for k in keys)
+    assert len(set(keys)) == len(names)
+    assert sheet_key("Cube 00001") == sheet_key("Cube 00001")
+    a, b = sheet_rng(7, "Cube 00001"), sheet_rng(7, "Cube 00002")
+    assert a.integers(2 ** 63) != b.integers(2 ** 63)
@@ -0,0 +1,100 @@
+"""Tests for incremental re-runs (``incremental`` + the stream engine)."""
+
+import json
+import shutil
+import zipfile
+
+from incremental import manifest_path
+from processor import process
+from xlsx_stream import patch_sheet_xml
+
+
+def _template(fixtures, tmp_path):
+    path = tmp_path / "site.xlsx"
+    shutil.copy(fixtures["template"], path)
+    return str(path)
+
+
+def _run(template, tmp_path, mode="generate", **kwargs):
+    out = tmp_path / "out"
+    out.mkdir(exist_ok=True)
+    result = process(template, str(out), mode, lambda msg: None, engine="stream",
+                     incremental=True, use_cache=False, history=False,
+                     calendar_file=kwargs.pop("calendar_file", None), **kwargs)
+    assert result.ok, result.error
+    return result
+
+
+def _graded(result):
+    """Sheets the run writes to (the fixture also has sheets with an unknown B12)."""
+    return sum(result.grades.values())
+
+
+def _counts(result):
+    return result.counters.get("sheets_patched"), result.counters.get("sheets_reused")
+
+
+def _members(path):
+    with zipfile.ZipFile(path) as zf:
+        return {name: zf.read(name) for name in zf.namelist()}
+
+
+def _patch_member(path, part, cells):
+    """Rewrite *part* of the workbook at *path* with *cells* applied."""
+    members = _members(path)
+    members[part] = patch_sheet_xml(members[part], cells)[0]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+
+
+def test_rerun_reuses_seed_and_unchanged_sheets(fixtures, tmp_path):
+    template = _template(fixtures, tmp_path)
+    first = _run(template, tmp_path)
+    assert _counts(first) == (_graded(first), 0)
+    before = _members(first.output)
+
+    second = _run(template, tmp_path)
+    assert second.seed == first.seed
+    assert _counts(second) == (0, _graded(first))
+    assert _members(second.output) == before
+
+
+def test_changed_sheet_is_patched_again(fixtures, tmp_path):
+    template = _template(fixtures, tmp_path)
+    first = _run(template, tmp_path)
+    before = _members(first.output)
+    _patch_member(template, "xl/worksheets/sheet3.xml", {"B12": "M40"})
+
+    second = _run(template, tmp_path)
+    assert _counts(second) == (1, _graded(first) - 1)
+    after = _members(second.output)
+    changed = {name for name in before if before[name] != after.get(name)}
+    assert changed == {"xl/worksheets/sheet3.xml"}
+
+
+def test_manifest_is_ignored_after_mode_change_or_version_bump(fixtures, tmp_path):
+    template = _template(fixtures, tmp_path)
+    first = _run(template, tmp_path, seed=11)
+    dated = _run(template, tmp_path, mode="generate+date", seed=11,
+                 calendar_file=fixtures["calendar"])
+    assert _counts(dated) == (dated.sheets, 0)         # every sheet gets dates
+
+    _run(template, tmp_path, seed=11)
+    path = manifest_path(first.output)
+    with open(path, encoding="utf-8") as f:
+        m = json.load(f)
+    m["version"] -= 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(m, f)
+    assert _counts(_run(template, tmp_path, seed=11)) == (_graded(first), 0)
+
+
+def test_manifest_is_ignored_when_output_was_edited(fixtures, tmp_path):
+    template = _template(fixtures, tmp_path)
+    first = _run(template, tmp_path)
+    with open(first.output, "ab") as f:
+        f.write(b"\0")
+    second = _run(template, tmp_path)
+    assert second.seed != first.seed
+    assert _counts(second) == (_graded(first), 0)
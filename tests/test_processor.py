@@ -0,0 +1,62 @@
+"""Tests for ``processor.process`` result handling."""
+
+import openpyxl
+
+import processor
+from processor import process
+
+
+def _process(fixtures, tmp_path, **kwargs):
+    return process(fixtures["template"], str(tmp_path), "generate", lambda msg: None, seed=7,
+                   engine="stream", use_cache=False, **kwargs)
+
+
+def test_unwritable_trace_is_reported_not_raised(fixtures, tmp_path):
+    result = _process(fixtures, tmp_path, history=False,
+                      trace_file=str(tmp_path / "missing" / "run.trace.json"))
+    assert result.ok
+    assert result.output
+    assert "trace not written" in result.error
+
+
+def test_history_failure_is_reported_not_raised(fixtures, tmp_path, monkeypatch):
+    def broken(results):
+        raise KeyError("entries")
+    monkeypatch.setattr(processor.run_history, "record", broken)
+    result = _process(fixtures, tmp_path, history=True)
+    assert result.ok
+    assert "run history not recorded" in result.error
+
+
+def test_failed_run_returns_result(fixtures, tmp_path):
+    result = process(str(tmp_path / "missing.xlsx"), str(tmp_path), "generate", lambda msg: None,
+                     engine="stream", use_cache=False, history=False)
+    assert not result.ok
+    assert result.error
+
+
+def test_grade_file_cells_are_copied_as_the_legacy_copy_did(fixtures, tmp_path):
+    # Legacy parity: formulas stay formulas, text (numeric or not) stays text,
+    # column H is never read
+    src = [f for f in fixtures["grade_files"] if f.endswith("M20.xlsx")][0]
+    wb = openpyxl.load_workbook(src)
+    ws = wb.active
+    ws["C2"], ws["D2"], ws["H2"], ws["I2"] = "=8.1+0.4", "8.45", "OK", "n/a"
+    grade_file = str(tmp_path / "M20.xlsx")
+    wb.save(grade_file)
+
+    table = processor.read_grade_file(grade_file)
+    assert list(table.weights[0][1:3]) == ["=8.1+0.4", "8.45"]
+    assert table.strength_7d[0][0] == "n/a"
+
+    for engine in ("stream", "openpyxl"):
+        out = tmp_path / engine
+        out.mkdir()
+        result = process(fixtures["template"], str(out), "grade_files", lambda msg: None,
+                         grade_files=[grade_file], engine=engine, use_cache=False, history=False)
+        assert result.ok, result.error
+        sheet = openpyxl.load_workbook(result.output)["Cube 00001"]     # first M20 sheet
+        assert sheet["D25"].value == "=8.1+0.4" and sheet["D25"].data_type == "f"
+        assert sheet["E25"].value == "8.45"
+        assert sheet["C27"].value == "n/a"
+        assert sheet["C25"].value == ws["B2"].value
@@ -0,0 +1,145 @@
+"""Tests for the streaming worksheet patcher in ``xlsx_stream``."""
+
+import datetime
+import re
+import zipfile
+
+import openpyxl
+import pytest
+
+from processor import process
+from xlsx_stream import XlsxPatchError, force_full_calc, patch_sheet_xml, scan_cells
+
+HEAD = b'<worksheet xmlns="ns">'
+TAIL = b"</worksheet>"
+
+
+def _run(fixtures, tmp_path, engine, **kwargs):
+    out = tmp_path / engine
+    out.mkdir()
+    result = process(fixtures["template"], str(out), "generate", lambda msg: None, seed=7,
+                     engine=engine, use_cache=False, history=False, **kwargs)
+    assert result.ok, result.error
+    return result
+
+SCAN_REFS = ("B12", "C17", "C25", "I25", "C29", "Z99")
+
+
+def test_scan_cells_matches_openpyxl_on_fixture(fixtures):
+    wb = openpyxl.load_workbook(fixtures["template"])
+    try:
+        expected = [(ws.title, {ref: ws[ref].value for ref in SCAN_REFS}) for ws in wb.worksheets]
+    finally:
+        wb.close()
+    scanned = scan_cells(fixtures["template"], SCAN_REFS)
+    assert [(name, values) for name, _, values in scanned] == expected
+    assert scanned[0][1] == "xl/worksheets/sheet1.xml"
+
+
+def test_scan_cells_reads_shared_strings_dates_and_types(tmp_path):
+    path = str(tmp_path / "cells.xlsx")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "First"
+    ws["A1"], ws["B2"], ws["C3"] = "shared", datetime.datetime(2025, 3, 4, 12, 0), True
+    ws["D4"] = 2.5
+    wb.create_sheet("Second")["A1"] = "shared"
+    wb.save(path)
+    assert scan_cells(path, ["A1", "B2", "C3", "D4"]) == [
+        ("First", "xl/worksheets/sheet1.xml",
+         {"A1": "shared", "B2": datetime.datetime(2025, 3, 4, 12, 0), "C3": True, "D4": 2.5}),
+        ("Second", "xl/worksheets/sheet2.xml", {"A1": "shared", "B2": None, "C3": None, "D4": None}),
+    ]
+
+
+def test_scan_cells_calls_checkpoint_before_each_sheet(fixtures):
+    calls = []
+
+    def checkpoint():
+        calls.append(None)
+        if len(calls) == 3:
+            raise InterruptedError
+
+    with pytest.raises(InterruptedError):
+        scan_cells(fixtures["template"], ["B12"], checkpoint=checkpoint)
+    assert len(calls) == 3
+
+
+def _patch(sheet_data, cells):
+    data, removed = patch_sheet_xml(HEAD + sheet_data + TAIL, cells)
+    assert data.startswith(HEAD) and data.endswith(TAIL)
+    return data[len(HEAD):-len(TAIL)], removed
+
+
+def test_patch_fills_self_closing_sheet_data():
+    assert _patch(b"<sheetData/>", {"D27": 2, "C25": 1.5}) == (
+        b'<sheetData><row r="25"><c r="C25"><v>1.5</v></c></row>'
+        b'<row r="27"><c r="D27"><v>2</v></c></row></sheetData>', False)
+
+
+def test_patch_opens_self_closing_row():
+    data, _ = _patch(b'<sheetData><row r="25" spans="1:9" ht="15"/><row r="26"/></sheetData>',
+                     {"C25": "x"})
+    assert data == (b'<sheetData><row r="25" ht="15"><c r="C25" t="inlineStr"><is>'
+                    b'<t xml:space="preserve">x</t></is></c></row><row r="26"/></sheetData>')
+
+
+def test_patch_inserts_missing_cells_and_rows_in_order():
+    data, _ = _patch(b'<sheetData><row r="20"><c r="A20"/></row>'
+                     b'<row r="25"><c r="B25"/><c r="E25" s="3"><v>0</v></c><c r="J25"/></row>'
+                     b'<row r="30"/></sheetData>',
+                     {"H25": 8, "C25": 3, "E25": 5, "A22": 1, "A27": 2, "A31": 4})
+    assert re.findall(rb'<row r="(\d+)"', data) == [b"20", b"22", b"25", b"27", b"30", b"31"]
+    assert re.findall(rb'<c r="(\w+)"', data) == [
+        b"A20", b"A22", b"B25", b"C25", b"E25", b"H25", b"J25", b"A27", b"A31"]
+    assert b'<c r="E25" s="3"><v>5</v></c>' in data
+
+
+def test_patch_reports_dropped_formulas():
+    _, removed = _patch(b'<sheetData><row r="25"><c r="I25"><f>SUM(C25:H25)</f><v>0</v></c>'
+                        b'</row></sheetData>', {"I25": 1})
+    assert removed
+
+
+def test_patch_refuses_shared_formula_master():
+    sheet = (b'<sheetData><row r="25"><c r="C25"><f t="shared" ref="C25:H25" si="0">A1</f>'
+             b'<v>0</v></c><c r="D25"><f t="shared" si="0"/><v>0</v></c></row></sheetData>')
+    with pytest.raises(XlsxPatchError, match="C25"):
+        _patch(sheet, {"C25": 1})
+    _patch(sheet, {"D25": 1})       # a dependent cell can be overwritten
+
+
+def _written(path):
+    """Rows 25-27 of every sheet; other cells are copied, not written."""
+    wb = openpyxl.load_workbook(path)
+    try:
+        return {ws.title: [[c.value for c in row] for row in ws["A25:I27"]]
+                for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def test_stream_and_openpyxl_engines_write_the_same_cells(fixtures, tmp_path):
+    stream = _run(fixtures, tmp_path, "stream")
+    legacy = _run(fixtures, tmp_path, "openpyxl")
+    assert _written(stream.output) == _written(legacy.output)
+
+
+def test_force_full_calc_sets_existing_calc_pr():
+    data = b'<workbook><sheets/><calcPr calcId="191029" fullCalcOnLoad="0"/></workbook>'
+    assert force_full_calc(data) == (
+        b'<workbook><sheets/><calcPr calcId="191029" fullCalcOnLoad="1"/></workbook>')
+
+
+def test_force_full_calc_adds_calc_pr_in_schema_order():
+    data = b'<x:workbook xmlns:x="ns"><x:sheets/><x:definedNames/><x:extLst/></x:workbook>'
+    assert force_full_calc(data) == (
+        b'<x:workbook xmlns:x="ns"><x:sheets/><x:definedNames/>'
+        b'<x:calcPr fullCalcOnLoad="1"/><x:extLst/></x:workbook>')
+
+
+def test_stream_output_recalculates_formulas_on_load(fixtures, tmp_path):
+    result = _run(fixtures, tmp_path, "stream")
+    with zipfile.ZipFile(result.output) as zf:
+        workbook = zf.read("xl/workbook.xml")
+    assert re.search(rb'<calcPr\b[^>]*\bfullCalcOnLoad="1"', workbook)
@@ -0,0 +1,3 @@
+"""Application version (shown in the GUI, recorded with every run)."""
+
+VERSION = "1.0.0"
@@ -0,0 +1,383 @@
+"""
+Watch-folder daemon: process templates as they are dropped into an inbox.
+
+    python -m cube_data watch //share/inbox --outbox //share/outbox \
+        --mode generate+date --calendar calendar.xlsx --workers 2
+
+The inbox is polled every ``--interval`` seconds.  A .xlsx file is picked
+up once its size and mtime have not changed for ``--debounce`` seconds (so
+half-copied files are left alone), fingerprinted (SHA-256) and queued.
+Each job works on a private copy of the file, so the original can be
+overwritten in the meantime.  Up to ``--workers`` templates run at once in
+a process pool through ``processor.process``.
+
+    outbox/<base>_Processed.xlsx     result
+    outbox/.cube_watch.json          ledger of processed fingerprints
+    <quarantine>/<name>.xlsx         template that failed, with
+    <quarantine>/<name>.error.txt    the reason
+
+A file whose fingerprint is already in the ledger is skipped as a
+duplicate.  Editing a file and saving it again therefore processes it
+again, while re-dropping an unchanged copy does not.  Processed templates
+stay in the inbox; failed ones are moved to quarantine (default
+``<inbox>/quarantine``) so they are not retried until dropped again.
+
+A worker that dies (crash, out of memory) breaks the whole pool, taking
+every template in flight with it.  Those templates are retried once, one
+at a time, on a fresh pool; only one that fails again is quarantined.
+Runs are recorded in the run history under their inbox path.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from atomicfile import write_bytes
+from cache import file_hash
+
+LEDGER_NAME = ".cube_watch.json"
+STAGING_NAME = ".cube_watch-staging"
+POLL_INTERVAL = 2.0
+DEBOUNCE = 5.0
+
+
+def _is_template(name):
+    return (name.lower().endswith(".xlsx") and not name.startswith(("~$", "."))
+            and not name.endswith("_Processed.xlsx"))
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _unique_path(folder, name):
+    """*name* in *folder*, suffixed with a counter if it already exists."""
+    base, ext = os.path.splitext(name)
+    path, n = os.path.join(folder, name), 1
+    while os.path.exists(path):
+        path = os.path.join(folder, f"{base}.{n}{ext}")
+        n += 1
+    return path
+
+
+def _process_task(template, outbox, mode, kwargs):
+    """Pool worker body: process one staged template quietly (the watcher records history)."""
+    import processor
+    try:
+        return processor.process(template, outbox, mode, lambda msg: None, history=False,
+                                 **kwargs)
+    except Exception as e:
+        return processor.ProcessResult(template, mode, ok=False, error=str(e))
+
+
+class Watcher:
+    """
+    Poll *inbox*, queue stable new/changed templates and run them on a pool.
+
+    ``poll()`` does one scan-dispatch-collect round; ``run()`` repeats it
+    until *stop* (a ``threading.Event``) is set.  Extra keyword arguments
+    are passed to ``processor.process`` (calendar_file, engine, ...).
+    """
+
+    def __init__(self, inbox, outbox, mode, log, quarantine=None, workers=1,
+                 interval=POLL_INTERVAL, debounce=DEBOUNCE, seed=None, **process_kwargs):
+        self.inbox = os.path.abspath(inbox)
+        self.outbox = os.path.abspath(outbox)
+        self.quarantine = os.path.abspath(quarantine or os.path.join(inbox, "quarantine"))
+        self.mode = mode
+        self.log = log
+        self.workers = max(1, workers)
+        self.interval = interval
+        self.debounce = debounce
+        self.seed = seed
+        self.process_kwargs = process_kwargs
+        self._staging = os.path.join(self.outbox, STAGING_NAME)
+        self._ledger_path = os.path.join(self.outbox, LEDGER_NAME)
+        self._ledger = self._load_ledger()
+        self._changing = {}         # path → (stat key, monotonic time it was first seen)
+        self._handled = {}          # path → stat key it was last fingerprinted at
+        self._queue = deque()
+        self._retry = deque()       # (path, stat key, sha256, staged copy) lost to a broken pool
+        self._running = {}          # future → (path, stat key, sha256, staged copy, retried)
+        self._pool = None
+        for folder in (self.outbox, self.quarantine, self._staging):
+            os.makedirs(folder, exist_ok=True)
+
+    # ── Ledger ─────────────────────────────────────────────────────────
+
+    def _load_ledger(self):
+        try:
+            with open(self._ledger_path, "r", encoding="utf-8") as f:
+                ledger = json.load(f)
+            return ledger if isinstance(ledger, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_ledger(self):
+        write_bytes(self._ledger_path,
+                    json.dumps(self._ledger, indent=1, ensure_ascii=False).encode("utf-8"))
+
+    # ── One round ──────────────────────────────────────────────────────
+
+    def poll(self):
+        """Scan the inbox, start queued jobs on free workers and collect finished ones."""
+        self._collect(block=False)
+        self._scan()
+        self._dispatch()
+        return len(self._queue) + len(self._retry) + len(self._running)
+
+    def _scan(self):
+        now = time.monotonic()
+        present = set()
+        try:
+            entries = list(os.scandir(self.inbox))
+        except OSError as e:
+            self.log(f"⚠ Cannot read inbox: {e}")
+            return
+        for entry in entries:
+            if not entry.is_file() or not _is_template(entry.name):
+                continue
+            path = entry.path
+            present.add(path)
+            key = _stat_key(path)
+            if key is None or self._handled.get(path) == key:
+                continue
+            if self._changing.get(path, (None,))[0] != key:
+                self._changing[path] = (key, now)           # new or still being written
+            elif now - self._changing[path][1] >= self.debounce and path not in self._queue:
+                self._queue.append(path)
+        for path in list(self._changing):
+            if path not in present:
+                del self._changing[path]
+        for path in list(self._handled):
+            if path not in present:
+                del self._handled[path]
+
+    def _dispatch(self):
+        # Retries run alone, so a template that breaks the pool again is the culprit
+        if self._retry or any(job[4] for job in self._running.values()):
+            if not self._running:
+                job = self._retry.popleft()
+                self._submit(job, retried=True)
+                self.log(f"  ▶ {os.path.basename(job[0])} (retry)")
+            return
+        while self._queue and len(self._running) < self.workers:
+            path = self._queue.popleft()
+            key = _stat_key(path)
+            if key is None or key != self._changing.get(path, (None,))[0]:
+                continue                                    # changed again: wait for it to settle
+            self._changing.pop(path, None)
+            self._handled[path] = key
+            name = os.path.basename(path)
+            try:
+                sha = file_hash(path)
+                if sha in self._ledger:
+                    self.log(f"  = {name}: duplicate of {self._ledger[sha]['template']}, skipped")
+                    continue
+                if any(job[2] == sha for job in [*self._running.values(), *self._retry]):
+                    self.log(f"  = {name}: same content already processing, skipped")
+                    continue
+                staged_dir = os.path.join(self._staging, sha[:16])
+                os.makedirs(staged_dir, exist_ok=True)
+                staged = os.path.join(staged_dir, name)
+                shutil.copy2(path, staged)
+                if file_hash(staged) != sha:                # overwritten while copying
+                    self._handled.pop(path, None)
+                    shutil.rmtree(staged_dir, ignore_errors=True)
+                    continue
+            except OSError as e:
+                self.log(f"⚠ {name}: {e}")
+                self._handled.pop(path, None)
+                continue
+            self._submit((path, key, sha, staged))
+            self.log(f"  ▶ {name}")
+
+    def _submit(self, job, retried=False):
+        path, key, sha, staged = job
+        kwargs = dict(self.process_kwargs, seed=self._template_seed(os.path.basename(path)))
+        future = self._get_pool().submit(_process_task, staged, self.outbox, self.mode, kwargs)
+        self._running[future] = (path, key, sha, staged, retried)
+
+    def _template_seed(self, name):
+        if self.seed is None:
+            return None
+        from generator import derive_seed
+        return derive_seed(self.seed, name)
+
+    def _collect(self, block):
+        if not self._running:
+            return
+        done, _ = wait(list(self._running), timeout=None if block else 0,
+                       return_when=FIRST_COMPLETED)
+        for future in done:
+            path, key, sha, staged, retried = self._running.pop(future)
+            name = os.path.basename(path)
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:  # a worker died, failing every job in flight
+                self._reset_pool()
+                if not retried:
+                    self.log(f"  ↻ {name}: worker pool broke, will retry")
+                    self._retry.append((path, key, sha, staged))
+                    continue
+                result = self._failed_result(path, str(e) or "worker process died")
+            except Exception as e:          # e.g. the job could not be sent to the pool
+                result = self._failed_result(path, str(e))
+            result.template = path          # the inbox file, not the staged copy
+            self._record_history(result, sha)
+            ok, error = result.ok, result.error
+            if ok:
+                self._ledger[sha] = {"template": name, "output": result.output,
+                                     "seed": result.seed, "processed": time.time()}
+                try:
+                    self._save_ledger()
+                except OSError as e:
+                    self.log(f"⚠ Ledger not saved: {e}")
+                self.log(f"  ✓ {name} → {os.path.basename(result.output)} "
+                         f"({result.total} sheets, {result.elapsed:.1f}s)")
+            else:
+                self._quarantine(path, key, error)
+            shutil.rmtree(os.path.dirname(staged), ignore_errors=True)
+
+    def _failed_result(self, path, error):
+        from processor import ProcessResult
+        return ProcessResult(path, self.mode, ok=False, error=error,
+                             engine=self.process_kwargs.get("engine", "openpyxl"))
+
+    def _record_history(self, result, sha):
+        import history
+        try:
+            history.record([result], hashes={result.template: sha})
+        except Exception as e:
+            self.log(f"⚠ Run history not recorded: {e}")
+
+    def _quarantine(self, path, key, error):
+        name = os.path.basename(path)
+        self.log(f"  ✖ {name}: {error}")
+        if _stat_key(path) != key:
+            return          # replaced since it was picked up; the new version gets its own run
+        try:
+            target = _unique_path(self.quarantine, name)
+            shutil.move(path, target)
+            with open(os.path.splitext(target)[0] + ".error.txt", "w", encoding="utf-8") as f:
+                f.write(f"{error}\n")
+        except OSError as e:
+            self.log(f"⚠ Could not quarantine {name}: {e}")
+
+    def _reset_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    # ── Loop ───────────────────────────────────────────────────────────
+
+    def run(self, stop=None, once=False):
+        """
+        Poll until *stop* is set (or, with *once*, until every template now in
+        the inbox has been handled); running jobs are always finished.
+        """
+        stop = stop or threading.Event()
+        self.log(f"Watching {self.inbox} → {self.outbox} (mode {self.mode}, "
+                 f"{self.workers} worker(s))")
+        try:
+            while not stop.is_set():
+                busy = self.poll()
+                if once and not busy and not self._changing:
+                    break
+                stop.wait(self.interval)
+            while self._running:
+                self._collect(block=True)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+            while self._retry:              # not retried; picked up again on the next start
+                shutil.rmtree(os.path.dirname(self._retry.popleft()[3]), ignore_errors=True)
+
+
+# ── Command line ────────────────────────────────────────────────────────────
+
+def build_parser():
+    from cube_data import MODES
+    p = argparse.ArgumentParser(
+        prog="python -m cube_data watch",
+        description="Process templates dropped into an inbox folder until stopped.")
+    p.add_argument("inbox", help="folder to watch for .xlsx templates")
+    p.add_argument("-o", "--outbox", required=True, help="folder for processed workbooks")
+    p.add_argument("--quarantine", help="folder for failed templates (default: INBOX/quarantine)")
+    p.add_argument("-m", "--mode", choices=MODES, default="generate+date",
+                   help="processing mode (default: %(default)s)")
+    p.add_argument("-c", "--calendar", help="calendar workbook (required for *date modes)")
+    p.add_argument("-s", "--seed", type=int,
+                   help="master seed; each template gets a seed derived from it and its name")
+    p.add_argument("-g", "--grades",
+                   help="comma-separated grades to fill (default: auto-detect from B12)")
+    p.add_argument("--grade-file", action="append", default=[], dest="grade_files",
+                   metavar="PATH",
+                   help="grade file, .xlsx/.csv/.npz/.parquet named after its grade (repeatable)")
+    p.add_argument("--engine", choices=("stream", "openpyxl"), default="stream",
+                   help="workbook engine (default: %(default)s)")
+    p.add_argument("-j", "--workers", type=int, default=1,
+                   help="templates processed at once; 0 = one per CPU (default: 1)")
+    p.add_argument("--interval", type=float, default=POLL_INTERVAL,
+                   help="seconds between inbox scans (default: %(default)s)")
+    p.add_argument("--debounce", type=float, default=DEBOUNCE,
+                   help="seconds a file must stay unchanged before it is picked up "
+                        "(default: %(default)s)")
+    p.add_argument("--once", action="store_true",
+                   help="process what is in the inbox now, then exit")
+    return p
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if "grade_files" in args.mode and not args.grade_files:
+        print(f"error: --grade-file is required for mode {args.mode}", file=sys.stderr)
+        return 2
+    if "date" in args.mode and not args.calendar:
+        print(f"error: --calendar is required for mode {args.mode}", file=sys.stderr)
+        return 2
+    if not os.path.isdir(args.inbox):
+        print(f"error: inbox {args.inbox!r} is not a folder", file=sys.stderr)
+        return 2
+
+    def log(msg):
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {msg}", file=sys.stderr, flush=True)
+
+    watcher = Watcher(
+        args.inbox, args.outbox, args.mode, log,
+        quarantine=args.quarantine,
+        workers=args.workers or os.cpu_count() or 1,
+        interval=args.interval,
+        debounce=args.debounce,
+        seed=args.seed,
+        selected_grades=[g.strip() for g in args.grades.split(",")] if args.grades else None,
+        grade_files=[os.path.abspath(f) for f in args.grade_files] or None,
+        calendar_file=os.path.abspath(args.calendar) if args.calendar else None,
+        engine=args.engine,
+    )
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    watcher.run(stop, once=args.once)
+    log("Stopped")
+    return 0
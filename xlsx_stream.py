@@ -0,0 +1,719 @@
+"""
+Streaming XLSX Patch Module
+Patches individual cells directly in the worksheet XML parts of an .xlsx
+archive, copying every other member byte-for-byte.  Only one worksheet part
+(per worker) is held in memory at a time, so memory is bounded by the
+largest single sheet rather than by the whole workbook.
+"""
+
+import datetime
+import math
+import multiprocessing
+import os
+import posixpath
+import re
+import struct
+import xml.etree.ElementTree as ET
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from atomicfile import atomic_output
+
+
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_OFFICE_DOC_REL = _REL_NS + "/officeDocument"
+_WORKSHEET_REL = _REL_NS + "/worksheet"
+_CALC_CHAIN_REL = _REL_NS + "/calcChain"
+
+_EXCEL_EPOCH = datetime.datetime(1899, 12, 30)
+
+
+class XlsxPatchError(Exception):
+    """Raised when a worksheet part cannot be patched safely in place."""
+
+
+# ── Cell references ─────────────────────────────────────────────────────────
+
+def column_index(letters):
+    """'A' → 1, 'H' → 8, 'AA' → 27."""
+    idx = 0
+    for ch in letters.upper():
+        idx = idx * 26 + (ord(ch) - 64)
+    return idx
+
+
+def column_letters(idx):
+    """1 → 'A', 8 → 'H', 27 → 'AA'."""
+    letters = ""
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def split_ref(ref):
+    """'C25' → (25, 3)."""
+    m = re.match(r"^([A-Za-z]+)(\d+)$", ref)
+    if not m:
+        raise ValueError(f"Invalid cell reference: {ref!r}")
+    return int(m.group(2)), column_index(m.group(1))
+
+
+# ── Package structure ───────────────────────────────────────────────────────
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _rels_path(part):
+    folder, name = posixpath.split(part)
+    return posixpath.join(folder, "_rels", name + ".rels")
+
+
+def _resolve(base_part, target):
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_part), target))
+
+
+def _read_rels(zf, part):
+    """Return {rId: (type, absolute target part)} for *part* (empty if none)."""
+    try:
+        root = ET.fromstring(zf.read(_rels_path(part)))
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in root:
+        if _local(rel.tag) != "Relationship" or rel.get("TargetMode") == "External":
+            continue
+        rels[rel.get("Id")] = (rel.get("Type"), _resolve(part, rel.get("Target")))
+    return rels
+
+
+def workbook_part(zf):
+    """Path of the main workbook part (normally ``xl/workbook.xml``)."""
+    for rel_type, target in _read_rels(zf, "").values():
+        if rel_type == _OFFICE_DOC_REL:
+            return target
+    return "xl/workbook.xml"
+
+
+def sheet_parts(zf):
+    """Return ``[(sheet_name, part_path)]`` for every worksheet, in workbook order."""
+    wb_part = workbook_part(zf)
+    rels = _read_rels(zf, wb_part)
+    root = ET.fromstring(zf.read(wb_part))
+    parts = []
+    for el in root.iter():
+        if _local(el.tag) != "sheet":
+            continue
+        rel = rels.get(el.get(f"{{{_REL_NS}}}id"))
+        if rel and rel[0] == _WORKSHEET_REL:
+            parts.append((el.get("name"), rel[1]))
+    return parts
+
+
+# ── Cell scanning ───────────────────────────────────────────────────────────
+
+# Built-in number formats that display dates/times (ECMA-376 §18.8.30)
+_BUILTIN_DATE_FORMATS = frozenset(range(14, 23)) | {45, 46, 47}
+# Literal text, colours/conditions and escaped characters never make a format a date
+_FORMAT_NOISE_RE = re.compile(r'\[(?!hh?\]|mm?\]|ss?\])[^\]]*\]|"[^"]*"|\\.|_.|\*.')
+_DATE_CODE_RE = re.compile(r"[dmyhs]", re.IGNORECASE)
+_EPOCH_1904 = datetime.datetime(1904, 1, 1)
+
+
+def _is_date_format(code):
+    code = _FORMAT_NOISE_RE.sub("", code)
+    return code.lower() != "general" and bool(_DATE_CODE_RE.search(code))
+
+
+def _date_styles(zf, wb_part):
+    """Indices into cellXfs (a cell's ``s``) whose number format shows a date."""
+    styles = next((t for rt, t in _read_rels(zf, wb_part).values()
+                   if rt == _REL_NS + "/styles"), None)
+    if not styles or styles not in zf.NameToInfo:
+        return frozenset()
+    root = ET.fromstring(zf.read(styles))
+    custom = {}
+    for el in root.iter():
+        if _local(el.tag) == "numFmt":
+            custom[int(el.get("numFmtId"))] = el.get("formatCode", "")
+    dated = set()
+    for el in root:
+        if _local(el.tag) != "cellXfs":
+            continue
+        for i, xf in enumerate(x for x in el if _local(x.tag) == "xf"):
+            fmt = int(xf.get("numFmtId", 0))
+            if fmt in _BUILTIN_DATE_FORMATS or (fmt in custom and _is_date_format(custom[fmt])):
+                dated.add(i)
+    return frozenset(dated)
+
+
+def _date1904(zf, wb_part):
+    for el in ET.fromstring(zf.read(wb_part)).iter():
+        if _local(el.tag) == "workbookPr":
+            return el.get("date1904", "").lower() in ("1", "true")
+    return False
+
+
+def _from_serial(value, date1904):
+    """Excel serial date → datetime (1900 system keeps Excel's fictitious 29 Feb 1900)."""
+    if date1904:
+        return _EPOCH_1904 + datetime.timedelta(days=value)
+    if value < 60:
+        value += 1
+    return _EXCEL_EPOCH + datetime.timedelta(days=value)
+
+
+def _text(el):
+    """Concatenated ``<t>`` text of a string item, skipping phonetic runs."""
+    if _local(el.tag) == "t":
+        return el.text or ""
+    return "".join(_text(child) for child in el if _local(child.tag) != "rPh")
+
+
+class _SharedStrings:
+    """Shared-string table parsed lazily, only as far as the largest index asked for."""
+
+    def __init__(self, zf, wb_part):
+        part = next((t for rt, t in _read_rels(zf, wb_part).values()
+                     if rt == _REL_NS + "/sharedStrings"), None)
+        self._items = []
+        self._stream = zf.open(part) if part and part in zf.NameToInfo else None
+        self._events = ET.iterparse(self._stream, events=("end",)) if self._stream else iter(())
+
+    def __getitem__(self, index):
+        for _, el in self._events:
+            if _local(el.tag) == "si":
+                self._items.append(_text(el))
+                el.clear()
+                if len(self._items) > index:
+                    break
+        return self._items[index] if index < len(self._items) else None
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+
+
+def _cell_value(c, date_styles, date1904, shared):
+    """Python value of a ``<c>`` element, as openpyxl reports it with data_only=False."""
+    kind = c.get("t", "n")
+    raw = formula = None
+    for child in c:
+        tag = _local(child.tag)
+        if tag == "f":
+            formula = child.text or ""
+        elif tag == "v":
+            raw = child.text
+        elif tag == "is":
+            raw = _text(child)
+    if formula is not None:
+        return "=" + formula
+    if raw is None:
+        return None
+    if kind == "s":
+        return shared[int(raw)]
+    if kind in ("inlineStr", "str", "e"):
+        return raw
+    if kind == "b":
+        return raw.strip() in ("1", "true")
+    if kind == "d":
+        return datetime.datetime.fromisoformat(raw.strip().rstrip("Z"))
+    number = float(raw) if any(ch in raw for ch in ".eE") else int(raw)
+    if int(c.get("s", 0)) in date_styles:
+        return _from_serial(number, date1904)
+    return number
+
+
+def _scan_part(stream, wanted, max_row, date_styles, date1904, shared):
+    found = {}
+    row = col = 0
+    for event, el in ET.iterparse(stream, events=("start", "end")):
+        tag = _local(el.tag)
+        if event == "start":
+            if tag == "row":
+                row = int(el.get("r") or row + 1)
+                col = 0
+                if row > max_row:
+                    break
+            continue
+        if tag == "c":
+            ref = el.get("r")
+            if ref:
+                col = split_ref(ref)[1]
+            else:
+                col += 1
+                ref = f"{column_letters(col)}{row}"
+            if ref in wanted:
+                found[ref] = _cell_value(el, date_styles, date1904, shared)
+                if len(found) == len(wanted):
+                    break
+            el.clear()
+        elif tag == "row":
+            el.clear()
+    return found
+
+
+def scan_cells(path, refs, checkpoint=None):
+    """
+    Read a few cells from every worksheet without loading the workbook.
+
+    Returns ``[(sheet_name, part, {ref: value})]`` in workbook order; missing
+    cells are None.  Each worksheet is iterparsed straight from the archive
+    and abandoned as soon as all *refs* are found or their last row is
+    passed, so only a small prefix of each part is ever decompressed.
+    Shared strings are parsed lazily up to the highest index referenced.
+    Values match openpyxl's (``data_only=False``): date-formatted numbers
+    become datetimes, formulas come back as ``"=..."`` text.
+
+    *checkpoint*, if given, is called before each worksheet.
+    """
+    wanted = frozenset(refs)
+    max_row = max(split_ref(ref)[0] for ref in wanted)
+    with zipfile.ZipFile(path) as zf:
+        wb_part = workbook_part(zf)
+        date_styles = _date_styles(zf, wb_part)
+        date1904 = _date1904(zf, wb_part)
+        shared = _SharedStrings(zf, wb_part)
+        try:
+            out = []
+            for name, part in sheet_parts(zf):
+                if checkpoint is not None:
+                    checkpoint()
+                with zf.open(part) as stream:
+                    found = _scan_part(stream, wanted, max_row, date_styles, date1904, shared)
+                out.append((name, part, {ref: found.get(ref) for ref in refs}))
+            return out
+        finally:
+            shared.close()
+
+
+# ── Worksheet XML patching ──────────────────────────────────────────────────
+
+@lru_cache(maxsize=None)
+def _patterns(prefix):
+    p = re.escape(prefix)
+    return {
+        "sheet_data": re.compile(rb"<" + p + rb"sheetData\b[^>]*?(/?)>"),
+        "sheet_data_end": re.compile(rb"</" + p + rb"sheetData>"),
+        "row": re.compile(rb"<" + p + rb"row\b([^>]*?)(/?)>"),
+        "row_end": re.compile(rb"</" + p + rb"row>"),
+        "cell": re.compile(rb"<" + p + rb"c\b([^>]*?)(?:/>|>(.*?)</" + p + rb"c>)", re.S),
+    }
+
+
+_ROOT_RE = re.compile(rb"<(?:([A-Za-z_][\w.-]*):)?worksheet\b")
+_R_ATTR_RE = re.compile(rb'\sr="([^"]*)"')
+_S_ATTR_RE = re.compile(rb'\ss="([^"]*)"')
+_SPANS_RE = re.compile(rb'\sspans="[^"]*"')
+_SHARED_MASTER_RE = re.compile(rb'<(?:\w+:)?f\b[^>]*\bt="shared"[^>]*\bref="')
+
+
+def _value_xml(prefix, value):
+    """Return (type attribute, inner XML) for a cell value."""
+    if isinstance(value, bool):
+        return b' t="b"', b"<%sv>%d</%sv>" % (prefix, int(value), prefix)
+    if isinstance(value, datetime.datetime):
+        value = (value - _EXCEL_EPOCH).total_seconds() / 86400
+    elif isinstance(value, datetime.date):
+        value = float((value - _EXCEL_EPOCH.date()).days)
+    if isinstance(value, int):
+        return b"", b"<%sv>%d</%sv>" % (prefix, value, prefix)
+    if isinstance(value, float) and math.isfinite(value):
+        return b"", b"<%sv>%s</%sv>" % (prefix, repr(value).encode(), prefix)
+    if isinstance(value, str) and value.startswith("=") and len(value) > 1:
+        # A formula, as openpyxl treats such strings; the value is computed on load
+        return b"", b"<%sf>%s</%sf>" % (prefix, escape(value[1:]).encode("utf-8"), prefix)
+    text = escape(str(value)).encode("utf-8")
+    return (b' t="inlineStr"',
+            b'<%sis><%st xml:space="preserve">%s</%st></%sis>'
+            % (prefix, prefix, text, prefix, prefix))
+
+
+def _cell_xml(prefix, ref, style, value):
+    head = b'<%sc r="%s"%s' % (prefix, ref.encode(), style)
+    if value is None:
+        return head + b"/>"
+    t_attr, inner = _value_xml(prefix, value)
+    return head + t_attr + b">" + inner + b"</%sc>" % prefix
+
+
+def _patch_row(prefix, pats, row_num, body, targets):
+    """Return (new row body, removed_formula) with *targets* {col: value} applied."""
+    def new_cells(cols):
+        return b"".join(_cell_xml(prefix, column_letters(c) + str(row_num), b"", pending.pop(c))
+                        for c in sorted(cols))
+
+    removed_formula = False
+    edits = []                      # (start, end, replacement)
+    pending = dict(targets)
+    for m in pats["cell"].finditer(body):
+        r = _R_ATTR_RE.search(m.group(1))
+        if not r:
+            raise XlsxPatchError(f"row {row_num} has cells without references")
+        _, col = split_ref(r.group(1).decode())
+
+        # Missing target cells that sort before this one
+        before = [c for c in pending if c < col]
+        if before:
+            edits.append((m.start(), m.start(), new_cells(before)))
+
+        if col in pending:
+            inner = m.group(2) or b""
+            if _SHARED_MASTER_RE.search(inner):
+                raise XlsxPatchError(
+                    f"{r.group(1).decode()} holds a shared formula used by other cells")
+            removed_formula |= b"<" + prefix + b"f" in inner
+            style = _S_ATTR_RE.search(m.group(1))
+            style = b' s="%s"' % style.group(1) if style else b""
+            edits.append((m.start(), m.end(),
+                          _cell_xml(prefix, r.group(1).decode(), style, pending.pop(col))))
+        if not pending:
+            break
+    if pending:
+        edits.append((len(body), len(body), new_cells(list(pending))))
+
+    for start, end, xml in reversed(edits):
+        body = body[:start] + xml + body[end:]
+    return body, removed_formula
+
+
+def patch_sheet_xml(data, cells):
+    """
+    Apply ``cells`` ({"C25": value, ...}) to worksheet XML *data* (bytes).
+
+    Existing cells keep their style; formulas in overwritten cells are
+    dropped.  Strings are written as inline strings so the shared string
+    table is left untouched; strings starting with "=" become formulas, as
+    with openpyxl.  Returns ``(new_data, removed_formula)``.
+    """
+    root = _ROOT_RE.search(data)
+    prefix = (root.group(1) + b":") if root and root.group(1) else b""
+    pats = _patterns(prefix)
+
+    by_row = {}
+    for ref, value in cells.items():
+        row, col = split_ref(ref)
+        by_row.setdefault(row, {})[col] = value
+
+    sd = pats["sheet_data"].search(data)
+    if not sd:
+        raise XlsxPatchError("worksheet has no sheetData")
+    if sd.group(1):
+        rows_xml = b"".join(
+            b'<%srow r="%d">' % (prefix, r)
+            + _patch_row(prefix, pats, r, b"", by_row[r])[0]
+            + b"</%srow>" % prefix
+            for r in sorted(by_row))
+        return (data[:sd.start()] + b"<%ssheetData>" % prefix + rows_xml
+                + b"</%ssheetData>" % prefix + data[sd.end():]), False
+
+    end = pats["sheet_data_end"].search(data, sd.end()).start()
+    removed_formula = False
+    edits = []
+    pending = sorted(by_row)
+    pos = sd.end()
+    while pending:
+        m = pats["row"].search(data, pos, end)
+        if not m:
+            break
+        r = _R_ATTR_RE.search(m.group(1))
+        if not r:
+            raise XlsxPatchError("worksheet rows have no 'r' attribute")
+        row_num = int(r.group(1))
+        if m.group(2):
+            body_start = body_end = close_end = m.end()
+        else:
+            close = pats["row_end"].search(data, m.end(), end)
+            body_start, body_end, close_end = m.end(), close.start(), close.end()
+
+        # New rows that sort before this one
+        while pending and pending[0] < row_num:
+            r_new = pending.pop(0)
+            body, _ = _patch_row(prefix, pats, r_new, b"", by_row[r_new])
+            edits.append((m.start(), m.start(),
+                          b'<%srow r="%d">' % (prefix, r_new) + body + b"</%srow>" % prefix))
+
+        if pending and pending[0] == row_num:
+            pending.pop(0)
+            body, removed = _patch_row(prefix, pats, row_num, data[body_start:body_end],
+                                       by_row[row_num])
+            removed_formula |= removed
+            attrs = _SPANS_RE.sub(b"", m.group(1))
+            edits.append((m.start(), close_end,
+                          b"<%srow%s>" % (prefix, attrs) + body + b"</%srow>" % prefix))
+        pos = close_end
+
+    for r_new in pending:
+        body, _ = _patch_row(prefix, pats, r_new, b"", by_row[r_new])
+        edits.append((end, end,
+                      b'<%srow r="%d">' % (prefix, r_new) + body + b"</%srow>" % prefix))
+
+    pieces = []
+    last = 0
+    for start, stop, xml in edits:
+        pieces.append(data[last:start])
+        pieces.append(xml)
+        last = stop
+    pieces.append(data[last:])
+    return b"".join(pieces), removed_formula
+
+
+# ── Archive rewrite ─────────────────────────────────────────────────────────
+
+_COMPRESS_LEVEL = 6             # zlib's default, as used by zipfile
+_CHUNK_SIZE = 64                # sheet parts per pool task
+
+_CT_CALC_CHAIN_RE = re.compile(
+    rb'<(?:\w+:)?Override\b[^>]*PartName="/xl/calcChain.xml"[^>]*/>')
+_REL_CALC_CHAIN_RE = re.compile(
+    rb'<(?:\w+:)?Relationship\b[^>]*Type="' + re.escape(_CALC_CHAIN_REL.encode()) + rb'"[^>]*/>')
+
+_WB_ROOT_RE = re.compile(rb"<(?:([A-Za-z_][\w.-]*):)?workbook\b")
+_CALC_PR_RE = re.compile(rb"<(?:\w+:)?calcPr\b([^>]*?)(/?)>")
+_FULL_CALC_RE = re.compile(rb'\sfullCalcOnLoad="[^"]*"')
+# CT_Workbook children that follow calcPr; a new calcPr goes before the first of them
+_AFTER_CALC_PR = (b"oleSize", b"customWorkbookViews", b"pivotCaches", b"smartTagPr",
+                  b"smartTagTypes", b"webPublishing", b"fileRecoveryPr",
+                  b"webPublishObjects", b"extLst")
+
+
+def force_full_calc(data):
+    """
+    Set ``fullCalcOnLoad="1"`` on the ``calcPr`` of workbook XML *data*
+    (adding the element if missing), so readers recalculate formulas
+    instead of trusting values cached before cells were patched.
+    """
+    m = _CALC_PR_RE.search(data)
+    if m:
+        attrs = _FULL_CALC_RE.sub(b"", m.group(1))
+        return (data[:m.start(1)] + attrs + b' fullCalcOnLoad="1"'
+                + data[m.end(1):])
+    root = _WB_ROOT_RE.search(data)
+    prefix = (root.group(1) + b":") if root and root.group(1) else b""
+    p = re.escape(prefix)
+    nxt = re.compile(rb"<" + p + rb"(?:" + b"|".join(_AFTER_CALC_PR) + rb")\b|</" + p
+                     + rb"workbook>").search(data)
+    if not nxt:
+        raise XlsxPatchError("workbook part has no closing tag")
+    return (data[:nxt.start()] + b'<%scalcPr fullCalcOnLoad="1"/>' % prefix
+            + data[nxt.start():])
+
+
+def _deflate(data):
+    """Raw-deflate *data* the way zipfile does; returns (compressed, crc, size)."""
+    comp = zlib.compressobj(_COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    return comp.compress(data) + comp.flush(), zlib.crc32(data), len(data)
+
+
+def _patch_part(zf, part, cells):
+    data, _ = patch_sheet_xml(zf.read(part), cells)
+    return _deflate(data)
+
+
+def _patch_chunk(src_path, items):
+    """Pool worker body: patch and compress ``[(part, cells), ...]``."""
+    with zipfile.ZipFile(src_path) as zf:
+        return [_patch_part(zf, part, cells) for part, cells in items]
+
+
+def _read_raw(fp, info):
+    """Compressed bytes of member *info* exactly as stored in the archive."""
+    fp.seek(info.header_offset)
+    header = fp.read(30)
+    if header[:4] != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    fp.seek(info.header_offset + 30 + name_len + extra_len)
+    return fp.read(info.compress_size)
+
+
+def _write_raw(dst, src_info, data, crc, file_size, compress_type):
+    """
+    Append an already-compressed member to *dst*.
+
+    zipfile has no public API for this, so mirror the bookkeeping
+    ``ZipFile.writestr`` does after compressing.
+    """
+    zinfo = zipfile.ZipInfo(src_info.filename, src_info.date_time)
+    zinfo.compress_type = compress_type
+    zinfo.create_system = src_info.create_system
+    zinfo.external_attr = src_info.external_attr
+    zinfo.CRC = crc
+    zinfo.file_size = file_size
+    zinfo.compress_size = len(data)
+    zip64 = max(file_size, len(data)) > zipfile.ZIP64_LIMIT
+
+    dst._writecheck(zinfo)
+    dst._didModify = True
+    zinfo.header_offset = dst.fp.tell()
+    dst.fp.write(zinfo.FileHeader(zip64))
+    dst.fp.write(data)
+    dst.filelist.append(zinfo)
+    dst.NameToInfo[zinfo.filename] = zinfo
+    dst.start_dir = dst.fp.tell()
+
+
+def _patched_parts(src, src_path, names, patches, workers):
+    """Yield (compressed, crc, size) for each of *names*, in order."""
+    if workers <= 1 or len(names) <= _CHUNK_SIZE:
+        for name in names:
+            yield _patch_part(src, name, patches[name])
+        return
+
+    chunks = [names[i:i + _CHUNK_SIZE] for i in range(0, len(names), _CHUNK_SIZE)]
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(_patch_chunk, src_path,
+                                         [(name, patches[name]) for name in chunk]))
+            # Bound memory: only a few chunks of compressed output wait at once
+            while len(in_flight) > 2 * workers:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def write_patched(src_path, dst_path, patches, workers=1, reuse=None, reuse_path=None,
+                  checkpoint=None):
+    """
+    Copy the archive at *src_path* to *dst_path*, applying *patches*
+    ({part_path: {"C25": value, ...}}) to the named worksheet parts.
+
+    *reuse* ({part_path: ZipInfo}) names patched parts whose result already
+    exists in the archive at *reuse_path*; those members are copied from
+    there instead of being patched again.
+
+    *checkpoint*, if given, is called before each member is written; an
+    exception it raises aborts the copy.
+
+    Every other member is copied byte-for-byte (still compressed) and keeps
+    its position in the archive.  When any sheet is patched the calculation
+    chain is dropped (Excel rebuilds it on open) since overwritten cells may
+    have held formulas, and the workbook is flagged for a full recalculation
+    on load so formulas over the patched cells do not show stale cached
+    values.
+
+    With ``workers > 1`` the sheet parts are patched and compressed in a
+    process pool and reassembled in archive order; the result is
+    byte-identical to a serial run.
+    """
+    patches = {part: cells for part, cells in patches.items() if cells}
+    reuse = {part: info for part, info in (reuse or {}).items() if part in patches}
+    with zipfile.ZipFile(src_path) as src, \
+            (open(reuse_path, "rb") if reuse else nullcontext()) as raw_prev:
+        drop_calc = bool(patches) and "xl/calcChain.xml" in src.NameToInfo
+        wb_part = workbook_part(src)
+        wb_rels = _rels_path(wb_part)
+        infos = src.infolist()
+        patched = _patched_parts(src, src_path,
+                                 [i.filename for i in infos
+                                  if i.filename in patches and i.filename not in reuse],
+                                 patches, workers)
+
+        with open(src_path, "rb") as raw_src, zipfile.ZipFile(dst_path, "w") as dst:
+            for info in infos:
+                if checkpoint is not None:
+                    checkpoint()
+                name = info.filename
+                if name in reuse:
+                    prev = reuse[name]
+                    _write_raw(dst, info, _read_raw(raw_prev, prev), prev.CRC, prev.file_size,
+                               prev.compress_type)
+                    continue
+                if name in patches:
+                    data, crc, size = next(patched)
+                elif patches and name == wb_part:
+                    data, crc, size = _deflate(force_full_calc(src.read(info)))
+                elif drop_calc and name == "xl/calcChain.xml":
+                    continue
+                elif drop_calc and name == "[Content_Types].xml":
+                    data, crc, size = _deflate(_CT_CALC_CHAIN_RE.sub(b"", src.read(info)))
+                elif drop_calc and name == wb_rels:
+                    data, crc, size = _deflate(_REL_CALC_CHAIN_RE.sub(b"", src.read(info)))
+                else:
+                    _write_raw(dst, info, _read_raw(raw_src, info), info.CRC, info.file_size,
+                               info.compress_type)
+                    continue
+                _write_raw(dst, info, data, crc, size, zipfile.ZIP_DEFLATED)
+
+
+# ── Workbook facade ─────────────────────────────────────────────────────────
+
+class _Cell:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class PatchSheet:
+    """Minimal worksheet stand-in: known cell values in, cell writes recorded."""
+
+    def __init__(self, title, part, values=None):
+        self.title = title
+        self.part = part
+        self._values = dict(values or {})
+        self.writes = {}
+
+    def __getitem__(self, ref):
+        return _Cell(self.writes.get(ref, self._values.get(ref)))
+
+    def __setitem__(self, ref, value):
+        self.writes[ref] = value
+
+    def cell(self, row, column, value=None):
+        ref = f"{column_letters(column)}{row}"
+        if value is not None:
+            self.writes[ref] = value
+        return self[ref]
+
+
+class PatchWorkbook:
+    """
+    Write-only stand-in for an openpyxl workbook used by the stream engine.
+
+    Sheets expose the few cells read during discovery (``values``) and record
+    every write; ``save`` streams the source archive to the destination with
+    only those cells patched.
+    """
+
+    def __init__(self, path, parts, values=None):
+        values = values or {}
+        self.path = path
+        self.sheetnames = [name for name, _ in parts]
+        self._sheets = {name: PatchSheet(name, part, values.get(name))
+                        for name, part in parts}
+
+    def __getitem__(self, name):
+        return self._sheets[name]
+
+    @property
+    def worksheets(self):
+        return [self._sheets[name] for name in self.sheetnames]
+
+    def save(self, out_path, workers=1, reuse=None, checkpoint=None):
+        """
+        Write the patched copy to *out_path*.  *reuse* ({part: ZipInfo})
+        copies those parts from the existing file at *out_path* instead of
+        patching them; the file is replaced only once the new one is complete,
+        so an error (or a *checkpoint* raising) leaves any previous file intact.
+        """
+        if os.path.abspath(out_path) == os.path.abspath(self.path):
+            raise ValueError("Output path must differ from the template path")
+        with atomic_output(out_path) as tmp:
+            write_patched(self.path, tmp,
+                          {ws.part: ws.writes for ws in self._sheets.values() if ws.writes},
+                          workers=workers, reuse=reuse, reuse_path=out_path,
+                          checkpoint=checkpoint)
+
+    def close(self):
+        pass